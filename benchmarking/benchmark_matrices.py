@@ -0,0 +1,118 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions as apply_conductivity_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.mesh import create_random_triangular_mesh_in_rectangle, create_regular_triangular_mesh_in_rectangle
+from src.fem.stifness.boundary_conditions import apply_boundary_conditions as apply_stiffness_boundary_conditions
+from src.fem.stifness.stiffness_matrix import assemble_global_stiffness_matrix
+
+
+def create_benchmark_mesh(num_nodes, mesh='regular', distortion=0.0, anisotropy=1.0, seed=None):
+    """
+    Creates a mesh of the rectangle [0, anisotropy] x [0, 1] with about the given number of nodes.
+
+    Parameters:
+    num_nodes (int): Approximate number of nodes.
+    mesh (str): 'regular' for a structured mesh or 'random' for a Delaunay mesh of random points, whose
+        slivers give a poor quality mesh.
+    distortion (float): Random displacement of the interior nodes of the regular mesh as a fraction of the
+        element size, from 0 (undistorted) to about 0.4 (badly shaped elements).
+    anisotropy (float): Aspect ratio of the domain. The regular mesh keeps the same number of nodes per side,
+        so its elements are stretched by the same ratio.
+    seed (int, optional): Seed for the random number generator. Defaults to None.
+
+    Returns:
+    tuple: Mesh nodes and elements.
+    """
+    rng = np.random.default_rng(seed)
+    n = max(int(round(np.sqrt(num_nodes))), 2)
+
+    if mesh == 'regular':
+        node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, anisotropy, 0, 1, n, n)
+        if distortion:
+            h = np.array([anisotropy, 1.0]) / (n - 1)
+            interior = ((node_coords[:, 0] > 0) & (node_coords[:, 0] < anisotropy) &
+                        (node_coords[:, 1] > 0) & (node_coords[:, 1] < 1))
+            node_coords[interior] += distortion * h * rng.uniform(-1, 1, (interior.sum(), 2))
+    elif mesh == 'random':
+        # Boundary nodes on the left edge keep the Dirichlet boundary well defined
+        node_coords, elements = create_random_triangular_mesh_in_rectangle(0, anisotropy, 0, 1, n * n - n,
+                                                                           seed=rng.integers(2 ** 31))
+        left_edge = np.column_stack([np.zeros(n), np.linspace(0, 1, n)])
+        node_coords = np.vstack([node_coords, left_edge])
+        elements = sp.spatial.Delaunay(node_coords).simplices
+    else:
+        raise ValueError(f"Unknown mesh type: {mesh}")
+
+    return node_coords, elements
+
+
+def checkerboard_field(contrast, cells=4, width=1.0):
+    """
+    Creates a two-material checkerboard whose coefficients differ by the given contrast.
+
+    Parameters:
+    contrast (float): Ratio of the coefficients of the two materials.
+    cells (int): Number of checkerboard cells per side.
+    width (float): Width of the domain.
+
+    Returns:
+    callable: Material field of the element centroids.
+    """
+    def field(centroids):
+        cell_sum = np.floor(cells * centroids[:, 0] / width) + np.floor(cells * centroids[:, 1])
+        return np.where(cell_sum % 2 == 1, contrast, 1.0)
+
+    return field
+
+
+def generate_fem_system(size, problem='laplacian', mesh='regular', distortion=0.0, anisotropy=1.0, contrast=1.0,
+                        seed=None):
+    """
+    Generates a constrained FEM system of equations for solver benchmarks.
+
+    The matrix is assembled by the project's own assemblers on the left-clamped rectangle, so it has the sparsity,
+    symmetry and conditioning of the systems the solvers actually see.
+
+    Parameters:
+    size (int): Approximate number of degrees of freedom.
+    problem (str): 'laplacian' for heat transfer with a unit source or 'elasticity' for plane stress under
+        a uniform vertical load.
+    mesh (str): 'regular' or 'random', see create_benchmark_mesh.
+    distortion (float): Distortion of the regular mesh, see create_benchmark_mesh.
+    anisotropy (float): Aspect ratio of the domain and of the regular mesh elements.
+    contrast (float): Ratio of the material coefficients of a two-material checkerboard.
+    seed (int, optional): Seed for the random number generator. Defaults to None.
+
+    Returns:
+    sp.sparse.csr_matrix, np.ndarray: Constrained system matrix and right-hand side vector.
+    """
+    dofs_per_node = 2 if problem == 'elasticity' else 1
+    node_coords, elements = create_benchmark_mesh(size // dofs_per_node, mesh, distortion, anisotropy, seed)
+    N = len(node_coords)
+    material = checkerboard_field(contrast, width=anisotropy) if contrast != 1 else 1.0
+    fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+
+    if problem == 'laplacian':
+        K = assemble_global_conductivity_matrix(elements, node_coords, material, sparse=True)
+        K, F = apply_conductivity_boundary_conditions(K, np.full(N, 1.0 / N), fixed_nodes,
+                                                      np.zeros(len(fixed_nodes)))
+    elif problem == 'elasticity':
+        E = 210e9 if contrast == 1 else (lambda centroids: 210e9 * material(centroids))
+        K = assemble_global_stiffness_matrix(elements, node_coords, E, 0.3, sparse=True)
+        forces = np.zeros(2 * N)
+        forces[1::2] = -1e6 / N
+        K, F = apply_stiffness_boundary_conditions(K, forces, fixed_nodes)
+    else:
+        raise ValueError(f"Unknown problem: {problem}")
+
+    return sp.sparse.csr_matrix(K), F
+
+
+if __name__ == '__main__':
+    for problem in ['laplacian', 'elasticity']:
+        for options in [{}, {'mesh': 'random'}, {'distortion': 0.3}, {'anisotropy': 10.0}, {'contrast': 1e4}]:
+            K, F = generate_fem_system(2000, problem, seed=0, **options)
+            print(f"{problem} {options}: {K.shape[0]} dofs, {K.nnz} nonzeros, "
+                  f"relative asymmetry {abs(K - K.T).max() / abs(K).max():.1e}")
@@ -0,0 +1,58 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.domain_decomposition import solve_schur_complement
+from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+
+def generate_heat_transfer_system(n):
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n)
+    fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+    K_global = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    K_global, F = apply_boundary_conditions(K_global, np.ones(len(node_coords)), fixed_nodes,
+                                            np.zeros(len(fixed_nodes)))
+    return node_coords, K_global, F
+
+
+if __name__ == "__main__":
+    n = 300  # Nodes per side of the regular mesh
+    subdomain_counts = [1, 2, 4, 8, 16]
+
+    node_coords, K_global, F = generate_heat_transfer_system(n)
+
+    start_time = datetime.now()
+    reference = sp.sparse.linalg.spsolve(K_global.tocsc(), F)
+    direct_time = datetime.now() - start_time
+    print(f"spsolve time: {direct_time}")
+
+    with open("results/domain_decomposition_results.csv", "a", newline='') as csvfile:
+        fieldnames = ['Nodes', 'Subdomains', 'Interface Size', 'Iterations', 'Time', 'Speedup', 'Max Difference']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        # Write header only if the file is empty
+        if csvfile.tell() == 0:
+            writer.writeheader()
+
+        baseline = None
+        for n_subdomains in subdomain_counts:
+            start_time = datetime.now()
+            temperatures, info = solve_schur_complement(K_global, F, n_subdomains, dof_coords=node_coords)
+            elapsed = datetime.now() - start_time
+            baseline = baseline or elapsed
+
+            writer.writerow({
+                'Nodes': n * n,
+                'Subdomains': n_subdomains,
+                'Interface Size': info['interface_size'],
+                'Iterations': info['iterations'],
+                'Time': elapsed,
+                'Speedup': round(baseline / elapsed, 2),
+                'Max Difference': np.abs(temperatures - reference).max()
+            })
+            print(f"{n_subdomains} subdomains: {elapsed}, speedup {baseline / elapsed:.2f}, "
+                  f"{info['iterations']} iterations")
@@ -0,0 +1,96 @@
+import csv
+import time
+
+import numpy as np
+
+from src.fem.assembly import deduplicated_element_matrices, unique_element_geometries
+from src.fem.conductivity.conductivity_matrix import element_conductivity_matrices
+from src.fem.mass.mass_matrix import element_mass_matrices
+from src.fem.mesh import create_random_triangular_mesh_in_rectangle, create_regular_triangular_mesh_in_rectangle
+from src.fem.stifness.stiffness_matrix import element_stiffness_matrices
+
+
+def periodic_mesh(n, period=4, distortion=0.3):
+    """
+    Regular mesh of the unit square whose nodes are displaced by a pattern repeating every period nodes, so the
+    mesh is a tiling of one distorted cell.
+    """
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n)
+    h = 1 / (n - 1)
+    i, j = np.rint(node_coords / h).astype(int).T
+    phase = 2 * np.pi * np.column_stack([i % period + 2 * (j % period), 3 * (i % period) + j % period]) / period
+    return node_coords + distortion * h * np.sin(phase), elements
+
+
+def annulus_mesh(n_radial, n_angular, inner_radius=0.5):
+    """
+    Mesh of an annulus whose elements in every ring are rotated copies of each other.
+    """
+    radii = np.linspace(inner_radius, 1, n_radial)
+    angles = np.linspace(0, 2 * np.pi, n_angular, endpoint=False)
+    r, a = np.meshgrid(radii, angles, indexing='ij')
+    node_coords = np.column_stack([(r * np.cos(a)).ravel(), (r * np.sin(a)).ravel()])
+
+    ring, sector = np.meshgrid(np.arange(n_radial - 1), np.arange(n_angular), indexing='ij')
+    n0 = (ring * n_angular + sector).ravel()
+    n1 = (ring * n_angular + (sector + 1) % n_angular).ravel()
+    elements = np.vstack([np.column_stack([n0, n1, n1 + n_angular]), np.column_stack([n0, n1 + n_angular,
+                                                                                      n0 + n_angular])])
+    return node_coords, elements
+
+
+ELEMENT_MATRICES = {
+    'conductivity': (lambda coords: element_conductivity_matrices(1.0, coords), ('translation', 'rotation')),
+    'stiffness': (lambda coords: element_stiffness_matrices(1.0, 0.3, coords), ('translation',)),
+    'mass': (lambda coords: element_mass_matrices(1.0, coords), ('translation', 'rotation')),
+}
+
+
+def timed(compute, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = compute(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    num_elements = 1000000
+    n = int(np.sqrt(num_elements / 2)) + 1
+    meshes = {
+        'regular': create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n),
+        'periodic': periodic_mesh(n),
+        'annulus': annulus_mesh(n // 2, 2 * n),
+        'random': create_random_triangular_mesh_in_rectangle(0, 1, 0, 1, num_elements // 2, seed=0),
+    }
+
+    with open("results/element_deduplication_results.csv", "a", newline='') as csvfile:
+        fieldnames = ['Mesh', 'Elements', 'Matrix', 'Invariance', 'Unique Elements', 'Direct Time',
+                      'Deduplicated Time', 'Speedup', 'Max Relative Difference']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        # Write header only if the file is empty
+        if csvfile.tell() == 0:
+            writer.writeheader()
+
+        for mesh_name, (node_coords, elements) in meshes.items():
+            coords = node_coords[elements]
+            for matrix_name, (compute, invariances) in ELEMENT_MATRICES.items():
+                direct, direct_time = timed(compute, coords)
+                for invariance in invariances:
+                    deduplicated, deduplicated_time = timed(deduplicated_element_matrices, compute, coords,
+                                                            invariance)
+                    num_unique = len(unique_element_geometries(coords, invariance)[0])
+                    difference = np.abs(deduplicated - direct).max() / np.abs(direct).max()
+                    writer.writerow({
+                        'Mesh': mesh_name,
+                        'Elements': len(elements),
+                        'Matrix': matrix_name,
+                        'Invariance': invariance,
+                        'Unique Elements': num_unique,
+                        'Direct Time': round(direct_time, 4),
+                        'Deduplicated Time': round(deduplicated_time, 4),
+                        'Speedup': round(direct_time / deduplicated_time, 2),
+                        'Max Relative Difference': f"{difference:.1e}",
+                    })
+                    print(f"{mesh_name:<8} {matrix_name:<12} {invariance:<11} {num_unique:8d} unique of "
+                          f"{len(elements)}: {direct_time:.3f} s -> {deduplicated_time:.3f} s, "
+                          f"difference {difference:.1e}")
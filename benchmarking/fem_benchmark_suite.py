@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions as apply_conductivity_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.mass.mass_matrix import assemble_global_mass_matrix
+from src.fem.matrix_free import conductivity_operator, stiffness_operator
+from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+from src.fem.profiling import Profiler
+from src.fem.solvers import optional_import, solve_linear_system
+from src.fem.stifness.boundary_conditions import apply_boundary_conditions as apply_stiffness_boundary_conditions
+from src.fem.stifness.stiffness_matrix import assemble_global_stiffness_matrix
+
+
+# Dense matrices above this number of degrees of freedom are skipped
+DENSE_DOF_LIMIT = 5000
+
+# Solvers of the heat transfer system as (name, solver_method, precision)
+SOLVERS = [
+    ('solve', 'solve', 'double'),
+    ('spsolve', 'spsolve', 'double'),
+    ('cg', 'cg', 'double'),
+    ('bicgstab', 'bicgstab', 'double'),
+    ('gmres', 'gmres', 'double'),
+    ('minres', 'minres', 'double'),
+    ('pcg', 'pcg', 'double'),
+    ('schur', 'schur', 'double'),
+    ('mixed_spsolve', 'spsolve', 'mixed'),
+    ('auto', 'auto', 'double'),
+]
+if optional_import('pyamg') is not None:
+    SOLVERS.append(('amg', 'amg', 'double'))
+
+
+def measure(function, repeats):
+    """
+    Times a benchmark case.
+
+    The peak memory is traced in a separate first run, so tracemalloc does not slow down the timed runs.
+
+    Parameters:
+    function (callable): Case to run without arguments.
+    repeats (int): Number of timed runs.
+
+    Returns:
+    dict, object: Timing statistics in seconds with the peak traced memory, and the result of the last run.
+    """
+    tracemalloc.start()
+    result = function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start_time)
+
+    p10, median, p90 = np.percentile(times, [10, 50, 90])
+    return {
+        'repeats': repeats,
+        'median': float(median),
+        'p10': float(p10),
+        'p90': float(p90),
+        'min': float(np.min(times)),
+        'peak_memory_mb': round(peak_memory / 2 ** 20, 3),
+    }, result
+
+
+def heat_transfer_problem(n):
+    """
+    Creates the benchmark heat transfer problem on a regular n x n node mesh of the unit square.
+    """
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n)
+
+    # Left edge held at 100 degrees with a uniform heat source
+    fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+    fixed_temperatures = np.full(len(fixed_nodes), 100.0)
+    heat_sources = np.full(len(node_coords), 1.0 / len(node_coords))
+    return node_coords, elements, fixed_nodes, fixed_temperatures, heat_sources
+
+
+def solve_case(K, F, solver_method, precision, K_full, dof_coords):
+    """
+    Solves the benchmark system and returns the solution with the iteration count and residual reported by
+    the solver.
+    """
+    profiler = Profiler(trace_memory=False)
+    solver_options = {'dof_coords': dof_coords} if solver_method == 'schur' else None
+    with profiler.span('solve'):
+        solution = solve_linear_system(K, F, solver_method, precision=precision, K_full=K_full,
+                                       solver_options=solver_options, profiler=profiler)
+    return solution, profiler.spans[-1]
+
+
+def quiet(function, *args):
+    """
+    Calls a function with its printed diagnostics discarded.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def cupy_solve(K, F):
+    """
+    Solves the system densely on the GPU, including the transfers to and from the device.
+    """
+    cp = optional_import('cupy')
+    solution = cp.linalg.solve(cp.asarray(K.toarray()), cp.asarray(F))
+    cp.cuda.Stream.null.synchronize()
+    return cp.asnumpy(solution)
+
+
+def run_suite(sizes, repeats):
+    """
+    Runs the mesh, assembly, boundary condition and solver cases over a ladder of mesh sizes.
+
+    Parameters:
+    sizes (list of int): Nodes per side of the regular meshes.
+    repeats (int): Number of timed runs of every case.
+
+    Returns:
+    list of dict: One record per case and mesh size.
+    """
+    results = []
+
+    def add(case, stage, n_nodes, n_dofs, function, **metrics):
+        statistics, result = measure(function, repeats)
+        record = {'case': case, 'stage': stage, 'n_nodes': n_nodes, 'n_dofs': n_dofs, **statistics, **metrics}
+        results.append(record)
+        print(f"{case:<28} {n_dofs:>8} dofs  median {statistics['median']:.4f} s  "
+              f"p90 {statistics['p90']:.4f} s  {statistics['peak_memory_mb']:.2f} MB")
+        return result
+
+    for n in sizes:
+        node_coords, elements, fixed_nodes, fixed_temperatures, heat_sources = heat_transfer_problem(n)
+        N = len(node_coords)
+        dense = N <= DENSE_DOF_LIMIT
+        dense_elasticity = 2 * N <= DENSE_DOF_LIMIT
+
+        add('mesh_regular', 'mesh', N, N, lambda: create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n))
+
+        # Assembly
+        K_sparse = add('conductivity_sparse', 'assembly', N, N,
+                       lambda: assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True))
+        results[-1]['nnz'] = int(K_sparse.nnz)
+        if dense:
+            add('conductivity_dense', 'assembly', N, N,
+                lambda: assemble_global_conductivity_matrix(elements, node_coords, 1.0))
+        add('conductivity_matrix_free', 'assembly', N, N, lambda: conductivity_operator(elements, node_coords, 1.0))
+
+        K_elastic = add('stiffness_sparse', 'assembly', N, 2 * N,
+                        lambda: assemble_global_stiffness_matrix(elements, node_coords, 210e9, 0.3, sparse=True))
+        results[-1]['nnz'] = int(K_elastic.nnz)
+        if dense_elasticity:
+            add('stiffness_dense', 'assembly', N, 2 * N,
+                lambda: assemble_global_stiffness_matrix(elements, node_coords, 210e9, 0.3))
+            add('mass_dense', 'assembly', N, 2 * N,
+                lambda: quiet(assemble_global_mass_matrix, elements, node_coords, 7800))
+        add('stiffness_matrix_free', 'assembly', N, 2 * N,
+            lambda: stiffness_operator(elements, node_coords, 210e9, 0.3))
+
+        # Boundary conditions
+        K, F = add('conductivity_bc_sparse', 'boundary_conditions', N, N,
+                   lambda: apply_conductivity_boundary_conditions(K_sparse, heat_sources, fixed_nodes,
+                                                                  fixed_temperatures))
+        results[-1]['nnz'] = int(K.nnz)
+        add('stiffness_bc_sparse', 'boundary_conditions', N, 2 * N,
+            lambda: apply_stiffness_boundary_conditions(K_elastic, np.zeros(2 * N), fixed_nodes))
+
+        # Solvers of the constrained heat transfer system
+        K_low = None
+        for name, solver_method, precision in SOLVERS:
+            if solver_method == 'solve' and not dense:
+                continue
+            if precision == 'mixed':
+                if K_low is None:
+                    K_low = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True,
+                                                                dtype=np.float32)
+                    K_low, _ = apply_conductivity_boundary_conditions(K_low, np.zeros(N), fixed_nodes,
+                                                                      fixed_temperatures)
+                system, K_full = K_low, K
+            else:
+                system, K_full = K, None
+
+            solution, span = add(f'heat_transfer_{name}', 'solve', N, N,
+                                 lambda: solve_case(system, F, solver_method, precision, K_full, node_coords))
+            results[-1]['nnz'] = int(K.nnz)
+            results[-1]['iterations'] = span.get('iterations')
+            results[-1]['residual'] = float(np.linalg.norm(K @ solution - F) / np.linalg.norm(F))
+
+        # The suite runs on CPU-only machines
+        if optional_import('cupy') is not None and dense:
+            solution = add('heat_transfer_cupy_solve', 'solve', N, N, lambda: cupy_solve(K, F))
+            results[-1]['residual'] = float(np.linalg.norm(K @ solution - F) / np.linalg.norm(F))
+
+    return results
+
+
+def machine_info():
+    """
+    Describes the machine and library versions the results were measured with.
+    """
+    cp = optional_import('cupy')
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'scipy': sp.__version__,
+        'cupy': None if cp is None else cp.__version__,
+    }
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    Finds the cases whose median time grew by more than the threshold relative to the baseline.
+
+    Parameters:
+    results (list of dict): Current results.
+    baseline (list of dict): Baseline results.
+    threshold (float): Allowed relative slowdown, e.g. 0.25 for 25 %.
+
+    Returns:
+    list of dict: Regressed cases with the baseline and current medians and their ratio.
+    """
+    baseline_medians = {(record['case'], record['n_dofs']): record['median'] for record in baseline}
+    regressions = []
+    for record in results:
+        key = (record['case'], record['n_dofs'])
+        if key not in baseline_medians or baseline_medians[key] <= 0:
+            continue
+        ratio = record['median'] / baseline_medians[key]
+        if ratio > 1 + threshold:
+            regressions.append({'case': record['case'], 'n_dofs': record['n_dofs'],
+                                'baseline': baseline_medians[key], 'median': record['median'], 'ratio': ratio})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end FEM pipeline benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 40, 80, 160],
+                        help="Nodes per side of the regular meshes")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed runs per case")
+    parser.add_argument('--output', default="results/fem_benchmark_results.json")
+    parser.add_argument('--baseline', default="results/fem_benchmark_baseline.json")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed relative slowdown of the median")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.repeats)
+    document = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'machine': machine_info(),
+                'results': results}
+
+    with open(args.output, 'w') as file:
+        json.dump(document, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(document, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['machine'] != document['machine']:
+            print("Warning: the baseline was measured on a different machine or library versions")
+
+        regressions = compare_with_baseline(results, baseline['results'], args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression['case']} at {regression['n_dofs']} dofs, "
+                  f"{regression['baseline']:.4f} s -> {regression['median']:.4f} s ({regression['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
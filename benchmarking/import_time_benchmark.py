@@ -0,0 +1,82 @@
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+# Modules imported by worker processes that never plot
+WORKER_MODULES = [
+    'src.fem.mesh',
+    'src.fem.conductivity.solve_fem',
+    'src.fem.stifness.solve_fem',
+    'src.fem.cache',
+    'src.fem.jobs',
+]
+
+# Optional backends the worker modules must only load on first use
+LAZY_MODULES = ['matplotlib', 'cupy', 'pyamg']
+
+# Median import time in seconds allowed for every worker module, including numpy and scipy
+IMPORT_BUDGET = 1.5
+
+# Runs in a fresh interpreter, so nothing is imported from an earlier measurement
+MEASURE_IMPORT = """
+import json, sys, time
+start_time = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start_time
+print(json.dumps({'time': elapsed, 'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+
+def measure_import(module, repeats):
+    """
+    Measures the cold import time of a module in fresh interpreters.
+
+    Parameters:
+    module (str): Module name.
+    repeats (int): Number of interpreters to start.
+
+    Returns:
+    dict: Median, minimum and maximum import time in seconds, and the optional backends the import loaded.
+    """
+    times = []
+    loaded = set()
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', MEASURE_IMPORT, module, *LAZY_MODULES], capture_output=True,
+                                text=True, check=True).stdout
+        measurement = json.loads(output.splitlines()[-1])
+        times.append(measurement['time'])
+        loaded.update(measurement['loaded'])
+    return {'module': module, 'median': float(np.median(times)), 'min': float(np.min(times)),
+            'max': float(np.max(times)), 'loaded': sorted(loaded)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold import time of the worker modules")
+    parser.add_argument('--repeats', type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET, help="Allowed median import time in seconds")
+    parser.add_argument('--output', default="results/import_time_results.json")
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    for module in WORKER_MODULES:
+        result = measure_import(module, args.repeats)
+        results.append(result)
+        print(f"{module:<36} median {result['median']:.3f} s  max {result['max']:.3f} s  "
+              f"loaded {', '.join(result['loaded']) or 'no optional backends'}")
+        if result['median'] > args.budget:
+            failures.append(f"{module} imports in {result['median']:.3f} s, over the budget of {args.budget:.3f} s")
+        if result['loaded']:
+            failures.append(f"{module} imports {', '.join(result['loaded'])} at load time")
+
+    with open(args.output, 'w') as file:
+        json.dump({'budget': args.budget, 'results': results}, file, indent=2)
+
+    for failure in failures:
+        print(f"Failure: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"All worker modules import within {args.budget:.3f} s without optional backends")
@@ -0,0 +1,98 @@
+import csv
+import time
+
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+from src.fem.mesh import boundary_nodes, create_random_triangular_mesh_in_rectangle
+from src.fem.profiling import Profiler
+from src.fem.quality import element_quality, quality_summary, smooth_laplacian, smooth_lloyd
+
+# Relative residual the plain CG solves run to, tight enough that slivers show in the iteration counts
+CG_TOLERANCE = 1e-8
+
+
+def smoothed_meshes(node_coords, elements, iterations):
+    """
+    Returns the mesh as generated and after Laplacian and Lloyd smoothing, with the smoothing time.
+    """
+    meshes = {'Delaunay': (node_coords, elements, 0.0)}
+
+    start_time = time.perf_counter()
+    laplacian_coords = smooth_laplacian(node_coords, elements, iterations)
+    meshes['Laplacian'] = (laplacian_coords, elements, time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    lloyd_coords, lloyd_elements = smooth_lloyd(node_coords, elements, iterations, retriangulate=True)
+    meshes['Lloyd'] = (lloyd_coords, lloyd_elements, time.perf_counter() - start_time)
+    return meshes
+
+
+def condition_number(node_coords, elements):
+    """
+    Calculates the condition number of the conductivity matrix restricted to the interior nodes.
+    """
+    K_global = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    free = np.setdiff1d(np.arange(len(node_coords)), boundary_nodes(elements))
+    K_free = K_global[free][:, free].tocsc()
+    largest = sp.sparse.linalg.eigsh(K_free, 1, which='LA', return_eigenvectors=False)[0]
+    smallest = sp.sparse.linalg.eigsh(K_free, 1, sigma=0, which='LM', return_eigenvectors=False)[0]
+    return largest / smallest
+
+
+def solve_conductivity(node_coords, elements, solver_method):
+    """
+    Solves a heat transfer problem with temperatures fixed on the whole boundary and a uniform heat source.
+
+    Returns:
+    float, int: Solve time in seconds and the number of solver iterations.
+    """
+    fixed_nodes = boundary_nodes(elements)
+    heat_sources = np.full(len(node_coords), 1.0 / len(node_coords))
+    profiler = Profiler(trace_memory=False)
+    solve_fem_heat_transfer(node_coords, elements, 1.0, fixed_nodes, node_coords[fixed_nodes, 0], heat_sources,
+                            solver_method=solver_method, profiler=profiler,
+                            solver_options={'rtol': CG_TOLERANCE} if solver_method == 'cg' else None)
+    solve = next(span for span in profiler.spans if span['name'] == 'solve')
+    return solve['wall_time'], solve.get('iterations')
+
+
+if __name__ == "__main__":
+    sizes = [2000, 10000, 50000]
+    solver_methods = ['cg', 'pcg']
+    smoothing_iterations = 20
+
+    with open("results/mesh_quality_results.csv", "a", newline='') as csvfile:
+        fieldnames = ['Nodes', 'Mesh', 'Smoothing Time', 'Min Angle', 'Mean Radius Ratio', 'Max Aspect Ratio',
+                      'Condition Number', 'Solver', 'Iterations', 'Solve Time']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        # Write header only if the file is empty
+        if csvfile.tell() == 0:
+            writer.writeheader()
+
+        for num_points in sizes:
+            node_coords, elements = create_random_triangular_mesh_in_rectangle(0, 1, 0, 1, num_points, seed=0)
+            for name, (coords, mesh_elements, smoothing_time) in smoothed_meshes(node_coords, elements,
+                                                                               smoothing_iterations).items():
+                summary = quality_summary(element_quality(coords, mesh_elements))
+                condition = condition_number(coords, mesh_elements)
+                for solver_method in solver_methods:
+                    solve_time, iterations = solve_conductivity(coords, mesh_elements, solver_method)
+                    writer.writerow({
+                        'Nodes': num_points,
+                        'Mesh': name,
+                        'Smoothing Time': round(smoothing_time, 4),
+                        'Min Angle': round(summary['min_angle']['min'], 3),
+                        'Mean Radius Ratio': round(summary['radius_ratio']['mean'], 4),
+                        'Max Aspect Ratio': round(summary['aspect_ratio']['max'], 1),
+                        'Condition Number': f"{condition:.3e}",
+                        'Solver': solver_method,
+                        'Iterations': iterations,
+                        'Solve Time': round(solve_time, 4),
+                    })
+                    print(f"{num_points} nodes, {name:<9} mean radius ratio {summary['radius_ratio']['mean']:.3f}, "
+                          f"condition number {condition:.2e}, {solver_method}: {iterations} iterations in "
+                          f"{solve_time:.3f} s")
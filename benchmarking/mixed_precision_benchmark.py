@@ -0,0 +1,55 @@
+import csv
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+
+def run_heat_transfer(n, solver_method, precision):
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n)
+
+    # Left edge held at 100 degrees with a uniform heat source
+    fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+    fixed_temperatures = np.full(len(fixed_nodes), 100.0)
+    heat_sources = np.full(len(node_coords), 1.0 / len(node_coords))
+
+    tracemalloc.start()
+    start_time = datetime.now()
+    temperatures = solve_fem_heat_transfer(node_coords, elements, 1.0, fixed_nodes, fixed_temperatures,
+                                           heat_sources, solver_method, precision=precision)
+    elapsed = datetime.now() - start_time
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return temperatures, elapsed, peak_memory
+
+
+if __name__ == "__main__":
+    sizes = [20, 40, 60]  # Nodes per side of the regular mesh
+    solver_methods = ['solve', 'spsolve', 'cg']
+
+    with open("results/mixed_precision_results.csv", "a", newline='') as csvfile:
+        fieldnames = ['Nodes', 'Solver', 'Precision', 'Time', 'Peak Memory (MB)', 'Max Difference']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        # Write header only if the file is empty
+        if csvfile.tell() == 0:
+            writer.writeheader()
+
+        for n in sizes:
+            for solver_method in solver_methods:
+                reference, _, _ = run_heat_transfer(n, solver_method, 'double')
+                for precision in ['double', 'mixed']:
+                    temperatures, elapsed, peak_memory = run_heat_transfer(n, solver_method, precision)
+                    writer.writerow({
+                        'Nodes': n * n,
+                        'Solver': solver_method,
+                        'Precision': precision,
+                        'Time': elapsed,
+                        'Peak Memory (MB)': round(peak_memory / 2 ** 20, 2),
+                        'Max Difference': np.abs(temperatures - reference).max()
+                    })
+                    print(f"{n * n} nodes, {solver_method}, {precision}: {elapsed}, {peak_memory / 2 ** 20:.2f} MB")
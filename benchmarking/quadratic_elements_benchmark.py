@@ -0,0 +1,102 @@
+import csv
+import time
+
+import numpy as np
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.mesh import boundary_nodes, create_regular_triangular_mesh_in_rectangle
+from src.fem.quadratic import (assemble_quadratic_conductivity_matrix, field_l2_error, quadratic_boundary_nodes,
+                               quadratic_mesh, source_load_vector)
+from src.fem.solvers import solve_linear_system
+
+
+def exact_solution(points):
+    """
+    Temperature of the benchmark problem, zero on the boundary of the unit square.
+    """
+    x, y = points[:, 0], points[:, 1]
+    return np.sin(np.pi * x) * np.sin(2 * np.pi * y) * np.exp(x)
+
+
+def heat_source(points):
+    """
+    Heat source -div grad T of the benchmark temperature.
+    """
+    x, y = points[:, 0], points[:, 1]
+    T = exact_solution(points)
+    return (5 * np.pi ** 2 - 1) * T - 2 * np.pi * np.cos(np.pi * x) * np.sin(2 * np.pi * y) * np.exp(x)
+
+
+def solve_benchmark_problem(n, order, solver_method):
+    """
+    Solves the benchmark problem on a regular mesh with n nodes per side of linear or quadratic elements.
+
+    Returns:
+    dict: Number of dofs and nonzeros, the mesh, assembly and solve times and the L2 error.
+    """
+    start_time = time.perf_counter()
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n)
+    if order == 2:
+        node_coords, elements, _ = quadratic_mesh(node_coords, elements)
+        fixed_nodes = quadratic_boundary_nodes(elements)
+    else:
+        fixed_nodes = boundary_nodes(elements)
+    mesh_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    if order == 2:
+        K_global = assemble_quadratic_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    else:
+        K_global = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    K_global, F = apply_boundary_conditions(K_global, source_load_vector(node_coords, elements, heat_source),
+                                            fixed_nodes, np.zeros(len(fixed_nodes)))
+    assembly_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    temperatures = solve_linear_system(K_global, F, solver_method)
+    solve_time = time.perf_counter() - start_time
+
+    return {
+        'dofs': len(node_coords),
+        'nnz': K_global.nnz,
+        'mesh_time': mesh_time,
+        'assembly_time': assembly_time,
+        'solve_time': solve_time,
+        'error': field_l2_error(node_coords, elements, temperatures, exact_solution),
+    }
+
+
+if __name__ == "__main__":
+    # Nodes per side, the quadratic meshes have as many dofs as linear meshes with twice the nodes per side
+    linear_sizes = [33, 65, 129, 257, 513]
+    quadratic_sizes = [9, 17, 33, 65, 129, 257]
+    solver_method = 'spsolve'
+
+    with open("results/quadratic_elements_results.csv", "a", newline='') as csvfile:
+        fieldnames = ['Order', 'Nodes Per Side', 'Dofs', 'Nonzeros', 'Mesh Time', 'Assembly Time', 'Solve Time',
+                      'Total Time', 'L2 Error']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        # Write header only if the file is empty
+        if csvfile.tell() == 0:
+            writer.writeheader()
+
+        for order, sizes in [(1, linear_sizes), (2, quadratic_sizes)]:
+            for n in sizes:
+                result = solve_benchmark_problem(n, order, solver_method)
+                total_time = result['mesh_time'] + result['assembly_time'] + result['solve_time']
+                writer.writerow({
+                    'Order': order,
+                    'Nodes Per Side': n,
+                    'Dofs': result['dofs'],
+                    'Nonzeros': result['nnz'],
+                    'Mesh Time': round(result['mesh_time'], 4),
+                    'Assembly Time': round(result['assembly_time'], 4),
+                    'Solve Time': round(result['solve_time'], 4),
+                    'Total Time': round(total_time, 4),
+                    'L2 Error': f"{result['error']:.3e}",
+                })
+                print(f"P{order}: {result['dofs']:7d} dofs, {result['nnz']:8d} nonzeros, L2 error "
+                      f"{result['error']:.2e}, assembly {result['assembly_time']:.3f} s, solve "
+                      f"{result['solve_time']:.3f} s, total {total_time:.3f} s")
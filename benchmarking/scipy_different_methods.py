@@ -1,140 +1,105 @@
 import numpy as np
 import scipy as sp
-import scipy.sparse as sps
 import scipy.sparse.linalg as spla
-from datetime import datetime
+import time
 import csv
 
+from benchmarking.benchmark_matrices import generate_fem_system
 
-# Генерация полной системы
-def generate_large_system_scipy(size, seed):
-    np.random.seed(seed)
-    A = np.random.rand(size, size)
-    B = np.random.rand(size)
-    return A, B
 
+# Итерационные методы SciPy; lsqr считает итерации сам и не принимает callback
+ITERATIVE_METHODS = {
+    'cg': spla.cg,
+    'bicg': spla.bicg,
+    'bicgstab': spla.bicgstab,
+    'gmres': spla.gmres,
+    'minres': spla.minres,
+}
 
-# Генерация разреженной системы
-def generate_large_sparse_system_scipy(size, density, seed):
-    np.random.seed(seed)
-    A = sps.random(size, size, density=density, format='csr')
-    B = np.random.rand(size)
-    return A, B
+# Плотный solve пропускается для систем большего размера
+DENSE_SIZE_LIMIT = 5000
 
 
-# Тестирование различных функций SciPy
-def test_scipy_spsolve(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X = spla.spsolve(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "spsolve"
+# Тестирование одной функции SciPy на системе A x = B
+def test_scipy_method(method, A, B):
+    iterations = None
+    start_time = time.perf_counter()
+    if method == 'solve':
+        X = sp.linalg.solve(A.toarray(), B, assume_a='sym')
+    elif method == 'spsolve':
+        X = spla.spsolve(A.tocsc(), B)
+    elif method == 'lsqr':
+        X, _, iterations = spla.lsqr(A, B)[:3]
+    else:
+        iterations = 0
 
+        def count_iteration(*_):
+            nonlocal iterations
+            iterations += 1
 
-def test_scipy_lsqr(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X = spla.lsqr(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "lsqr"
+        options = {'callback_type': 'pr_norm'} if method == 'gmres' else {}
+        X, _ = ITERATIVE_METHODS[method](A, B, callback=count_iteration, **options)
+    elapsed = time.perf_counter() - start_time
 
-
-def test_scipy_cg(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X, _ = spla.cg(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "cg"
-
-
-def test_scipy_bicg(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X, _ = spla.bicg(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "bicg"
-
-
-def test_scipy_bicgstab(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X, _ = spla.bicgstab(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "bicgstab"
-
-
-def test_scipy_gmres(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X, _ = spla.gmres(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "gmres"
-
-
-def test_scipy_minres(size, density, seed):
-    A, B = generate_large_sparse_system_scipy(size, density, seed)
-    start_time = datetime.now()
-    X, _ = spla.minres(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "minres"
-
-
-def test_scipy_solve(size, seed):
-    A, B = generate_large_system_scipy(size, seed)
-    start_time = datetime.now()
-    X = sp.linalg.solve(A, B)
-    end_time = datetime.now()
-    return end_time - start_time, "solve"
+    residual = np.linalg.norm(A @ X - B) / np.linalg.norm(B)
+    return elapsed, iterations, residual
 
 
 # Основной блок выполнения
 if __name__ == "__main__":
-    size = 30000  # Задайте нужный размер
-    density = 0.01  # Плотность разреженной матрицы
+    size = 10000  # Задайте нужное число степеней свободы
     seed = 1  # Текущий seed для воспроизводимости
 
-    # Определяем функции, которые требуют аргумент density
-    sparse_test_functions = [
-        test_scipy_spsolve,
-        test_scipy_lsqr,
-        test_scipy_cg,
-        test_scipy_bicg,
-        test_scipy_bicgstab,
-        # test_scipy_gmres,
-        test_scipy_minres
+    methods = [
+        'solve',
+        'spsolve',
+        'lsqr',
+        'cg',
+        'bicg',
+        'bicgstab',
+        # 'gmres',  # GMRES(20) по умолчанию стагнирует на анизотропных и контрастных системах
+        'minres'
     ]
 
-    dense_test_functions = [
-        test_scipy_solve
+    # Семейство FEM-систем: качество сетки, анизотропия и контраст материалов
+    variants = [
+        {},
+        {'mesh': 'random'},
+        {'distortion': 0.3},
+        {'anisotropy': 10.0},
+        {'contrast': 1e4},
     ]
 
     # Запуск тестов и запись результатов
-    with open("results/scipy_test_results.csv", "a", newline='') as csvfile:
-        fieldnames = ['Matrix Size', 'Seed', 'Function', 'Time']
+    with open("results/scipy_fem_test_results.csv", "a", newline='') as csvfile:
+        fieldnames = ['Problem', 'Matrix Size', 'Nonzeros', 'Mesh', 'Distortion', 'Anisotropy', 'Contrast', 'Seed',
+                      'Function', 'Time (s)', 'Iterations', 'Relative Residual']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
         # Запись заголовка только если файл пуст
         if csvfile.tell() == 0:
             writer.writeheader()
 
-        # Запуск тестов для разреженных матриц
-        for test_func in sparse_test_functions:
-            time_sp, method = test_func(size, density, seed)
-            writer.writerow({
-                'Matrix Size': size,
-                'Seed': seed,
-                'Function': method,
-                'Time': time_sp
-            })
-            print(f"{method} time: {time_sp}")
-
-        # Запуск тестов для плотных матриц
-        for test_func in dense_test_functions:
-            time_sp, method = test_func(size, seed)
-            writer.writerow({
-                'Matrix Size': size,
-                'Seed': seed,
-                'Function': method,
-                'Time': time_sp
-            })
-            print(f"{method} time: {time_sp}")
+        for problem in ['laplacian', 'elasticity']:
+            for variant in variants:
+                A, B = generate_fem_system(size, problem, seed=seed, **variant)
+                for method in methods:
+                    if method == 'solve' and A.shape[0] > DENSE_SIZE_LIMIT:
+                        continue
+                    elapsed, iterations, residual = test_scipy_method(method, A, B)
+                    writer.writerow({
+                        'Problem': problem,
+                        'Matrix Size': A.shape[0],
+                        'Nonzeros': A.nnz,
+                        'Mesh': variant.get('mesh', 'regular'),
+                        'Distortion': variant.get('distortion', 0.0),
+                        'Anisotropy': variant.get('anisotropy', 1.0),
+                        'Contrast': variant.get('contrast', 1.0),
+                        'Seed': seed,
+                        'Function': method,
+                        'Time (s)': elapsed,
+                        'Iterations': iterations,
+                        'Relative Residual': residual
+                    })
+                    print(f"{problem} {variant} {method}: {elapsed:.4f} s, {iterations} iterations, "
+                          f"residual {residual:.2e}")
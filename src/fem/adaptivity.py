@@ -0,0 +1,234 @@
+import time
+
+import numpy as np
+
+from src.fem.assembly import element_dofs, scatter_element_matrices
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import element_conductivity_matrices, element_gradient_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.mesh import boundary_nodes
+from src.fem.postprocessing import element_gradients, nodal_average
+from src.fem.profiling import get_profiler
+from src.fem.refinement import interpolate_to_refined, refine_red_green
+from src.fem.solvers import solve_linear_system
+
+
+def zz_error_indicators(node_coords, elements, temperatures, k=1.0):
+    """
+    Estimates the energy norm error of a heat transfer solution on every element (Zienkiewicz-Zhu).
+
+    The gradient recovered by nodal averaging is compared with the constant element gradient. The difference is
+    linear on the element, so its squared norm is integrated exactly from the three nodal differences d_i:
+    A / 12 * (sum |d_i|^2 + |sum d_i|^2).
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+    temperatures (np.ndarray): Vector of temperatures (N).
+    k (float or np.ndarray): Thermal conductivity, a scalar or one value per element (E).
+
+    Returns:
+    np.ndarray, float: Squared element error indicators (E) and the squared energy norm of the solution.
+    """
+    elements = np.asarray(elements)
+    A, B = element_gradient_matrices(np.asarray(node_coords)[elements])
+    gradients = element_gradients(node_coords, elements, temperatures, B)
+    recovered = nodal_average(node_coords, elements, gradients, A)
+
+    differences = recovered[elements] - gradients[:, np.newaxis, :]
+    integral = A / 12 * ((differences ** 2).sum(axis=(1, 2)) + (differences.sum(axis=1) ** 2).sum(axis=1))
+    energy = np.sum(k * A * (gradients ** 2).sum(axis=1))
+    return k * integral, energy
+
+
+def dorfler_marking(indicators, theta=0.5):
+    """
+    Marks the fewest elements whose indicators add up to a fraction theta of the total (Dörfler marking).
+
+    Parameters:
+    indicators (np.ndarray): Squared element error indicators (E).
+    theta (float): Fraction of the total estimated error to mark, between 0 and 1.
+
+    Returns:
+    np.ndarray: Boolean mask of the marked elements (E).
+    """
+    order = np.argsort(indicators)[::-1]
+    cumulative = np.cumsum(indicators[order])
+    count = min(np.searchsorted(cumulative, theta * cumulative[-1]) + 1, len(indicators))
+    marked = np.zeros(len(indicators), dtype=bool)
+    marked[order[:count]] = True
+    return marked
+
+
+def solve_adaptive_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_source=0.0,
+                                 tolerance=1e-2, max_nodes=100000, max_steps=30, theta=0.5, solver_method='pcg',
+                                 profiler=None):
+    """
+    Solves a heat transfer problem on a mesh refined where the solution needs it.
+
+    Every step solves, estimates the error of every element with zz_error_indicators, marks elements with
+    dorfler_marking and refines them with refine_red_green, until the estimated relative error in the energy norm
+    reaches the tolerance or the mesh reaches max_nodes. The element matrices of the elements a refinement leaves
+    unchanged are reused, and the previous solution interpolated onto the refined mesh is the initial guess of the
+    iterative solvers.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates of the initial mesh (Nx2).
+    elements (list of list of int): Elements of the initial mesh.
+    k (float, np.ndarray or callable): Thermal conductivity, a scalar, one value per initial element, inherited by
+        the refined elements, or a function of the element centroids.
+    fixed_nodes (list of int): Fixed nodes of the initial mesh. Midpoints added on boundary edges between two fixed
+        nodes are fixed as well.
+    fixed_temperatures (list of float or callable): Temperatures of the fixed nodes, or a function of the fixed node
+        coordinates (Mx2) that is also evaluated at the fixed midpoints.
+    heat_source (float or callable): Heat source per unit area, a scalar or a function of the element centroids,
+        lumped onto the element nodes.
+    tolerance (float): Estimated relative energy norm error to reach.
+    max_nodes (int): Node budget, no further refinement once the mesh has this many nodes.
+    max_steps (int): Maximum number of solves.
+    theta (float): Fraction of the estimated error marked for refinement in every step.
+    solver_method (str): Method to solve the system of equations, see solve_linear_system.
+    profiler (Profiler, optional): Records the assembly, solve, estimate and refinement spans of every step.
+
+    Returns:
+    np.ndarray, np.ndarray, np.ndarray, list of dict: Node coordinates, elements and temperatures of the final
+        mesh, and the history of the steps with the number of nodes and elements, the estimated 'error' and
+        'relative_error', the number of 'reused_elements' and the step 'time'.
+    """
+    profiler = get_profiler(profiler)
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+
+    fixed = np.zeros(len(node_coords), dtype=bool)
+    fixed[np.asarray(fixed_nodes, dtype=int)] = True
+    fixed_values = np.zeros(len(node_coords))
+    if callable(fixed_temperatures):
+        fixed_values[fixed] = fixed_temperatures(node_coords[fixed])
+    else:
+        fixed_values[np.asarray(fixed_nodes, dtype=int)] = fixed_temperatures
+
+    # Per-element conductivity follows the elements through the refinements unless it is a function
+    k_elements = None if callable(k) or np.ndim(k) == 0 else np.asarray(k, dtype=float)
+    ke = None
+    refinement = None
+    green_parents = None
+    temperatures = None
+    history = []
+
+    for step in range(max_steps):
+        start_time = time.perf_counter()
+
+        with profiler.span('assembly'):
+            if refinement is None:
+                k_values = evaluate_element_field(k, node_coords, elements) if k_elements is None else k_elements
+                ke = element_conductivity_matrices(k_values, node_coords[elements])
+                reused = 0
+            else:
+                unchanged = refinement['unchanged']
+                new = ~unchanged
+                if k_elements is not None:
+                    k_elements = k_elements[refinement['element_parents']]
+                    k_values = k_elements
+                elif callable(k):
+                    k_values = np.empty(len(elements))
+                    k_values[unchanged] = k_values_old[refinement['element_parents'][unchanged]]
+                    k_values[new] = evaluate_element_field(k, node_coords, elements[new])
+                else:
+                    k_values = k
+                ke_new = np.empty((len(elements), 3, 3))
+                ke_new[unchanged] = ke[refinement['element_parents'][unchanged]]
+                ke_new[new] = element_conductivity_matrices(np.broadcast_to(k_values, (len(elements),))[new],
+                                                            node_coords[elements[new]])
+                ke = ke_new
+                reused = int(unchanged.sum())
+            k_values_old = np.broadcast_to(k_values, (len(elements),))
+            K_global = scatter_element_matrices(ke, element_dofs(elements), len(node_coords), sparse=True)
+
+            areas, _ = element_gradient_matrices(node_coords[elements])
+            source = evaluate_element_field(heat_source, node_coords, elements) * areas / 3
+            F = np.bincount(elements.ravel(), np.repeat(source, 3), minlength=len(node_coords))
+            K_bc, F_bc = apply_boundary_conditions(K_global, F, np.flatnonzero(fixed), fixed_values[fixed])
+
+        with profiler.span('solve'):
+            x0 = None
+            if temperatures is not None:
+                x0 = interpolate_to_refined(temperatures, refinement['midpoint_parents'])
+                x0[fixed] = fixed_values[fixed]
+            temperatures = solve_linear_system(K_bc, F_bc, solver_method, x0=x0, profiler=profiler)
+
+        with profiler.span('estimate'):
+            indicators, energy = zz_error_indicators(node_coords, elements, temperatures, k_values_old)
+            error = np.sqrt(indicators.sum())
+            relative_error = error / np.sqrt(energy) if energy > 0 else error
+
+        history.append({'step': step, 'num_nodes': len(node_coords), 'num_elements': len(elements),
+                        'error': float(error), 'relative_error': float(relative_error), 'reused_elements': reused,
+                        'time': time.perf_counter() - start_time})
+        if relative_error <= tolerance or len(node_coords) >= max_nodes or step == max_steps - 1:
+            break
+
+        with profiler.span('refinement'):
+            marked = dorfler_marking(indicators, theta)
+            num_nodes = len(node_coords)
+            node_coords, elements, refinement = refine_red_green(node_coords, elements, marked, green_parents)
+            green_parents = refinement['green_parents']
+
+            # Midpoints on boundary edges between fixed nodes are fixed
+            midpoint_parents = refinement['midpoint_parents']
+            new_fixed = np.zeros(len(node_coords), dtype=bool)
+            new_fixed[num_nodes + np.flatnonzero(fixed[midpoint_parents].all(axis=1))] = True
+            new_fixed[np.setdiff1d(np.arange(len(node_coords)), boundary_nodes(elements))] = False
+            fixed = np.concatenate([fixed, np.zeros(len(midpoint_parents), dtype=bool)]) | new_fixed
+            fixed_values = interpolate_to_refined(fixed_values, midpoint_parents)
+            if callable(fixed_temperatures) and new_fixed.any():
+                fixed_values[new_fixed] = fixed_temperatures(node_coords[new_fixed])
+        history[-1]['time'] = time.perf_counter() - start_time
+
+    return node_coords, elements, temperatures, history
+
+
+if __name__ == '__main__':
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    def l_shaped_mesh(n):
+        """
+        Regular mesh of (-1, 1)^2 without the quadrant x > 0, y < 0.
+        """
+        node_coords, elements = create_regular_triangular_mesh_in_rectangle(-1, 1, -1, 1, n, n)
+        centroids = node_coords[elements].mean(axis=1)
+        elements = elements[~((centroids[:, 0] > 0) & (centroids[:, 1] < 0))]
+        used, elements = np.unique(elements, return_inverse=True)
+        return node_coords[used], elements.reshape(-1, 3)
+
+    def exact_solution(points):
+        """
+        Harmonic function with the corner singularity of the L-shaped domain, zero on the edges of the corner.
+        """
+        r = np.linalg.norm(points, axis=1)
+        angle = np.mod(np.arctan2(points[:, 1], points[:, 0]), 2 * np.pi)
+        return r ** (2 / 3) * np.sin(2 * angle / 3)
+
+    tolerance = 0.02
+    node_coords, elements = l_shaped_mesh(9)
+    fixed_nodes = boundary_nodes(elements)
+
+    start_time = time.perf_counter()
+    node_coords, elements, temperatures, history = solve_adaptive_heat_transfer(
+        node_coords, elements, 1.0, fixed_nodes, exact_solution, tolerance=tolerance, solver_method='pcg')
+    adaptive_time = time.perf_counter() - start_time
+    for entry in history:
+        print(f"Step {entry['step']:2d}: {entry['num_nodes']:7d} nodes, estimated relative error "
+              f"{entry['relative_error']:.4f}, {entry['reused_elements']} element matrices reused")
+    print(f"Adaptive: {len(node_coords)} nodes in {adaptive_time:.2f} s, "
+          f"max nodal error {np.abs(temperatures - exact_solution(node_coords)).max():.2e}")
+
+    # Uniform meshes for the same estimated error
+    for n in (17, 33, 65, 129, 257):
+        uniform_coords, uniform_elements = l_shaped_mesh(n)
+        start_time = time.perf_counter()
+        _, _, uniform_temperatures, uniform_history = solve_adaptive_heat_transfer(
+            uniform_coords, uniform_elements, 1.0, boundary_nodes(uniform_elements), exact_solution, max_steps=1)
+        print(f"Uniform: {len(uniform_coords)} nodes in {time.perf_counter() - start_time:.2f} s, estimated relative "
+              f"error {uniform_history[0]['relative_error']:.4f}")
+        if uniform_history[0]['relative_error'] <= tolerance:
+            break
@@ -0,0 +1,239 @@
+import numpy as np
+import scipy as sp
+
+# Relative difference below which element geometries are taken as equal when deduplicating element matrices
+GEOMETRY_TOLERANCE = 1e-9
+# Number of elements sampled to find the shapes a mesh repeats
+DEDUPLICATION_SAMPLE_SIZE = 4096
+
+
+def element_dofs(elements, dofs_per_node=1):
+    """
+    Calculates the global degrees of freedom of every element.
+
+    Parameters:
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    dofs_per_node (int): Number of degrees of freedom per node (1 for heat transfer, 2 for elasticity).
+
+    Returns:
+    np.ndarray: Element degrees of freedom (E x 3*dofs_per_node), interleaved per node.
+    """
+    elements = np.asarray(elements)
+    dofs = dofs_per_node * elements[:, :, np.newaxis] + np.arange(dofs_per_node)
+    return dofs.reshape(len(elements), -1)
+
+
+def scatter_element_matrices(element_matrices, dofs, n_dofs, sparse=False, dtype=np.float64):
+    """
+    Adds a batch of element matrices into a global matrix in one pass.
+
+    Parameters:
+    element_matrices (np.ndarray): Element matrices (E x n x n).
+    dofs (np.ndarray): Global degrees of freedom of every element (E x n).
+    n_dofs (int): Total number of degrees of freedom.
+    sparse (bool): Whether to return a sparse CSR matrix instead of a dense array.
+    dtype (np.dtype): Floating point type of the global matrix.
+
+    Returns:
+    np.ndarray or sp.sparse.csr_matrix: Global matrix (n_dofs x n_dofs).
+    """
+    n = dofs.shape[1]
+    rows = np.repeat(dofs, n, axis=1).ravel()
+    cols = np.tile(dofs, (1, n)).ravel()
+    K_global = sp.sparse.coo_matrix((element_matrices.ravel().astype(dtype, copy=False), (rows, cols)),
+                                    shape=(n_dofs, n_dofs))
+
+    if sparse:
+        return K_global.tocsr()
+    return K_global.toarray()
+
+
+def assembly_plan(dofs, n_dofs, fixed_dofs=None):
+    """
+    Computes the sparsity pattern of a global matrix once, so later assemblies only sum the numeric values.
+
+    Every element matrix entry is mapped to its position in the CSR data array. Reassembly with assemble_on_plan
+    is then one bincount over the element matrices, without sorting indices or merging duplicates again, which is
+    what iterative solvers that change the values but not the mesh need.
+
+    Parameters:
+    dofs (np.ndarray): Global degrees of freedom of every element (E x n).
+    n_dofs (int): Total number of degrees of freedom.
+    fixed_dofs (list of int, optional): Degrees of freedom whose rows and columns are replaced by the identity on
+        every assembly, as the boundary condition functions do.
+
+    Returns:
+    dict: CSR 'indptr' and 'indices', the data 'positions' of the element matrix entries (E x n x n), the number
+        of nonzeros 'nnz', and the positions of the 'constrained' entries and of the 'fixed_diagonal' entries.
+    """
+    dofs = np.asarray(dofs, dtype=np.int64)
+    n = dofs.shape[1]
+    rows = np.repeat(dofs, n, axis=1).ravel()
+    cols = np.tile(dofs, (1, n)).ravel()
+
+    # Sorted row-major keys are the CSR order of the entries
+    keys = rows * n_dofs + cols
+    order = np.argsort(keys, kind='stable')
+    first = np.concatenate([[True], keys[order][1:] != keys[order][:-1]])
+    positions = np.empty(len(keys), dtype=np.int64)
+    positions[order] = np.cumsum(first) - 1
+
+    unique_keys = keys[order[first]]
+    indices = (unique_keys % n_dofs).astype(np.int32)
+    indptr = np.searchsorted(unique_keys // n_dofs, np.arange(n_dofs + 1)).astype(np.int32)
+
+    plan = {'indptr': indptr, 'indices': indices, 'positions': positions.reshape(len(dofs), n, n),
+            'nnz': len(unique_keys), 'n_dofs': n_dofs}
+    if fixed_dofs is not None:
+        fixed = np.zeros(n_dofs, dtype=bool)
+        fixed[np.asarray(fixed_dofs, dtype=int)] = True
+        entry_rows = unique_keys // n_dofs
+        entry_cols = unique_keys % n_dofs
+        plan['constrained'] = np.flatnonzero(fixed[entry_rows] | fixed[entry_cols])
+        plan['fixed_diagonal'] = np.flatnonzero(fixed[entry_rows] & (entry_rows == entry_cols))
+    return plan
+
+
+def assemble_on_plan(plan, element_matrices):
+    """
+    Sums element matrices into the fixed sparsity pattern of an assembly plan.
+
+    Parameters:
+    plan (dict): Assembly plan, see assembly_plan.
+    element_matrices (np.ndarray): Element matrices (E x n x n) in the element order of the plan.
+
+    Returns:
+    sp.sparse.csr_matrix: Global matrix (n_dofs x n_dofs), with identity rows and columns for the fixed degrees
+        of freedom of the plan.
+    """
+    data = np.bincount(plan['positions'].ravel(), weights=element_matrices.ravel(), minlength=plan['nnz'])
+    if 'constrained' in plan:
+        data[plan['constrained']] = 0
+        data[plan['fixed_diagonal']] = 1
+    return sp.sparse.csr_matrix((data, plan['indices'], plan['indptr']), shape=(plan['n_dofs'], plan['n_dofs']))
+
+
+def _quantize(values, tolerance):
+    """
+    Rounds values to integer multiples of tolerance times their largest magnitude.
+    """
+    scale = np.abs(values).max() if values.size else 0.0
+    if scale == 0:
+        return np.zeros(values.shape, dtype=np.int64)
+    values = values * (1 / (scale * tolerance))
+    return np.rint(values, out=values).astype(np.int64)
+
+
+def _group_hashes(hashes):
+    """
+    Groups equal hashes by sorting, returns the first index of every group and the group of every hash.
+    """
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    first = np.concatenate([[True], sorted_hashes[1:] != sorted_hashes[:-1]])
+    groups = np.empty(len(hashes), dtype=np.int64)
+    groups[order] = np.cumsum(first) - 1
+    return order[first], groups
+
+
+def unique_element_geometries(coords, invariance='translation', parameters=(), tolerance=GEOMETRY_TOLERANCE):
+    """
+    Groups elements that are copies of each other, so their element matrices are computed once.
+
+    Translated copies have equal edge vectors. Rotated and reflected copies have equal coordinates in the frame of
+    their first edge, which only leaves matrices unchanged that are invariant under rotation, like the isotropic
+    conductivity and the mass matrix, but not the stiffness matrix. Both are compared in the local node order,
+    rounded to the tolerance relative to the largest one, and grouped by a hash of the rounded values.
+
+    The shapes a structured or periodic mesh repeats are found in a small sample of the elements, so most
+    elements are only looked up among them. When the sample shows almost only distinct elements, as on
+    unstructured meshes, every element is its own group and nothing is sorted.
+
+    Parameters:
+    coords (np.ndarray): Element node coordinates (E x n x 2).
+    invariance (str): 'translation' or 'rotation'.
+    parameters (tuple): Further per-element values the element matrices depend on, e.g. Poisson's ratio, compared
+        the same way. Scalars are ignored.
+    tolerance (float): Relative tolerance under which geometries are taken as equal.
+
+    Returns:
+    np.ndarray, np.ndarray: Indices of one representative element per group (U), and the group of every
+        element (E).
+    """
+    coords = np.asarray(coords, dtype=float)
+    num_elements = len(coords)
+    edges = coords[:, 1:] - coords[:, :1]
+    if invariance == 'translation':
+        features = [edges.reshape(num_elements, -1)]
+    elif invariance == 'rotation':
+        # Length of the first edge and the other nodes in its frame, mirrored to one side of it
+        length = np.sqrt((edges[:, 0] ** 2).sum(axis=1))
+        along = (edges[:, 1:] * edges[:, :1]).sum(axis=2) / length[:, np.newaxis]
+        across = np.abs(edges[:, 1:, 1] * edges[:, :1, 0] - edges[:, 1:, 0] * edges[:, :1, 1]) / length[:, np.newaxis]
+        features = [np.column_stack([length, along, across])]
+    else:
+        raise ValueError(f"Unknown element invariance: {invariance}")
+    features += [np.asarray(value, dtype=float)[:, np.newaxis] for value in parameters if np.ndim(value) == 1]
+    keys = np.hstack([_quantize(feature, tolerance) for feature in features])
+
+    # Wrapping polynomial hash of the rounded values
+    hashes = np.zeros(num_elements, dtype=np.uint64)
+    for column in keys.T:
+        hashes = hashes * np.uint64(1000003) + column.view(np.uint64)
+
+    sample = np.arange(0, num_elements, max(num_elements // DEDUPLICATION_SAMPLE_SIZE, 1))
+    sample_representatives, _ = _group_hashes(hashes[sample])
+    if len(sample_representatives) > 0.9 * len(sample):
+        return np.arange(num_elements), np.arange(num_elements)
+    representatives = sample[sample_representatives]
+
+    # Shapes missing from the sample are grouped among the remaining elements only
+    known_hashes = hashes[representatives]
+    order = np.argsort(known_hashes)
+    slots = order[np.minimum(np.searchsorted(known_hashes[order], hashes), len(order) - 1)]
+    groups = slots
+    missing = np.flatnonzero(known_hashes[slots] != hashes)
+    if len(missing):
+        missing_representatives, missing_groups = _group_hashes(hashes[missing])
+        groups[missing] = len(representatives) + missing_groups
+        representatives = np.concatenate([representatives, missing[missing_representatives]])
+
+    # Elements that only share a hash with their representative are told apart by the keys themselves
+    if not (keys[representatives][groups] == keys).all():
+        _, representatives, groups = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return representatives, groups.ravel()
+
+
+def deduplicated_element_matrices(compute, coords, invariance='translation', factor=1.0, parameters=(),
+                                  tolerance=GEOMETRY_TOLERANCE):
+    """
+    Computes element matrices once per distinct element and expands them to all elements by index.
+
+    Parameters:
+    compute (callable): Calculates the element matrices of a batch from its coordinates (U x n x 2) and the
+        parameters of its elements.
+    coords (np.ndarray): Element node coordinates (E x n x 2).
+    invariance (str): 'translation' or 'rotation', see unique_element_geometries.
+    factor (float or np.ndarray): Scalar or per-element value (E) the matrices are proportional to, e.g. the
+        conductivity, applied after the expansion so that it does not split the groups.
+    parameters (tuple): Scalars or per-element values (E) compute takes after the coordinates.
+    tolerance (float): Relative tolerance under which geometries are taken as equal.
+
+    Returns:
+    np.ndarray: Element matrices (E x m x m).
+    """
+    representatives, groups = unique_element_geometries(coords, invariance, parameters, tolerance)
+    if len(representatives) == len(groups):
+        return np.asarray(factor, dtype=float)[..., np.newaxis, np.newaxis] * compute(coords, *parameters)
+    unique_parameters = [value[representatives] if np.ndim(value) == 1 else value for value in parameters]
+    matrices = compute(np.asarray(coords)[representatives], *unique_parameters)
+
+    factor = np.asarray(factor, dtype=float)
+    if factor.ndim == 0:
+        return (factor * matrices)[groups]
+    return matrices[groups] * factor[:, np.newaxis, np.newaxis]
+
+
+if __name__ == '__main__':
+    elements = [[0, 1, 2], [0, 2, 3]]
+    print(element_dofs(elements, dofs_per_node=2))
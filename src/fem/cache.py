@@ -0,0 +1,550 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import time
+import types
+from collections import OrderedDict
+
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions as apply_conductivity_boundary_conditions
+from src.fem.conductivity.boundary_conditions import lift_fixed_temperatures
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+from src.fem.stifness.boundary_conditions import apply_boundary_conditions as apply_stiffness_boundary_conditions
+from src.fem.stifness.solve_fem import solve_fem
+from src.fem.stifness.stiffness_matrix import assemble_global_stiffness_matrix
+
+# Default cache directory, shared by all processes of the user
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'fem')
+
+# Size of the cache directory above which the least recently used entries are evicted
+CACHE_SIZE_LIMIT = 4 * 2 ** 30
+
+# Temporary files of interrupted writes older than this many seconds are removed
+STALE_WRITE_AGE = 3600
+
+# Entries such as factorizations every cache keeps in memory, least recently used ones are dropped first
+MEMORY_ENTRIES = 8
+
+# Cache used by the cached_* functions when none is given
+_default_cache = None
+
+
+def _hash_code(digest, code):
+    """
+    Adds a code object to a digest: its bytecode, names and constants, with nested code objects for inner functions
+    and comprehensions.
+    """
+    digest.update(code.co_code)
+    digest.update(pickle.dumps((code.co_names, code.co_varnames, code.co_freevars)))
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            _hash_code(digest, constant)
+        else:
+            digest.update(pickle.dumps(constant))
+
+
+def _hash_value(digest, value, active):
+    """
+    Adds one value to a digest, recursing into containers and functions.
+    """
+    if sp.sparse.issparse(value):
+        value = sp.sparse.csr_matrix(value)
+        digest.update(f"sparse{value.shape}".encode())
+        for item in (value.data, value.indices, value.indptr):
+            _hash_value(digest, item, active)
+    elif isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        digest.update(f"{value.dtype.str}{value.shape}".encode())
+        digest.update(value.data)
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _hash_value(digest, item, active)
+    elif isinstance(value, dict):
+        digest.update(f"dict{len(value)}".encode())
+        for key, item in sorted(value.items(), key=lambda pair: repr(pair[0])):
+            _hash_value(digest, key, active)
+            _hash_value(digest, item, active)
+    elif isinstance(value, functools.partial):
+        digest.update(b"partial")
+        _hash_value(digest, (value.func, value.args, value.keywords), active)
+    elif isinstance(value, types.MethodType):
+        digest.update(b"method")
+        _hash_value(digest, (value.__func__, value.__self__), active)
+    elif isinstance(value, types.FunctionType):
+        # A function that refers to itself through a closure is hashed once
+        digest.update(f"function {value.__module__}.{value.__qualname__}".encode())
+        if id(value) in active:
+            return
+        active.add(id(value))
+        _hash_code(digest, value.__code__)
+        cells = [cell.cell_contents for cell in value.__closure__ or ()]
+        _hash_value(digest, (value.__defaults__, value.__kwdefaults__, cells), active)
+        active.discard(id(value))
+    else:
+        digest.update(pickle.dumps(value))
+
+
+def hash_arrays(*values):
+    """
+    Hashes arrays and picklable parameters into a hex digest that identifies them by content.
+
+    Functions are hashed by their code, default arguments and closure values, nested in lists, tuples, dicts and
+    partials as well, so editing a function changes the digest even across restarts. Globals a function reads are
+    not part of its digest.
+
+    Parameters:
+    *values: Arrays, numbers, strings, functions or other picklable values.
+
+    Returns:
+    str: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for value in values:
+        _hash_value(digest, value, set())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of meshes, matrices, factorizations and solutions in a local directory.
+
+    Entries are pickled into one file per key. Writes go to a temporary file that is atomically renamed over the
+    entry, so concurrent processes never read a partial entry, and a hit refreshes the modification time of
+    the file. When the directory grows beyond max_bytes, the entries with the oldest modification times, i.e. the
+    least recently used ones, are removed.
+
+    Entries memoized with in_memory are also kept as live objects for the memory_entries most recently used keys,
+    which keeps state that is not pickled, such as the SuperLU object of an LUFactorization.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_SIZE_LIMIT, memory_entries=MEMORY_ENTRIES):
+        """
+        Parameters:
+        directory (str): Cache directory, created if missing.
+        max_bytes (float): Size limit of the cache directory in bytes.
+        memory_entries (int): Number of entries kept in memory by memoize with in_memory.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.statistics = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._memory = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, kind, *values):
+        """
+        Builds the key of an entry from its kind and the values it depends on.
+
+        Parameters:
+        kind (str): Kind of the entry, e.g. 'mesh' or 'conductivity_matrix'.
+        *values: Arrays and parameters the entry depends on, see hash_arrays.
+
+        Returns:
+        str: Entry key.
+        """
+        return f"{kind}-{hash_arrays(kind, *values)}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def load(self, key):
+        """
+        Loads an entry.
+
+        Parameters:
+        key (str): Entry key.
+
+        Returns:
+        object: The cached value, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+            os.utime(path)
+        except OSError:
+            # Missing, or evicted by another process in the meantime
+            self.statistics['misses'] += 1
+            return None
+        except Exception:
+            # Truncated, or written by other library versions or with classes that have moved since
+            self._remove(path)
+            self.statistics['misses'] += 1
+            return None
+        self.statistics['hits'] += 1
+        return value
+
+    def store(self, key, value):
+        """
+        Stores an entry atomically and evicts the least recently used entries if the cache is too large.
+
+        Parameters:
+        key (str): Entry key.
+        value (object): Picklable value, not None.
+        """
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+                file.flush()
+                os.fsync(file.fileno())
+            if os.path.getsize(temporary_path) > self.max_bytes:
+                os.remove(temporary_path)
+                return
+            os.replace(temporary_path, self._path(key))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        self.statistics['writes'] += 1
+        self.evict()
+
+    def memoize(self, key, compute, in_memory=False):
+        """
+        Loads an entry, or computes and stores it on a miss.
+
+        Parameters:
+        key (str): Entry key.
+        compute (callable): Function without arguments that computes the value.
+        in_memory (bool): Whether to keep the value in memory as well and return the same object on later calls.
+
+        Returns:
+        object: The cached or computed value.
+        """
+        if in_memory and key in self._memory:
+            self._memory.move_to_end(key)
+            self.statistics['hits'] += 1
+            return self._memory[key]
+
+        value = self.load(key)
+        if value is None:
+            value = compute()
+            self.store(key, value)
+        if in_memory:
+            self._memory[key] = value
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+        return value
+
+    def size(self):
+        """
+        Returns the total size of the cache entries in bytes.
+        """
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.pkl'))
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into max_bytes, and temporary files left
+        behind by interrupted writes.
+        """
+        entries = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.pkl'):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif entry.name.endswith('.tmp') and now - stat.st_mtime > STALE_WRITE_AGE:
+                self._remove(entry.path)
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                self.statistics['evictions'] += 1
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            # Another process removed it first
+            return False
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        self._memory.clear()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                self._remove(entry.path)
+
+
+def get_cache(cache=None):
+    """
+    Returns the given cache, or a shared cache in CACHE_DIR.
+    """
+    global _default_cache
+    if cache is not None:
+        return cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+class LUFactorization:
+    """
+    Sparse LU factorization that can be pickled.
+
+    SuperLU objects cannot be pickled, so the triangular factors and permutations are pickled instead, with
+    Pr K Pc = L U. The factorization solves with its SuperLU object while it has one, and with two sparse
+    triangular solves of the stored factors after it was loaded from disk, which is much slower.
+    """
+
+    def __init__(self, K):
+        """
+        Parameters:
+        K (sp.sparse.spmatrix): Square matrix.
+        """
+        self.lu = sp.sparse.linalg.splu(sp.sparse.csc_matrix(K))
+        self.factors = None
+
+    def __getstate__(self):
+        factors = self.factors
+        if factors is None:
+            factors = {'L': self.lu.L.tocsr(), 'U': self.lu.U.tocsr(), 'perm_r': self.lu.perm_r,
+                       'perm_c': self.lu.perm_c}
+        return {'lu': None, 'factors': factors}
+
+    def solve(self, F):
+        """
+        Solves the system for a right-hand side vector.
+
+        Parameters:
+        F (np.ndarray): Right-hand side vector.
+
+        Returns:
+        np.ndarray: Solution vector.
+        """
+        if self.lu is not None:
+            return self.lu.solve(np.asarray(F, dtype=float))
+        factors = self.factors
+        b = np.empty(len(F))
+        b[factors['perm_r']] = F
+        y = sp.sparse.linalg.spsolve_triangular(factors['L'], b, lower=True, unit_diagonal=True)
+        z = sp.sparse.linalg.spsolve_triangular(factors['U'], y, lower=False)
+        return z[factors['perm_c']]
+
+
+def factorize(K):
+    """
+    Computes a sparse LU factorization in a picklable form, see LUFactorization.
+
+    Parameters:
+    K (sp.sparse.spmatrix): Square matrix.
+
+    Returns:
+    LUFactorization: Factorization of the matrix.
+    """
+    return LUFactorization(K)
+
+
+def solve_factorized(factors, F):
+    """
+    Solves a system with the factorization from factorize.
+
+    Parameters:
+    factors (LUFactorization): Factorization of the matrix.
+    F (np.ndarray): Right-hand side vector.
+
+    Returns:
+    np.ndarray: Solution vector.
+    """
+    return factors.solve(F)
+
+
+def _cacheable_key(cache, kind, *values):
+    """
+    Builds an entry key, or returns None if a value cannot be hashed, e.g. a function closing over an open file.
+    """
+    try:
+        return cache.key(kind, *values)
+    except (pickle.PicklingError, AttributeError, TypeError, ValueError):
+        return None
+
+
+def cached_mesh(generator, *args, cache=None, **kwargs):
+    """
+    Creates a mesh with one of the mesh generators, or loads it from the cache.
+
+    Random generators are only cached when they are given a seed, otherwise every call creates a new mesh.
+
+    Parameters:
+    generator (callable): Mesh generator, e.g. create_adaptive_triangular_mesh_in_polygon.
+    *args: Positional arguments of the generator.
+    cache (ResultCache, optional): Cache to use, see get_cache.
+    **kwargs: Keyword arguments of the generator.
+
+    Returns:
+    tuple: Mesh nodes and elements.
+    """
+    cache = get_cache(cache)
+    arguments = inspect.signature(generator).bind(*args, **kwargs)
+    if 'seed' in inspect.signature(generator).parameters and arguments.arguments.get('seed') is None:
+        return generator(*args, **kwargs)
+
+    key = _cacheable_key(cache, 'mesh', generator, args, sorted(kwargs.items()))
+    if key is None:
+        return generator(*args, **kwargs)
+    return cache.memoize(key, lambda: generator(*args, **kwargs))
+
+
+def cached_solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                   solver_method='spsolve', cache=None, **options):
+    """
+    Solves a heat transfer problem like solve_fem_heat_transfer, reusing cached results of identical inputs.
+
+    The solution is cached under all inputs. With the 'spsolve' method and no further options, the assembled
+    matrix (keyed by the mesh and conductivity) and the LU factorization of the constrained matrix (keyed by the
+    matrix and the fixed nodes) are cached as well, so new temperatures or heat sources only cost a lifting and
+    a back-substitution. Recently used factorizations are kept in memory with their SuperLU object, see
+    LUFactorization. Other methods only cache the solution.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    k (float, np.ndarray or callable): Thermal conductivity, see solve_fem_heat_transfer. Functions are keyed by
+        their code, see hash_arrays.
+    fixed_nodes (list of int): List of indices of fixed nodes.
+    fixed_temperatures (list of float): List of temperatures for fixed nodes.
+    heat_sources (np.ndarray): Vector of heat flows (N).
+    solver_method (str): Method to solve the system of equations.
+    cache (ResultCache, optional): Cache to use, see get_cache.
+    **options: Further keyword arguments of solve_fem_heat_transfer.
+
+    Returns:
+    np.ndarray: Vector of temperatures (N).
+    """
+    cache = get_cache(cache)
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    fixed_temperatures = np.asarray(fixed_temperatures, dtype=float)
+    heat_sources = np.asarray(heat_sources, dtype=float).flatten()
+
+    def solve():
+        if solver_method != 'spsolve' or options:
+            return solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                           solver_method, **options)
+
+        matrix_key = cache.key('conductivity_matrix', node_coords, elements, k)
+        K_global = cache.memoize(matrix_key, lambda: assemble_global_conductivity_matrix(elements, node_coords, k,
+                                                                                         sparse=True))
+        factors = cache.memoize(cache.key('conductivity_lu', matrix_key, fixed_nodes),
+                                lambda: factorize(apply_conductivity_boundary_conditions(
+                                    K_global, heat_sources, fixed_nodes, fixed_temperatures)[0]), in_memory=True)
+        return solve_factorized(factors, lift_fixed_temperatures(K_global, heat_sources, fixed_nodes,
+                                                                 fixed_temperatures))
+
+    key = _cacheable_key(cache, 'heat_transfer_solution', node_coords, elements, k, fixed_nodes, fixed_temperatures,
+                         heat_sources, solver_method, sorted(options.items()))
+    if key is None:
+        return solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                       solver_method, **options)
+    return cache.memoize(key, solve)
+
+
+def cached_solve_fem(node_coords, elements, E, nu, fixed_nodes, forces, plane='stress', solver_method='spsolve',
+                     cache=None, **options):
+    """
+    Solves an elasticity problem like solve_fem, reusing cached results of identical inputs.
+
+    As in cached_solve_fem_heat_transfer, the 'spsolve' method also caches the assembled stiffness matrix and the
+    factorization of the constrained matrix, so new loads only cost a back-substitution.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    E (float, np.ndarray or callable): Young's modulus, see solve_fem.
+    nu (float, np.ndarray or callable): Poisson's ratio, see solve_fem.
+    fixed_nodes (list of int): List of fixed node indices.
+    forces (np.ndarray): External force vector (2N).
+    plane (str): 'stress' or 'strain'.
+    solver_method (str): Method to solve the system of equations.
+    cache (ResultCache, optional): Cache to use, see get_cache.
+    **options: Further keyword arguments of solve_fem.
+
+    Returns:
+    np.ndarray: Displacement vector (2N).
+    """
+    cache = get_cache(cache)
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    forces = np.array(forces, dtype=float).flatten()
+
+    def solve():
+        if solver_method != 'spsolve' or options:
+            return solve_fem(node_coords, elements, E, nu, fixed_nodes, forces.copy(), plane, solver_method,
+                             **options)
+
+        matrix_key = cache.key('stiffness_matrix', node_coords, elements, E, nu, plane)
+        K_global = cache.memoize(matrix_key, lambda: assemble_global_stiffness_matrix(elements, node_coords, E, nu,
+                                                                                      plane, sparse=True))
+        K_bc, F = apply_stiffness_boundary_conditions(K_global, forces.copy(), fixed_nodes)
+        factors = cache.memoize(cache.key('stiffness_lu', matrix_key, fixed_nodes), lambda: factorize(K_bc),
+                                in_memory=True)
+        return solve_factorized(factors, F)
+
+    key = _cacheable_key(cache, 'elasticity_solution', node_coords, elements, E, nu, fixed_nodes, forces, plane,
+                         solver_method, sorted(options.items()))
+    if key is None:
+        return solve_fem(node_coords, elements, E, nu, fixed_nodes, forces.copy(), plane, solver_method, **options)
+    return cache.memoize(key, solve)
+
+
+if __name__ == '__main__':
+    from src.fem.mesh import create_adaptive_triangular_mesh_in_polygon, refinement_criteria
+
+    cache = ResultCache(os.path.join(tempfile.gettempdir(), 'fem_cache_demo'), max_bytes=2 ** 30)
+    polygon_vertices = np.array([[0, 0], [3, 0], [3, 3], [0, 3]])
+
+    for run in range(2):
+        start_time = time.perf_counter()
+        node_coords, elements = cached_mesh(create_adaptive_triangular_mesh_in_polygon, polygon_vertices, 2000,
+                                            refinement_criteria, seed=0, cache=cache)
+        fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+        # The second load case reuses the cached matrix and factorization
+        for temperature in [100.0, 50.0]:
+            temperatures = cached_solve_fem_heat_transfer(node_coords, elements, 1.0, fixed_nodes,
+                                                          np.full(len(fixed_nodes), temperature),
+                                                          np.full(len(node_coords), 1e-3), cache=cache)
+        print(f"Run {run}: {time.perf_counter() - start_time:.3f} s, {cache.statistics}")
+
+    expected = solve_fem_heat_transfer(node_coords, elements, 1.0, fixed_nodes, np.full(len(fixed_nodes), 50.0),
+                                       np.full(len(node_coords), 1e-3), 'spsolve')
+    print("Maximum difference to solve_fem_heat_transfer:", np.abs(temperatures - expected).max())
+    print(f"Cache size: {cache.size() / 2 ** 20:.1f} MB")
+
+    # Editing a conductivity function changes its key, although its name stays the same
+    def conductivity(centroids):
+        return 1.0 + centroids[:, 0]
+
+    original_key = hash_arrays(conductivity)
+    original = cached_solve_fem_heat_transfer(node_coords, elements, conductivity, fixed_nodes,
+                                              np.full(len(fixed_nodes), 50.0), np.full(len(node_coords), 1e-3),
+                                              cache=cache)
+
+    def edited_conductivity(centroids):
+        return 1.0 + 2.0 * centroids[:, 0]
+
+    # Same qualified name as the original function, as if its body had been edited between runs
+    edited_conductivity.__qualname__ = conductivity.__qualname__
+    edited = cached_solve_fem_heat_transfer(node_coords, elements, edited_conductivity, fixed_nodes,
+                                            np.full(len(fixed_nodes), 50.0), np.full(len(node_coords), 1e-3),
+                                            cache=cache)
+    assert hash_arrays(edited_conductivity) != original_key
+    assert not np.allclose(edited, original)
+    print("Edited conductivity function recomputed:", cache.statistics)
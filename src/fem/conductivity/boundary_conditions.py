@@ -1,14 +1,43 @@
 import numpy as np
+import scipy as sp
 
 from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
 
 
+def lift_fixed_temperatures(K, F, fixed_nodes, fixed_temperatures):
+    """
+    Moves the known temperatures to the right-hand side of a heat transfer system.
+
+    Only the right-hand side changes with the fixed temperatures, so a factorization of the constrained matrix
+    can be reused for new temperatures and heat sources.
+
+    Parameters:
+    K (np.ndarray or sp.sparse.spmatrix): Global conductivity matrix without boundary conditions.
+    F (np.ndarray): Right-hand side vector.
+    fixed_nodes (list of int): List of fixed node indices.
+    fixed_temperatures (list of float): Fixed node temperatures.
+
+    Returns:
+    np.ndarray: Right-hand side vector of the constrained system.
+    """
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    fixed_values = np.zeros(K.shape[0], dtype=K.dtype)
+    fixed_values[fixed_nodes] = fixed_temperatures
+
+    F = np.asarray(F, dtype=float) - K @ fixed_values
+    F[fixed_nodes] = fixed_values[fixed_nodes]
+    return F
+
+
 def apply_boundary_conditions(K, F, fixed_nodes, fixed_temperatures):
     """
     Applies boundary conditions to a system of equations for heat transfer.
 
+    The known temperatures are moved to the right-hand side before the fixed rows and columns are cleared,
+    so the free nodes see the prescribed values.
+
     Parameters:
-    K (np.ndarray): Global conductivity matrix.
+    K (np.ndarray or sp.sparse.spmatrix): Global conductivity matrix.
     F (np.ndarray): Right-hand side vector.
     fixed_nodes (list of int): List of fixed node indices.
     fixed_temperatures (list of float): Fixed node temperatures.
@@ -16,13 +45,18 @@ def apply_boundary_conditions(K, F, fixed_nodes, fixed_temperatures):
     Returns:
     np.ndarray, np.ndarray: Modified conductivity matrix and right-hand side vector.
     """
-    for i, node in enumerate(fixed_nodes):
-        K[node, :] = 0
-        K[:, node] = 0
-        K[node, node] = 1
-        F[node] = fixed_temperatures[i]
-    return K, F
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    F = lift_fixed_temperatures(K, F, fixed_nodes, fixed_temperatures)
 
+    if sp.sparse.issparse(K):
+        free = np.ones(K.shape[0], dtype=K.dtype)
+        free[fixed_nodes] = 0
+        K = (sp.sparse.diags(free) @ K @ sp.sparse.diags(free) + sp.sparse.diags(1 - free)).tocsr()
+    else:
+        K[fixed_nodes, :] = 0
+        K[:, fixed_nodes] = 0
+        K[fixed_nodes, fixed_nodes] = 1
+    return K, F
 
 if __name__ == '__main__':
     # Example of coordinates of nodes and elements
@@ -1,5 +1,53 @@
 import numpy as np
 
+from src.fem.assembly import deduplicated_element_matrices, element_dofs, scatter_element_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.memory import choose_assembly_format
+
+
+def element_gradient_matrices(coords):
+    """
+    Calculates the areas and shape function gradients of a batch of triangular elements.
+
+    Parameters:
+    coords (np.ndarray): Element node coordinates (Ex3x2).
+
+    Returns:
+    np.ndarray, np.ndarray: Element areas (E) and gradient matrices B (Ex2x3).
+    """
+    coords = np.asarray(coords, dtype=float)
+    x = coords[:, :, 0]
+    y = coords[:, :, 1]
+
+    # Edge differences opposite to each node
+    b = y[:, [1, 2, 0]] - y[:, [2, 0, 1]]
+    c = x[:, [2, 0, 1]] - x[:, [1, 2, 0]]
+
+    # Calculating the areas of elements
+    A = 0.5 * np.abs(b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0])
+
+    # Matrices B for heat transfer
+    B = np.stack([b, c], axis=1) / (2 * A)[:, np.newaxis, np.newaxis]
+
+    return A, B
+
+
+def element_conductivity_matrices(k, coords):
+    """
+    Calculates the elemental conductivity matrices for a batch of triangular elements.
+
+    Parameters:
+    k (float or np.ndarray): Thermal conductivity, a scalar or one value per element (E).
+    coords (np.ndarray): Element node coordinates (Ex3x2).
+
+    Returns:
+    np.ndarray: Elemental conductivity matrices (Ex3x3).
+    """
+    A, B = element_gradient_matrices(coords)
+    kA = np.asarray(k, dtype=float) * A
+    return kA[..., np.newaxis, np.newaxis] * np.einsum('eki,ekj->eij', B, B)
+
+
 def element_conductivity_matrix(k, coords):
     """
     Calculates the elemental conductivity matrix for a triangular element.
@@ -11,52 +59,43 @@ def element_conductivity_matrix(k, coords):
     Returns:
     np.ndarray: Elemental conductivity matrix (3x3).
     """
-    x1, y1 = coords[0]
-    x2, y2 = coords[1]
-    x3, y3 = coords[2]
-
-    # Calculating the area of an element
-    A = 0.5 * np.abs(np.linalg.det(np.array([
-        [1, x1, y1],
-        [1, x2, y2],
-        [1, x3, y3]
-    ])))
-
-    # Matrix B for heat transfer
-    B = np.array([
-        [y2 - y3, y3 - y1, y1 - y2],
-        [x3 - x2, x1 - x3, x2 - x1]
-    ]) / (2 * A)
+    return element_conductivity_matrices(k, np.asarray(coords)[np.newaxis])[0]
 
-    # Elemental conductivity matrix
-    ke = (k * A) * (B.T @ B)
 
-    return ke
-
-def assemble_global_conductivity_matrix(elements, node_coords, k):
+def assemble_global_conductivity_matrix(elements, node_coords, k, sparse=False, dtype=np.float64,
+                                        memory_budget=None, deduplicate=None):
     """
     Builds a global conductivity matrix from element matrices.
 
     Parameters:
     elements (list of list of int): List of elements, each specified as a list of node indices.
     node_coords (np.ndarray): Node coordinates (Nx2).
-    k (float): Thermal conductivity of the material.
+    k (float, np.ndarray or callable): Thermal conductivity of the material. Either a scalar, one value per
+        element (E) or a function of the element centroids (Ex2).
+    sparse (bool): Whether to return a sparse CSR matrix instead of a dense array.
+    dtype (np.dtype): Floating point type of the global matrix, e.g. np.float32 for mixed precision solves.
+    memory_budget (float, optional): Bytes the assembly may allocate, see get_memory_budget. A dense matrix that
+        does not fit is assembled as sparse instead.
+    deduplicate (str, optional): 'translation' or 'rotation' to compute the element matrix once for every group
+        of translated or rotated copies of an element, see unique_element_geometries. Structured meshes have only
+        a few such groups.
 
     Returns:
-    np.ndarray: Global conductivity matrix (N x N).
+    np.ndarray or sp.sparse.csr_matrix: Global conductivity matrix (N x N).
     """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
     N = len(node_coords)
-    K_global = np.zeros((N, N))
-
-    for element in elements:
-        coords = node_coords[element]
-        ke = element_conductivity_matrix(k, coords)
+    sparse = choose_assembly_format(N, len(elements), 1, sparse, np.dtype(dtype).itemsize, memory_budget)
 
-        for i in range(3):
-            for j in range(3):
-                K_global[element[i], element[j]] += ke[i, j]
+    k = evaluate_element_field(k, node_coords, elements)
+    if deduplicate:
+        ke = deduplicated_element_matrices(lambda coords: element_conductivity_matrices(1.0, coords),
+                                           node_coords[elements], deduplicate, factor=k)
+    else:
+        ke = element_conductivity_matrices(k, node_coords[elements])
 
-    return K_global
+    return scatter_element_matrices(ke, element_dofs(elements), N, sparse, dtype)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,209 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions, lift_fixed_temperatures
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+
+# Number of nodes whose constraint may differ from the factorized one before refactorizing is cheaper
+MAX_CHANGED_NODES = 32
+
+
+class IncrementalHeatTransferSolver:
+    """
+    Re-solves a heat transfer problem on a fixed mesh as its boundary values, heat sources and constraints change.
+
+    The constrained conductivity matrix is factorized once. New fixed temperatures and heat sources only change the
+    lifted right-hand side, so they cost one back-substitution. Fixing or releasing nodes changes the rows and
+    columns of those nodes only: for s changed nodes the constrained matrix differs from the factorized one by a
+    matrix of rank 2s, which the Sherman-Morrison-Woodbury formula applies with 2s extra back-substitutions and a
+    dense 2s x 2s solve instead of a new factorization. Beyond max_changed_nodes the matrix is refactorized.
+
+    Example:
+        solver = IncrementalHeatTransferSolver(node_coords, elements, k, fixed_nodes, fixed_temperatures, sources)
+        temperatures = solver.solve()
+        solver.set_fixed_temperatures(fixed_nodes, new_temperatures)
+        solver.fix_nodes([hot_spot], [500.0])
+        temperatures = solver.solve()
+    """
+
+    def __init__(self, node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                 max_changed_nodes=MAX_CHANGED_NODES):
+        """
+        Parameters:
+        node_coords (np.ndarray): Node coordinates (Nx2).
+        elements (list of list of int): List of elements, each specified as a list of node indices.
+        k (float, np.ndarray or callable): Thermal conductivity, a scalar, one value per element or a function of
+            the element centroids.
+        fixed_nodes (list of int): List of indices of fixed nodes.
+        fixed_temperatures (list of float): List of temperatures for fixed nodes.
+        heat_sources (np.ndarray): Vector of heat flows (N).
+        max_changed_nodes (int): Number of nodes with a changed constraint above which the matrix is refactorized.
+        """
+        self.K = assemble_global_conductivity_matrix(elements, node_coords, k, sparse=True).tocsc()
+        n_nodes = self.K.shape[0]
+        self.heat_sources = np.array(heat_sources, dtype=float).flatten()
+        self.fixed = np.zeros(n_nodes, dtype=bool)
+        self.fixed[np.asarray(fixed_nodes, dtype=int)] = True
+        self.fixed_values = np.zeros(n_nodes)
+        self.fixed_values[np.asarray(fixed_nodes, dtype=int)] = fixed_temperatures
+        self.max_changed_nodes = max_changed_nodes
+        self.factorizations = 0
+        self.refactorize()
+
+    @property
+    def fixed_nodes(self):
+        """
+        Indices of the currently fixed nodes in ascending order.
+        """
+        return np.flatnonzero(self.fixed)
+
+    def refactorize(self):
+        """
+        Factorizes the matrix constrained at the current fixed nodes, dropping any low-rank correction.
+        """
+        K_bc, _ = apply_boundary_conditions(self.K, np.zeros(self.K.shape[0]), self.fixed_nodes, 0.0)
+        self.factorization = sp.sparse.linalg.splu(K_bc.tocsc())
+        self.factorized_fixed = self.fixed.copy()
+        self.factorizations += 1
+        self._update_correction()
+
+    def _constrained_columns(self, fixed, nodes):
+        """
+        Returns the columns of the matrix constrained at the fixed mask for the given nodes (N x len(nodes)).
+        """
+        columns = self.K[:, nodes].toarray()
+        columns[fixed] = 0
+        fixed_columns = np.flatnonzero(fixed[nodes])
+        columns[:, fixed_columns] = 0
+        columns[nodes[fixed_columns], fixed_columns] = 1
+        return columns
+
+    def _update_correction(self):
+        """
+        Prepares the Woodbury correction between the factorized and the current constraints.
+        """
+        changed = np.flatnonzero(self.fixed != self.factorized_fixed)
+        self.changed_nodes = changed
+        if len(changed) == 0:
+            self.correction = None
+            return
+
+        # The constrained matrices differ only in the rows and columns of the changed nodes. With the difference
+        # M of those columns, and its block D at the changed rows, the difference of the matrices is
+        # E M^T + M E^T - E D E^T = U V^T with U = [E, M - E D / 2] and V = [M - E D / 2, E].
+        difference = (self._constrained_columns(self.fixed, changed)
+                      - self._constrained_columns(self.factorized_fixed, changed))
+        difference[changed] -= difference[changed] / 2
+        E = np.zeros_like(difference)
+        E[changed, np.arange(len(changed))] = 1
+        U = np.hstack([E, difference])
+        V = np.hstack([difference, E])
+
+        Z = self.factorization.solve(U)
+        capacitance = np.eye(U.shape[1]) + V.T @ Z
+        self.correction = Z, V, sp.linalg.lu_factor(capacitance)
+
+    def _constraints_changed(self):
+        if len(np.flatnonzero(self.fixed != self.factorized_fixed)) > self.max_changed_nodes:
+            self.refactorize()
+        else:
+            self._update_correction()
+
+    def set_fixed_temperatures(self, fixed_nodes, fixed_temperatures):
+        """
+        Changes the temperatures of fixed nodes, which only changes the right-hand side.
+
+        Parameters:
+        fixed_nodes (list of int): Indices of nodes that are already fixed.
+        fixed_temperatures (float or list of float): New temperatures of these nodes.
+        """
+        fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+        if not self.fixed[fixed_nodes].all():
+            raise ValueError("Temperatures can only be set for fixed nodes, use fix_nodes to add constraints")
+        self.fixed_values[fixed_nodes] = fixed_temperatures
+
+    def set_heat_sources(self, heat_sources):
+        """
+        Replaces the vector of heat flows (N), which only changes the right-hand side.
+        """
+        self.heat_sources = np.array(heat_sources, dtype=float).flatten()
+
+    def fix_nodes(self, fixed_nodes, fixed_temperatures):
+        """
+        Prescribes the temperatures of further nodes.
+
+        Parameters:
+        fixed_nodes (list of int): Indices of the nodes to fix.
+        fixed_temperatures (float or list of float): Temperatures of these nodes.
+        """
+        fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+        self.fixed[fixed_nodes] = True
+        self.fixed_values[fixed_nodes] = fixed_temperatures
+        self._constraints_changed()
+
+    def release_nodes(self, nodes):
+        """
+        Frees fixed nodes, their temperatures are solved for again.
+
+        Parameters:
+        nodes (list of int): Indices of the nodes to release.
+        """
+        nodes = np.asarray(nodes, dtype=int)
+        self.fixed[nodes] = False
+        self.fixed_values[nodes] = 0
+        self._constraints_changed()
+
+    def solve(self):
+        """
+        Solves for the temperatures with the current constraints, fixed temperatures and heat sources.
+
+        Returns:
+        np.ndarray: Vector of temperatures (N).
+        """
+        F = lift_fixed_temperatures(self.K, self.heat_sources, self.fixed_nodes, self.fixed_values[self.fixed])
+        temperatures = self.factorization.solve(F)
+        if self.correction is not None:
+            Z, V, capacitance = self.correction
+            temperatures -= Z @ sp.linalg.lu_solve(capacitance, V.T @ temperatures)
+        return temperatures
+
+
+if __name__ == '__main__':
+    import time
+
+    from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 300, 300)
+    x, y = node_coords.T
+    fixed_nodes = np.flatnonzero((x == 0) | (x == 1))
+    heat_sources = np.full(len(node_coords), 1.0 / len(node_coords))
+
+    start_time = time.perf_counter()
+    solver = IncrementalHeatTransferSolver(node_coords, elements, 1.0, fixed_nodes, np.where(x[fixed_nodes] == 0, 0.0,
+                                                                                         100.0), heat_sources)
+    temperatures = solver.solve()
+    print(f"{len(node_coords)} nodes, setup and first solve: {time.perf_counter() - start_time:.3f} s")
+
+    def check(label, update):
+        start_time = time.perf_counter()
+        update()
+        temperatures = solver.solve()
+        elapsed = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        reference = solve_fem_heat_transfer(node_coords, elements, 1.0, solver.fixed_nodes,
+                                            solver.fixed_values[solver.fixed], solver.heat_sources, 'spsolve')
+        full = time.perf_counter() - start_time
+        print(f"{label}: {elapsed:.3f} s, full solve {full:.3f} s, "
+              f"max difference {np.abs(temperatures - reference).max():.1e}")
+
+    check("New fixed temperatures", lambda: solver.set_fixed_temperatures(fixed_nodes, 50 + 50 * np.sin(
+        np.pi * y[fixed_nodes])))
+    check("New heat sources", lambda: solver.set_heat_sources(np.where(x < 0.5, 2.0, 0.0) / len(node_coords)))
+
+    rng = np.random.default_rng(0)
+    hot_spots = rng.choice(np.flatnonzero(~solver.fixed), 5, replace=False)
+    check("5 hot spots fixed", lambda: solver.fix_nodes(hot_spots, 200.0))
+    check("10 boundary nodes released", lambda: solver.release_nodes(fixed_nodes[:10]))
+    check("Hot spots released", lambda: solver.release_nodes(hot_spots))
+    print(f"Factorizations: {solver.factorizations}")
@@ -0,0 +1,184 @@
+import time
+
+import numpy as np
+import scipy as sp
+
+from src.fem.assembly import assemble_on_plan, assembly_plan, element_dofs
+from src.fem.conductivity.conductivity_matrix import element_conductivity_matrices
+
+# Smallest line search step before the full step is taken anyway
+MIN_STEP_LENGTH = 1 / 64
+
+
+def _derivative(k, temperatures, dk_dT):
+    """
+    Evaluates dk/dT, by central differences if no derivative is given.
+    """
+    if dk_dT is not None:
+        return np.broadcast_to(np.asarray(dk_dT(temperatures), dtype=float), temperatures.shape)
+    step = 1e-6 * (1 + np.abs(temperatures))
+    return (np.asarray(k(temperatures + step)) - np.asarray(k(temperatures - step))) / (2 * step)
+
+
+def solve_nonlinear_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                  dk_dT=None, method='newton', initial_temperatures=None, tolerance=1e-10,
+                                  max_iterations=50, line_search=True, freeze=False, refresh_ratio=0.5):
+    """
+    Solves a steady heat transfer problem with a temperature-dependent conductivity k(T).
+
+    The conductivity of every element is evaluated at its mean temperature. The unit element matrices and the
+    sparsity pattern of the global matrix are computed once, so every iteration only sums new numeric values into
+    the fixed pattern (see assembly_plan).
+
+    Newton iterations solve J dT = -R with the Jacobian J = sum_e k_e K_e + dk/dT_e (K_e T_e) 1^T / 3, Picard
+    iterations solve K(T) T_new = F. A backtracking line search halves the step until the residual norm decreases.
+    With freeze the sparse LU factorization of the first iteration is reused, and only rebuilt when an iteration
+    reduces the residual by less than refresh_ratio, so most iterations cost one back-substitution (inexact Newton).
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    k (callable): Thermal conductivity as a vectorized function of the temperature.
+    fixed_nodes (list of int): List of indices of fixed nodes.
+    fixed_temperatures (list of float): List of temperatures for fixed nodes.
+    heat_sources (np.ndarray): Vector of heat flows (N).
+    dk_dT (callable, optional): Derivative of the conductivity. Central differences of k if None.
+    method (str): 'newton' or 'picard'.
+    initial_temperatures (np.ndarray, optional): Initial guess (N). Defaults to the linear solution with the
+        conductivity at the mean fixed temperature.
+    tolerance (float): Residual norm to reach, relative to the norm of the heat sources and the lifted fixed
+        temperatures.
+    max_iterations (int): Maximum number of nonlinear iterations.
+    line_search (bool): Whether to backtrack steps that do not reduce the residual norm.
+    freeze (bool): Whether to reuse the factorization across iterations.
+    refresh_ratio (float): Residual reduction factor below which a frozen factorization is rebuilt.
+
+    Returns:
+    np.ndarray, list of dict: Vector of temperatures (N), and the convergence history with the 'residual' norm,
+        the 'step_length', whether the linear system was 'factorized' and the 'time' of every iteration.
+    """
+    if method not in ('newton', 'picard'):
+        raise ValueError(f"Unknown nonlinear method: {method}")
+
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements)
+    N = len(node_coords)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    free = np.ones(N, dtype=bool)
+    free[fixed_nodes] = False
+    F = np.where(free, np.array(heat_sources, dtype=float).flatten(), 0.0)
+
+    unit_matrices = element_conductivity_matrices(1.0, node_coords[elements])
+    plan = assembly_plan(element_dofs(elements), N, fixed_nodes)
+
+    def element_state(T):
+        T_e = T[elements]
+        T_mean = T_e.mean(axis=1)
+        unit_products = np.einsum('eij,ej->ei', unit_matrices, T_e)
+        return T_mean, unit_products
+
+    def residual(T, k_values, unit_products):
+        R = np.bincount(elements.ravel(), (k_values[:, np.newaxis] * unit_products).ravel(), minlength=N) - F
+        R[fixed_nodes] = 0
+        return R
+
+    def factorize(matrix):
+        return sp.sparse.linalg.splu(matrix.tocsc()).solve
+
+    # The initial guess satisfies the boundary conditions, so the updates vanish at the fixed nodes
+    if initial_temperatures is None:
+        reference = np.full(len(elements), float(np.mean(k(np.asarray(fixed_temperatures, dtype=float)))))
+        K_linear = assemble_on_plan(plan, reference[:, np.newaxis, np.newaxis] * unit_matrices)
+        T = np.zeros(N)
+        T[fixed_nodes] = fixed_temperatures
+        T = T - factorize(K_linear)(residual(T, reference, element_state(T)[1]))
+    else:
+        T = np.array(initial_temperatures, dtype=float)
+    T[fixed_nodes] = fixed_temperatures
+
+    T_mean, unit_products = element_state(T)
+    k_values = np.asarray(k(T_mean), dtype=float)
+    R = residual(T, k_values, unit_products)
+
+    # Heat sources and the flow the fixed temperatures drive into the free nodes set the scale of the residual
+    fixed_values = np.where(free, 0.0, T)
+    _, fixed_products = element_state(fixed_values)
+    scale = np.linalg.norm(residual(fixed_values, k_values, fixed_products) + F) + np.linalg.norm(F) or 1.0
+
+    history = [{'iteration': 0, 'residual': float(np.linalg.norm(R)), 'step_length': 0.0, 'factorized': False,
+                'time': 0.0}]
+    solve = None
+    for iteration in range(1, max_iterations + 1):
+        if history[-1]['residual'] <= tolerance * scale:
+            break
+        start_time = time.perf_counter()
+
+        # A frozen factorization is rebuilt when the last iteration stalled
+        stalled = len(history) > 1 and history[-1]['residual'] > refresh_ratio * history[-2]['residual']
+        factorized = solve is None or not freeze or stalled
+        if factorized:
+            if method == 'newton':
+                dk = _derivative(k, T_mean, dk_dT)
+                jacobian = (k_values[:, np.newaxis, np.newaxis] * unit_matrices
+                            + dk[:, np.newaxis, np.newaxis] * unit_products[:, :, np.newaxis] / 3)
+            else:
+                jacobian = k_values[:, np.newaxis, np.newaxis] * unit_matrices
+            solve = factorize(assemble_on_plan(plan, jacobian))
+
+        # The Picard update K(T) T_new = F is the same solve with the residual of the current temperatures
+        step = -solve(R)
+        step[fixed_nodes] = 0
+
+        step_length = 1.0
+        while True:
+            T_trial = T + step_length * step
+            trial_mean, trial_products = element_state(T_trial)
+            trial_k = np.asarray(k(trial_mean), dtype=float)
+            R_trial = residual(T_trial, trial_k, trial_products)
+            if not line_search or step_length <= MIN_STEP_LENGTH \
+                    or np.linalg.norm(R_trial) <= (1 - 1e-4 * step_length) * history[-1]['residual']:
+                break
+            step_length /= 2
+
+        T, T_mean, unit_products, k_values, R = T_trial, trial_mean, trial_products, trial_k, R_trial
+        history.append({'iteration': iteration, 'residual': float(np.linalg.norm(R)), 'step_length': step_length,
+                        'factorized': factorized, 'time': time.perf_counter() - start_time})
+    return T, history
+
+
+if __name__ == '__main__':
+    from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 200, 200)
+    fixed_nodes = np.flatnonzero((node_coords[:, 0] == 0) | (node_coords[:, 0] == 1))
+    fixed_temperatures = np.where(node_coords[fixed_nodes, 0] == 0, 300.0, 1200.0)
+    heat_sources = np.full(len(node_coords), 5e3 / len(node_coords))
+
+    # Conductivity of a ceramic that conducts better when hot
+    def k(T):
+        return 1.5 + 2e-6 * T ** 2
+
+    def dk_dT(T):
+        return 4e-6 * T
+
+    start_time = time.perf_counter()
+    solve_fem_heat_transfer(node_coords, elements, 1.0, fixed_nodes, fixed_temperatures, heat_sources, 'spsolve')
+    linear_time = time.perf_counter() - start_time
+    print(f"Linear solve: {linear_time:.3f} s")
+
+    results = {}
+    for label, options in [('Picard', {'method': 'picard'}),
+                           ('Newton', {'method': 'newton', 'dk_dT': dk_dT}),
+                           ('Newton, finite difference Jacobian', {'method': 'newton'}),
+                           ('Newton, frozen factorization', {'method': 'newton', 'dk_dT': dk_dT, 'freeze': True})]:
+        start_time = time.perf_counter()
+        temperatures, history = solve_nonlinear_heat_transfer(node_coords, elements, k, fixed_nodes,
+                                                              fixed_temperatures, heat_sources, **options)
+        elapsed = time.perf_counter() - start_time
+        results[label] = temperatures
+        print(f"{label}: {len(history) - 1} iterations, {sum(entry['factorized'] for entry in history)} "
+              f"factorizations, residual {history[-1]['residual']:.2e}, {elapsed:.3f} s "
+              f"({elapsed / linear_time:.1f} linear solves)")
+    print("Maximum difference between the methods:",
+          max(np.abs(temperatures - results['Newton']).max() for temperatures in results.values()))
@@ -0,0 +1,238 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+
+
+def randomized_svd(A, rank, n_oversamples=10, n_power_iterations=2, seed=None):
+    """
+    Calculates a truncated singular value decomposition with a randomized range finder.
+
+    Parameters:
+    A (np.ndarray): Matrix to decompose (m x n).
+    rank (int): Number of singular triplets to keep.
+    n_oversamples (int): Additional random samples that improve the accuracy of the range.
+    n_power_iterations (int): Number of power iterations for slowly decaying spectra.
+    seed (int, optional): Seed for the random number generator. Defaults to None.
+
+    Returns:
+    np.ndarray, np.ndarray, np.ndarray: Left singular vectors (m x rank), singular values (rank)
+        and right singular vectors (rank x n).
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = min(rank + n_oversamples, *A.shape)
+
+    # Orthonormal basis of the sampled range, re-orthonormalized between power iterations
+    Q, _ = np.linalg.qr(A @ rng.standard_normal((A.shape[1], n_samples)))
+    for _ in range(n_power_iterations):
+        Q, _ = np.linalg.qr(A.T @ Q)
+        Q, _ = np.linalg.qr(A @ Q)
+
+    U_small, s, Vt = np.linalg.svd(Q.T @ A, full_matrices=False)
+    return (Q @ U_small)[:, :rank], s[:rank], Vt[:rank]
+
+
+def build_heat_transfer_rom(node_coords, elements, fixed_nodes, training_cases, source_patterns,
+                            dirichlet_patterns=None, n_modes=None, energy_tolerance=1e-10, solver_method='solve',
+                            seed=None):
+    """
+    Builds a reduced-order model of a heat transfer problem from full solutions (offline stage).
+
+    The snapshots of the free temperatures are compressed into a POD basis. The unit-conductivity operator,
+    the source patterns and the lifted Dirichlet patterns are projected onto it once, so a query only solves
+    a small dense system.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    fixed_nodes (list of int): List of indices of fixed nodes.
+    training_cases (list of dict): Training points with the keys 'k' (scalar conductivity), 'source_strengths'
+        (m coefficients of the source patterns) and 'fixed_temperatures' (q coefficients of the Dirichlet patterns).
+    source_patterns (np.ndarray): Heat source patterns (N x m), one per column.
+    dirichlet_patterns (np.ndarray, optional): Fixed temperature patterns (len(fixed_nodes) x q), one per column.
+        Defaults to one pattern per fixed node.
+    n_modes (int, optional): Number of POD modes. By default chosen from the energy tolerance.
+    energy_tolerance (float): Fraction of the snapshot energy that the discarded modes may hold.
+    solver_method (str): Method to solve the full systems of equations.
+    seed (int, optional): Seed for the randomized SVD. Defaults to None.
+
+    Returns:
+    dict: Reduced-order model.
+    """
+    N = len(node_coords)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    if dirichlet_patterns is None:
+        dirichlet_patterns = np.eye(len(fixed_nodes))
+    source_patterns = np.asarray(source_patterns, dtype=float).reshape(N, -1)
+    dirichlet_patterns = np.asarray(dirichlet_patterns, dtype=float).reshape(len(fixed_nodes), -1)
+
+    free = np.ones(N, dtype=bool)
+    free[fixed_nodes] = False
+
+    # Position of every node among the free or the fixed nodes
+    node_index = np.empty(N, dtype=int)
+    node_index[free] = np.arange(free.sum())
+    node_index[fixed_nodes] = np.arange(len(fixed_nodes))
+
+    # Training parameters as rows of (k, source strengths, fixed temperature coefficients)
+    parameters = np.array([np.concatenate([[case['k']], np.ravel(case['source_strengths']),
+                                           np.ravel(case['fixed_temperatures'])]) for case in training_cases])
+    m = source_patterns.shape[1]
+
+    snapshots = np.empty((free.sum(), len(training_cases)))
+    for i, row in enumerate(parameters):
+        temperatures = solve_fem_heat_transfer(node_coords, elements, row[0], fixed_nodes,
+                                               dirichlet_patterns @ row[1 + m:], source_patterns @ row[1:1 + m],
+                                               solver_method)
+        snapshots[:, i] = temperatures[free]
+
+    # POD basis of the free temperatures
+    max_rank = min(snapshots.shape)
+    U, s, _ = randomized_svd(snapshots, max_rank if n_modes is None else n_modes, seed=seed)
+    if n_modes is None:
+        discarded = 1 - np.cumsum(s ** 2) / np.sum(s ** 2)
+        n_modes = min(int(np.searchsorted(-discarded, -energy_tolerance)) + 1, len(s))
+    Phi = U[:, :n_modes]
+
+    # Projection of the unit-conductivity operator and the right-hand side patterns
+    K_unit = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True).tocsr()
+    K_free = K_unit[free][:, free]
+    K_lift = K_unit[free][:, fixed_nodes] @ dirichlet_patterns
+    P_free = source_patterns[free]
+
+    K_free_Phi = K_free @ Phi
+    reduced_factorization = sp.linalg.lu_factor(Phi.T @ K_free_Phi)
+    reduced_sources = sp.linalg.lu_solve(reduced_factorization, Phi.T @ P_free)
+    reduced_lift = sp.linalg.lu_solve(reduced_factorization, Phi.T @ K_lift)
+
+    # Gram matrix of the residual terms, so the full residual norm is evaluated in reduced dimensions
+    residual_terms = np.hstack([P_free, -K_lift, -K_free_Phi])
+
+    return {
+        'node_coords': node_coords,
+        'elements': elements,
+        'fixed_nodes': fixed_nodes,
+        'free': free,
+        'node_index': node_index,
+        'source_patterns': source_patterns,
+        'dirichlet_patterns': dirichlet_patterns,
+        'basis': Phi,
+        'singular_values': s,
+        'reduced_sources': reduced_sources,
+        'reduced_lift': reduced_lift,
+        'residual_gram': residual_terms.T @ residual_terms,
+        'parameter_min': parameters.min(axis=0),
+        'parameter_max': parameters.max(axis=0),
+        'solver_method': solver_method,
+    }
+
+
+def estimate_rom_residual(rom, k, source_strengths, fixed_temperatures, coefficients):
+    """
+    Estimates the relative residual of a reduced solution in the full heat transfer system.
+
+    Parameters:
+    rom (dict): Reduced-order model from build_heat_transfer_rom.
+    k (float): Thermal conductivity of the material.
+    source_strengths (np.ndarray): Coefficients of the source patterns (m).
+    fixed_temperatures (np.ndarray): Coefficients of the fixed temperature patterns (q).
+    coefficients (np.ndarray): Reduced solution (number of modes).
+
+    Returns:
+    float: Residual norm relative to the norm of the right-hand side.
+    """
+    c = np.concatenate([source_strengths / k, fixed_temperatures, coefficients])
+    n_rhs = len(c) - len(coefficients)
+    gram = rom['residual_gram']
+
+    rhs_norm = c[:n_rhs] @ gram[:n_rhs, :n_rhs] @ c[:n_rhs]
+    residual_norm = max(c @ gram @ c, 0.0)
+    if rhs_norm == 0:
+        return np.sqrt(residual_norm)
+    return np.sqrt(residual_norm / rhs_norm)
+
+
+def query_heat_transfer_rom(rom, k, source_strengths, fixed_temperatures, tolerance=1e-6, probes=None):
+    """
+    Evaluates the reduced-order model for one parameter point (online stage).
+
+    The full solver is used instead when the parameters lie outside the training range or the estimated
+    residual exceeds the tolerance.
+
+    Parameters:
+    rom (dict): Reduced-order model from build_heat_transfer_rom.
+    k (float): Thermal conductivity of the material.
+    source_strengths (np.ndarray): Coefficients of the source patterns (m).
+    fixed_temperatures (np.ndarray): Coefficients of the fixed temperature patterns (q).
+    tolerance (float): Largest accepted relative residual of the reduced solution.
+    probes (np.ndarray, optional): Node indices to return. All temperatures are returned if None.
+
+    Returns:
+    np.ndarray, dict: Temperatures and a record with the keys 'source' ('rom' or 'full'), 'residual' (estimated
+        relative residual of the reduced solution) and 'in_range'.
+    """
+    source_strengths = np.atleast_1d(np.asarray(source_strengths, dtype=float))
+    fixed_temperatures = np.atleast_1d(np.asarray(fixed_temperatures, dtype=float))
+    parameters = np.concatenate([[k], source_strengths, fixed_temperatures])
+    in_range = np.all((parameters >= rom['parameter_min']) & (parameters <= rom['parameter_max']))
+
+    coefficients = rom['reduced_sources'] @ source_strengths / k - rom['reduced_lift'] @ fixed_temperatures
+    residual = estimate_rom_residual(rom, k, source_strengths, fixed_temperatures, coefficients)
+    info = {'source': 'rom', 'residual': float(residual), 'in_range': bool(in_range)}
+
+    if in_range and residual <= tolerance:
+        fixed_values = rom['dirichlet_patterns'] @ fixed_temperatures
+        if probes is None:
+            temperatures = np.empty(len(rom['free']))
+            temperatures[rom['free']] = rom['basis'] @ coefficients
+            temperatures[rom['fixed_nodes']] = fixed_values
+            return temperatures, info
+
+        # Probe values come straight from the matching basis rows
+        probes = np.asarray(probes, dtype=int)
+        probe_free = rom['free'][probes]
+        probe_index = rom['node_index'][probes]
+        temperatures = np.empty(len(probes))
+        temperatures[probe_free] = rom['basis'][probe_index[probe_free]] @ coefficients
+        temperatures[~probe_free] = fixed_values[probe_index[~probe_free]]
+        return temperatures, info
+
+    temperatures = solve_fem_heat_transfer(rom['node_coords'], rom['elements'], k, rom['fixed_nodes'],
+                                           rom['dirichlet_patterns'] @ fixed_temperatures,
+                                           rom['source_patterns'] @ source_strengths, rom['solver_method'])
+    if probes is not None:
+        temperatures = temperatures[probes]
+    info['source'] = 'full'
+    return temperatures, info
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 40, 40)
+    N = len(node_coords)
+
+    # The bottom edge has a temperature profile shaped by three patterns
+    fixed_nodes = np.flatnonzero(node_coords[:, 1] == 0)
+    x = node_coords[fixed_nodes, 0]
+    dirichlet_patterns = np.stack([np.ones_like(x), x, x ** 2], axis=1)
+
+    # Two Gaussian heat sources
+    source_patterns = np.stack([np.exp(-50 * np.sum((node_coords - center) ** 2, axis=1))
+                                for center in ([0.3, 0.6], [0.7, 0.4])], axis=1)
+
+    rng = np.random.default_rng(0)
+    training_cases = [{'k': rng.uniform(1, 10), 'source_strengths': rng.uniform(0, 100, 2),
+                       'fixed_temperatures': rng.uniform(0, 100, 3)} for _ in range(20)]
+
+    rom = build_heat_transfer_rom(node_coords, elements, fixed_nodes, training_cases, source_patterns,
+                                  dirichlet_patterns, solver_method='spsolve', seed=0)
+    print("Number of POD modes:", rom['basis'].shape[1])
+
+    start_time = datetime.now()
+    temperatures, info = query_heat_transfer_rom(rom, 5.0, [50.0, 20.0], [40.0, 50.0, 60.0], probes=[N // 2])
+    print("Query time:", datetime.now() - start_time)
+    print("Probe temperature:", temperatures, info)
@@ -1,82 +1,100 @@
-from datetime import datetime
-
 import numpy as np
 import scipy as sp
 
 from src.fem.conductivity.boundary_conditions import apply_boundary_conditions
 from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.matrix_free import apply_boundary_conditions_matrix_free, conductivity_operator
+from src.fem.memory import choose_matrix_free
+from src.fem.profiling import get_profiler
+from src.fem.solvers import select_solver_method, solve_linear_system
 
 
 def solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
-                            solver_method='solve'):
+                            solver_method='auto', matrix_free=False, precision='double', solver_options=None,
+                            profiler=None, memory_budget=None):
     """
     Solves a finite element heat transfer problem.
 
     Parameters:
     node_coords (np.ndarray): Node coordinates (Nx2).
     elements (list of list of int): List of elements, each specified as a list of node indices.
-    k (float): Thermal conductivity of the material.
+    k (float, np.ndarray or callable): Thermal conductivity of the material, a scalar, one value per element or a
+        function of the element centroids.
     fixed_nodes (list of int): List of indices of fixed nodes.
     fixed_temperatures (list of float): List of temperatures for fixed nodes.
     heat_sources (np.ndarray): Vector of heat flows (N).
-    solver_method (str): Method to solve the system of equations.
+    solver_method (str): Method to solve the system of equations, 'auto' to choose it from the size and structure
+        of the system (see select_solver_method).
+    matrix_free (bool): Whether to apply the conductivity matrix element by element instead of assembling it.
+        Only the iterative solver methods support it.
+    precision (str): 'double', or 'mixed' to assemble and factor or precondition in single precision and refine
+        the solution with double precision residuals.
+    solver_options (dict, optional): Additional keyword arguments of the solver method. The 'schur' method
+        partitions by the node coordinates unless told otherwise.
+    profiler (Profiler, optional): Records the assembly, boundary condition and solve spans with the matrix nnz,
+        iteration counts and residuals. Nothing is measured if None.
+    memory_budget (float, optional): Bytes the solve may allocate, see get_memory_budget. Systems whose assembly
+        does not fit are solved matrix-free when the solver method allows it, otherwise a MemoryError is raised.
 
     Returns:
     np.ndarray: Vector of temperatures (N).
     """
-
-    start_time = datetime.now()
-    K_global = assemble_global_conductivity_matrix(elements, node_coords, k)
-    print('Time taken to assemble global conductivity matrix: ', datetime.now() - start_time)
-
+    profiler = get_profiler(profiler)
     F = np.array(heat_sources).flatten()
+    profiler.record(n_dofs=len(F))
 
-    start_time = datetime.now()
-    K_global, F = apply_boundary_conditions(K_global, F, fixed_nodes, fixed_temperatures)
-    print('Time taken to apply boundary conditions: ', datetime.now() - start_time)
-
-    density = np.count_nonzero(K_global) / K_global.size
-    print(f"Matrix density: {density}")
+    if not matrix_free and precision == 'double':
+        matrix_free = choose_matrix_free(len(node_coords), len(elements), 1, solver_method, memory_budget)
 
-    # Solution of a system of equations
-    start_time = datetime.now()
-    if solver_method == 'solve':
-        temperatures = np.linalg.solve(K_global, F)
-    elif solver_method == 'spsolve':
-        temperatures = sp.sparse.linalg.spsolve(K_global, F)
-    elif solver_method == 'lsqr':
-        temperatures, istop, itn, r1norm = sp.sparse.linalg.lsqr(K_global, F)[:4]
-        print(f"Residual norm (r1norm) for LSQR: {r1norm}")
-    elif solver_method == 'cg':
-        temperatures, info = sp.sparse.linalg.cg(K_global, F)
-        if info != 0:
-            print(f"Residual norm for CG: {np.linalg.norm(K_global @ temperatures - F)}")
-    elif solver_method == 'bicg':
-        temperatures, info = sp.sparse.linalg.bicg(K_global, F)
-        if info != 0:
-            print(f"Residual norm for BiCG: {np.linalg.norm(K_global @ temperatures - F)}")
-    elif solver_method == 'bicgstab':
-        temperatures, info = sp.sparse.linalg.bicgstab(K_global, F)
-        if info != 0:
-            print(f"Residual norm for BiCGStab: {np.linalg.norm(K_global @ temperatures - F)}")
-    elif solver_method == 'gmres':
-        temperatures, info = sp.sparse.linalg.gmres(K_global, F)
-        if info != 0:
-            print(f"Residual norm for GMRES: {np.linalg.norm(K_global @ temperatures - F)}")
-    elif solver_method == 'minres':
-        temperatures, info = sp.sparse.linalg.minres(K_global, F)
-        if info != 0:
-            print(f"Residual norm for MINRES: {np.linalg.norm(K_global @ temperatures - F)}")
+    if matrix_free:
+        with profiler.span('assembly'):
+            K_global = conductivity_operator(elements, node_coords, k)
+        with profiler.span('boundary_conditions'):
+            K_global, F = apply_boundary_conditions_matrix_free(K_global, F, fixed_nodes, fixed_temperatures)
     else:
-        raise ValueError(f"Unknown solver method: {solver_method}")
+        with profiler.span('assembly'):
+            K_global = assemble_global_conductivity_matrix(elements, node_coords, k,
+                                                           sparse=precision == 'mixed' or solver_method != 'solve',
+                                                           memory_budget=memory_budget)
+        with profiler.span('boundary_conditions'):
+            K_global, F = apply_boundary_conditions(K_global, F, fixed_nodes, fixed_temperatures)
+        # Counting the nonzeros of a dense matrix is a full pass over N^2 entries, so only sparse nnz is reported
+        if sp.sparse.issparse(K_global):
+            profiler.record(nnz=K_global.nnz)
+
+    if solver_method == 'auto':
+        solver_method, _ = select_solver_method(K_global, memory_budget, precision=precision)
+        profiler.record(solver_method=solver_method)
+
+    # The double precision system is kept for the residuals, the single precision one is factored
+    K_full = None
+    if precision == 'mixed':
+        with profiler.span('single_precision_assembly'):
+            K_full = K_global
+            if solver_method == 'solve':
+                # Assembling the dense matrix in single precision avoids a double precision dense temporary
+                K_global = assemble_global_conductivity_matrix(elements, node_coords, k, sparse=False,
+                                                               dtype=np.float32)
+                K_global, _ = apply_boundary_conditions(K_global, np.zeros(len(F)), fixed_nodes, fixed_temperatures)
+            else:
+                K_global = K_full.astype(np.float32)
+
+    solver_options = dict(solver_options or {})
+    if solver_method == 'schur':
+        solver_options.setdefault('dof_coords', np.asarray(node_coords))
 
-    print('Time taken to solve a system of equations: ', datetime.now() - start_time)
+    # Solution of a system of equations
+    with profiler.span('solve'):
+        temperatures = solve_linear_system(K_global, F, solver_method, precision=precision, K_full=K_full,
+                                           solver_options=solver_options, profiler=profiler,
+                                           memory_budget=memory_budget)
 
     return temperatures
 
 
-
 if __name__ == "__main__":
+    from src.fem.profiling import Profiler
+
     node_coords = np.array([
         [0, 0], [1, 0], [2, 0], [3, 0],
         [0, 1], [1, 1], [2, 1], [3, 1],
@@ -100,6 +118,9 @@ if __name__ == "__main__":
     heat_sources = np.zeros(len(node_coords))
     heat_sources[5] = 75.0  # Example of an internal heat source
 
-    temperatures = solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources)
+    profiler = Profiler()
+    temperatures = solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                           profiler=profiler)
 
     print("Temperatures in nodes:\n", temperatures)
+    print(profiler.to_json())
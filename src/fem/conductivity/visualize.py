@@ -1,31 +1,49 @@
-from datetime import datetime
-
-import matplotlib.pyplot as plt
 import numpy as np
 
 from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+from src.fem.profiling import Profiler
 from src.fem.mesh import create_regular_triangular_mesh_in_rectangle, create_random_triangular_mesh_in_rectangle, \
-    create_random_triangular_mesh_in_polygon, \
-    plot_mesh, plot_elements, create_adaptive_triangular_mesh_in_polygon, refinement_criteria
+    create_random_triangular_mesh_in_polygon, create_adaptive_triangular_mesh_in_polygon, refinement_criteria
+from src.fem.rasterize import rasterize_field
+
+# Meshes with more elements are drawn as a rasterized image instead of filled contours
+RASTER_ELEMENT_LIMIT = 100000
 
 
-def visualize_heat_transfer(node_coords, elements, temperatures, title="None"):
+def visualize_heat_transfer(node_coords, elements, temperatures, title="None", filename=None, resolution=1000,
+                            raster_element_limit=RASTER_ELEMENT_LIMIT):
     """
     Visualizes the results of a heat transfer problem.
 
+    Filled contours get slow and memory hungry on millions of triangles, so larger meshes are rasterized
+    on a fixed pixel grid whose cost depends on the resolution rather than the number of elements.
+
     Parameters:
     node_coords (np.ndarray): Node coordinates (Nx2).
     elements (list of list of int): List of elements, each specified as a list of node indices.
     temperatures (np.ndarray): Vector of temperatures (N).
     title (str): Title for the graph. Default is "Temperature Distribution".
+    filename (str, optional): Image file to save the plot to instead of showing it.
+    resolution (int): Width in pixels of the rasterized temperature field.
+    raster_element_limit (int): Number of elements above which the field is rasterized.
     """
-    plt.tricontourf(node_coords[:, 0], node_coords[:, 1], np.array(elements), temperatures, levels=14, cmap='coolwarm')
-    plt.colorbar()
-    plt.title(title)  # Use the passed title
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.gca().set_aspect('equal', adjustable='box')
-    plt.show()
+    # matplotlib is only loaded once something is plotted
+    from src.fem.plotting import create_figure, show_or_save_figure
+
+    elements = np.asarray(elements)
+    fig, ax = create_figure(filename, figsize=(8, 6))
+    if len(elements) > raster_element_limit:
+        image, extent = rasterize_field(node_coords, elements, temperatures, width=resolution)
+        mappable = ax.imshow(image, origin='lower', extent=extent, cmap='coolwarm', interpolation='nearest')
+    else:
+        mappable = ax.tricontourf(node_coords[:, 0], node_coords[:, 1], elements, temperatures, levels=14,
+                                  cmap='coolwarm')
+    fig.colorbar(mappable, ax=ax)
+    ax.set_title(title)  # Use the passed title
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_aspect('equal', adjustable='box')
+    show_or_save_figure(fig, filename)
 
 
 def main():
@@ -38,13 +56,14 @@ def main():
     initial_num_points = 10000
     solver_method = 'spsolve'
 
-    start_time = datetime.now()
-    node_coords, elements = create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_points,
-                                                                       refinement_criteria)
+    profiler = Profiler()
+
+    with profiler.span('mesh'):
+        node_coords, elements = create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_points,
+                                                                           refinement_criteria)
     print("Initial number of nodes:", initial_num_points)
     print("Total number of nodes:", len(node_coords))
 
-    print("Mesh creation time:", datetime.now() - start_time)
     k = 1.0
 
     # Setting fixed nodes and their temperatures
@@ -70,13 +89,16 @@ def main():
             heat_sources[i] = heat_per_node
 
     temperatures = solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
-                                               solver_method)
+                                           solver_method, profiler=profiler)
 
     print("Temperatures in nodes:\n", temperatures)
 
-    start_time = datetime.now()
-    visualize_heat_transfer(node_coords, elements, temperatures, title=solver_method)
-    print("Heat transfer visualization time:", datetime.now() - start_time)
+    with profiler.span('post_processing'):
+        visualize_heat_transfer(node_coords, elements, temperatures, title=solver_method)
+
+    for span in profiler.spans:
+        print(f"{'  ' * span['depth']}{span['name']}: {span['wall_time']:.3f} s")
+    profiler.to_json('heat_transfer_profile.json')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+import multiprocessing
+import warnings
+
+import numpy as np
+import scipy as sp
+
+
+def partition_coordinate_bisection(dof_coords, n_subdomains):
+    """
+    Partitions degrees of freedom by recursive coordinate bisection.
+
+    Each step splits the points across their longest extent, in proportion to the number of subdomains
+    assigned to each side.
+
+    Parameters:
+    dof_coords (np.ndarray): Coordinates of every degree of freedom (n x 2).
+    n_subdomains (int): Number of subdomains.
+
+    Returns:
+    np.ndarray: Subdomain label of every degree of freedom (n).
+    """
+    dof_coords = np.asarray(dof_coords, dtype=float)
+    labels = np.zeros(len(dof_coords), dtype=int)
+
+    def bisect(indices, first_label, count):
+        if count == 1:
+            labels[indices] = first_label
+            return
+        points = dof_coords[indices]
+        axis = np.argmax(points.max(axis=0) - points.min(axis=0))
+        left_count = count // 2
+        order = indices[np.argsort(points[:, axis], kind='stable')]
+        split = len(order) * left_count // count
+        bisect(order[:split], first_label, left_count)
+        bisect(order[split:], first_label + left_count, count - left_count)
+
+    bisect(np.arange(len(dof_coords)), 0, n_subdomains)
+    return labels
+
+
+def partition_spectral_bisection(K, n_subdomains):
+    """
+    Partitions degrees of freedom by recursive spectral bisection of the matrix graph.
+
+    Each step splits the vertices by the Fiedler vector of the graph Laplacian, in proportion to the number of
+    subdomains assigned to each side.
+
+    Parameters:
+    K (sp.sparse.spmatrix): System matrix whose sparsity pattern defines the graph.
+    n_subdomains (int): Number of subdomains.
+
+    Returns:
+    np.ndarray: Subdomain label of every degree of freedom (n).
+    """
+    graph = sp.sparse.csr_matrix(K, dtype=float, copy=True)
+    graph.data = np.ones_like(graph.data)
+    graph.setdiag(0)
+    graph.eliminate_zeros()
+    labels = np.zeros(K.shape[0], dtype=int)
+
+    def bisect(indices, first_label, count):
+        if count == 1:
+            labels[indices] = first_label
+            return
+        laplacian = sp.sparse.csgraph.laplacian(graph[indices][:, indices])
+        if len(indices) <= 200:
+            _, vectors = np.linalg.eigh(laplacian.toarray())
+        else:
+            # Shift-invert around a small negative shift keeps the singular Laplacian factorizable
+            _, vectors = sp.sparse.linalg.eigsh(laplacian.tocsc(), k=2, sigma=-1e-3, which='LM')
+        fiedler = vectors[:, 1]
+        left_count = count // 2
+        order = indices[np.argsort(fiedler, kind='stable')]
+        split = len(order) * left_count // count
+        bisect(order[:split], first_label, left_count)
+        bisect(order[split:], first_label + left_count, count - left_count)
+
+    bisect(np.arange(K.shape[0]), 0, n_subdomains)
+    return labels
+
+
+def _subdomain_worker(connection, A_II, A_IG, A_GI):
+    """
+    Factors the interior block of one subdomain and answers solve requests until told to stop.
+    """
+    if A_II.shape[0]:
+        solve = sp.sparse.linalg.splu(A_II.tocsc()).solve
+    else:
+        solve = np.asarray
+    while True:
+        command, vector = connection.recv()
+        if command == 'schur':
+            connection.send(A_GI @ solve(A_IG @ vector))
+        elif command == 'interior':
+            connection.send(solve(vector))
+        else:
+            connection.close()
+            return
+
+
+def solve_schur_complement(K, F, n_subdomains=4, partition=None, dof_coords=None, x0=None, rtol=1e-10,
+                           maxiter=None):
+    """
+    Solves a system of equations by non-overlapping domain decomposition.
+
+    The degrees of freedom are partitioned into subdomains separated by interface degrees of freedom.
+    Every subdomain's interior block is factored in its own worker process, and the interface Schur complement
+    S = A_GG - sum_s A_GI^s (A_II^s)^-1 A_IG^s is solved with Jacobi-preconditioned CG. Each application of S
+    runs the subdomain solves in parallel.
+
+    Parameters:
+    K (np.ndarray or sp.sparse.spmatrix): Symmetric positive definite system matrix.
+    F (np.ndarray): Right-hand side vector.
+    n_subdomains (int): Number of subdomains and worker processes.
+    partition (str, optional): 'coordinate' for recursive coordinate bisection or 'spectral' for recursive
+        spectral bisection. Defaults to 'coordinate' when dof_coords are given and 'spectral' otherwise.
+    dof_coords (np.ndarray, optional): Coordinates of every degree of freedom (n x 2).
+    x0 (np.ndarray, optional): Initial guess for the interface values.
+    rtol (float): Relative residual of the interface CG, as tight as the other iterative solves by default so the
+        result can stand in for a direct solve.
+    maxiter (int, optional): Maximum number of interface CG iterations, ten times the interface size if None.
+
+    Returns:
+    np.ndarray, dict: Solution vector and a record with the interface size and the CG iteration count.
+    """
+    K = sp.sparse.csr_matrix(K)
+    F = np.asarray(F, dtype=float)
+
+    if partition is None:
+        partition = 'spectral' if dof_coords is None else 'coordinate'
+    if partition == 'coordinate':
+        if dof_coords is None:
+            raise ValueError("Coordinate bisection requires the coordinates of the degrees of freedom")
+        labels = partition_coordinate_bisection(dof_coords, n_subdomains)
+    elif partition == 'spectral':
+        labels = partition_spectral_bisection(K, n_subdomains)
+    else:
+        raise ValueError(f"Unknown partition method: {partition}")
+
+    # A degree of freedom coupled to a higher subdomain joins the interface, which decouples the interiors
+    rows, cols = K.nonzero()
+    interface = np.zeros(K.shape[0], dtype=bool)
+    interface[rows[labels[cols] > labels[rows]]] = True
+    interface_dofs = np.flatnonzero(interface)
+
+    K_GG = K[interface_dofs][:, interface_dofs]
+    F_G = F[interface_dofs].copy()
+
+    context = multiprocessing.get_context()
+    subdomains = []
+    try:
+        for label in range(n_subdomains):
+            interior = np.flatnonzero((labels == label) & ~interface)
+            A_IG_full = K[interior][:, interface_dofs]
+            local_interface = np.unique(A_IG_full.nonzero()[1])
+            A_IG = A_IG_full[:, local_interface]
+            A_GI = K[interface_dofs[local_interface]][:, interior]
+
+            parent, child = context.Pipe()
+            process = context.Process(target=_subdomain_worker, args=(child, K[interior][:, interior], A_IG, A_GI),
+                                      daemon=True)
+            process.start()
+            subdomains.append((interior, local_interface, A_IG, A_GI, parent, process))
+
+        # Condensed right-hand side g = F_G - sum_s A_GI^s (A_II^s)^-1 F_I^s, computed in parallel
+        for interior, _, _, _, connection, _ in subdomains:
+            connection.send(('interior', F[interior]))
+        interior_solutions = [connection.recv() for _, _, _, _, connection, _ in subdomains]
+        for (_, local_interface, _, A_GI, _, _), solution in zip(subdomains, interior_solutions):
+            F_G[local_interface] -= A_GI @ solution
+
+        def schur_matvec(x):
+            x = np.asarray(x).reshape(-1)
+            for _, local_interface, _, _, connection, _ in subdomains:
+                connection.send(('schur', x[local_interface]))
+            y = K_GG @ x
+            for _, local_interface, _, _, connection, _ in subdomains:
+                y[local_interface] -= connection.recv()
+            return y
+
+        iterations = 0
+
+        def count_iteration(_):
+            nonlocal iterations
+            iterations += 1
+
+        u_G = np.zeros(0)
+        if len(interface_dofs):
+            n_interface = len(interface_dofs)
+            S = sp.sparse.linalg.LinearOperator((n_interface, n_interface), matvec=schur_matvec, dtype=float)
+            preconditioner = sp.sparse.linalg.LinearOperator((n_interface, n_interface), dtype=float,
+                                                             matvec=lambda r: r.reshape(-1) / K_GG.diagonal())
+            x0_G = None if x0 is None else np.asarray(x0, dtype=float)[interface_dofs]
+            u_G, info = sp.sparse.linalg.cg(S, F_G, x0=x0_G, rtol=rtol, maxiter=maxiter, M=preconditioner,
+                                            callback=count_iteration)
+            if info != 0:
+                warnings.warn(f"Schur complement CG did not converge, "
+                              f"residual norm {np.linalg.norm(schur_matvec(u_G) - F_G)}")
+
+        # Back substitution of the interiors u_I = (A_II)^-1 (F_I - A_IG u_G)
+        solution = np.empty(K.shape[0])
+        solution[interface_dofs] = u_G
+        for interior, local_interface, A_IG, _, connection, _ in subdomains:
+            connection.send(('interior', F[interior] - A_IG @ u_G[local_interface]))
+        for interior, _, _, _, connection, _ in subdomains:
+            solution[interior] = connection.recv()
+    finally:
+        for _, _, _, _, connection, process in subdomains:
+            try:
+                connection.send(('stop', None))
+            except (BrokenPipeError, OSError):
+                pass
+            process.join()
+
+    return solution, {'interface_size': len(interface_dofs), 'iterations': iterations}
+
+
+if __name__ == '__main__':
+    from src.fem.conductivity.boundary_conditions import apply_boundary_conditions
+    from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 50, 50)
+    fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+    K_global = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    K_global, F = apply_boundary_conditions(K_global, np.ones(len(node_coords)), fixed_nodes,
+                                            np.zeros(len(fixed_nodes)))
+
+    temperatures, info = solve_schur_complement(K_global, F, n_subdomains=4, dof_coords=node_coords)
+    print("Difference from the direct solution:",
+          np.abs(temperatures - sp.sparse.linalg.spsolve(K_global.tocsc(), F)).max())
+    print(info)
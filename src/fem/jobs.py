@@ -0,0 +1,418 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy as sp
+
+from src.fem.cache import hash_arrays
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions, lift_fixed_temperatures
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.mesh import create_adaptive_triangular_mesh_in_polygon, create_random_triangular_mesh_in_polygon, \
+    create_random_triangular_mesh_in_rectangle, create_regular_triangular_mesh_in_rectangle
+
+# Mesh generators a job can name in its mesh spec
+MESH_GENERATORS = {
+    'regular': create_regular_triangular_mesh_in_rectangle,
+    'random': create_random_triangular_mesh_in_rectangle,
+    'polygon': create_random_triangular_mesh_in_polygon,
+    'adaptive': create_adaptive_triangular_mesh_in_polygon,
+}
+
+# Factorized operators every worker keeps, least recently used ones are dropped first
+FACTORIZATION_CACHE_SIZE = 8
+
+# Shared meshes no pending job uses that stay in shared memory for later jobs, least recently used ones are freed
+MESH_CACHE_SIZE = 4
+
+# Jobs in flight at every worker holding an operator from which it is factorized on an idle worker as well
+REPLICATE_AFTER = 4
+
+# Shared meshes and factorized operators of the current worker process
+_worker_meshes = {}
+_worker_factorizations = OrderedDict()
+
+
+def _attach_shared_mesh(mesh_key, blocks):
+    """
+    Attaches a worker to a shared mesh once and returns read-only views of its arrays.
+    """
+    if mesh_key not in _worker_meshes:
+        arrays = []
+        handles = []
+        for name, shape, dtype in blocks:
+            handle = shared_memory.SharedMemory(name=name)
+            array = np.ndarray(shape, dtype=dtype, buffer=handle.buf)
+            array.flags.writeable = False
+            handles.append(handle)
+            arrays.append(array)
+        _worker_meshes[mesh_key] = (handles, arrays)
+    return _worker_meshes[mesh_key][1]
+
+
+def _detach_shared_mesh(mesh_key):
+    """
+    Closes the attachment of a worker to a shared mesh the parent process has freed.
+    """
+    handles, arrays = _worker_meshes.pop(mesh_key, ((), ()))
+    # The views have to go before their buffers can be closed
+    del arrays
+    for handle in handles:
+        handle.close()
+
+
+def _solve_heat_transfer_job(mesh_key, blocks, operator_key, k, fixed_nodes, fixed_temperatures, heat_sources,
+                             cache_size):
+    """
+    Solves one heat transfer job in a worker process.
+
+    The constrained conductivity matrix only depends on the mesh, the conductivity and the fixed nodes, so its
+    LU factorization is cached under the operator key and later jobs only lift their fixed temperatures into the
+    right-hand side and back-substitute.
+    """
+    timing = {}
+    start_time = time.perf_counter()
+    node_coords, elements = _attach_shared_mesh(mesh_key, blocks)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+
+    reused = operator_key in _worker_factorizations
+    if reused:
+        _worker_factorizations.move_to_end(operator_key)
+        K_global, lu = _worker_factorizations[operator_key]
+    else:
+        t = time.perf_counter()
+        K_global = assemble_global_conductivity_matrix(elements, node_coords, k, sparse=True)
+        timing['assembly'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        K_bc, _ = apply_boundary_conditions(K_global, np.zeros(len(node_coords)), fixed_nodes,
+                                            np.zeros(len(fixed_nodes)))
+        lu = sp.sparse.linalg.splu(K_bc.tocsc())
+        timing['factorization'] = time.perf_counter() - t
+
+        _worker_factorizations[operator_key] = (K_global, lu)
+        while len(_worker_factorizations) > cache_size:
+            _worker_factorizations.popitem(last=False)
+
+    t = time.perf_counter()
+    F = lift_fixed_temperatures(K_global, np.array(heat_sources, dtype=float).flatten(), fixed_nodes,
+                                fixed_temperatures)
+    temperatures = lu.solve(F)
+    timing['solve'] = time.perf_counter() - t
+    timing['worker_total'] = time.perf_counter() - start_time
+
+    return temperatures, timing, reused, os.getpid()
+
+
+class HeatTransferJobRunner:
+    """
+    Runs a stream of independent heat transfer jobs in worker processes behind an asyncio API.
+
+    A job is a dict with the keys
+        'mesh': (node_coords, elements) arrays, or a spec (generator, args) with a generator name from
+            MESH_GENERATORS. Specs of random generators are generated once and shared by all their jobs.
+        'k': Thermal conductivity, a scalar, one value per element or a picklable function. Defaults to 1.0.
+        'fixed_nodes', 'fixed_temperatures', 'heat_sources': As in solve_fem_heat_transfer.
+        'id' (optional): Returned with the result.
+
+    Identical meshes are stored once in shared memory and attached read-only by the workers. A mesh is counted
+    by its pending jobs; once none is left it stays shared among the mesh_cache_size most recently used idle
+    meshes, and is freed in the parent and the workers when it drops out of them, so a continuous stream of new
+    meshes runs in bounded memory. A spec mesh that was freed is generated again by its next job.
+
+    Jobs with the same mesh, conductivity and fixed nodes share one operator. Each operator is pinned to the worker
+    that factorized it first, so its later jobs reuse the factorization, which also runs them one after another.
+    When every worker holding an operator has replicate_after jobs in flight, the operator is factorized on an idle
+    worker as well and its jobs are spread over the copies. At most max_pending jobs are in flight, further
+    submissions wait for a free slot.
+
+    Example:
+        async with HeatTransferJobRunner(max_workers=4) as runner:
+            results = await runner.run(jobs)
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, cache_size=FACTORIZATION_CACHE_SIZE,
+                 mesh_cache_size=MESH_CACHE_SIZE, replicate_after=REPLICATE_AFTER):
+        """
+        Parameters:
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        max_pending (int, optional): Number of jobs in flight before submit waits. Defaults to four per worker.
+        cache_size (int): Number of factorized operators every worker keeps.
+        mesh_cache_size (int): Number of shared meshes kept after their last pending job finished.
+        replicate_after (int, optional): Jobs in flight at every worker holding an operator from which an idle
+            worker factorizes it too. None pins every operator to a single worker.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.cache_size = cache_size
+        self.mesh_cache_size = mesh_cache_size
+        self.replicate_after = replicate_after
+        # One single-process pool per worker lets jobs be routed to the worker holding their factorization
+        self._workers = [ProcessPoolExecutor(max_workers=1) for _ in range(self.max_workers)]
+        self._load = [0] * self.max_workers
+        self._operator_workers = {}
+        # Shared meshes by key: blocks and node count, shared memory handles, pending jobs, workers that attached
+        # them and the operators on them
+        self._meshes = {}
+        self._mesh_handles = {}
+        self._mesh_refs = {}
+        self._mesh_workers = {}
+        self._mesh_operators = {}
+        self._idle_meshes = OrderedDict()
+        self._mesh_keys = {}
+        self._spec_waiters = {}
+        self._slots = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _share_mesh(self, node_coords, elements):
+        """
+        Copies a mesh into shared memory unless an identical one is already shared, and returns its key.
+        """
+        node_coords = np.ascontiguousarray(node_coords, dtype=np.float64)
+        elements = np.ascontiguousarray(elements, dtype=np.int64)
+        mesh_key = hash_arrays(node_coords, elements)
+        if mesh_key not in self._meshes:
+            blocks = []
+            handles = []
+            for array in (node_coords, elements):
+                handle = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=handle.buf)[...] = array
+                handles.append(handle)
+                blocks.append((handle.name, array.shape, array.dtype.str))
+            self._meshes[mesh_key] = (blocks, len(node_coords))
+            self._mesh_handles[mesh_key] = handles
+            self._mesh_refs[mesh_key] = 0
+            self._mesh_workers[mesh_key] = set()
+            self._mesh_operators[mesh_key] = set()
+        return mesh_key
+
+    def _acquire_mesh(self, mesh_key, count=1):
+        """
+        Counts pending jobs of a shared mesh, which keep it from being freed.
+        """
+        self._mesh_refs[mesh_key] += count
+        self._idle_meshes.pop(mesh_key, None)
+
+    def _release_mesh(self, mesh_key):
+        """
+        Ends a job of a shared mesh, and frees the least recently used idle meshes beyond mesh_cache_size.
+        """
+        self._mesh_refs[mesh_key] -= 1
+        if self._mesh_refs[mesh_key] == 0:
+            self._idle_meshes[mesh_key] = None
+        while len(self._idle_meshes) > self.mesh_cache_size:
+            self._free_mesh(self._idle_meshes.popitem(last=False)[0])
+
+    def _free_mesh(self, mesh_key):
+        """
+        Unlinks a shared mesh, detaches the workers from it and forgets its specs and operators.
+        """
+        del self._meshes[mesh_key], self._mesh_refs[mesh_key]
+        for handle in self._mesh_handles.pop(mesh_key):
+            handle.close()
+            handle.unlink()
+        # A worker runs its jobs in order, so the detach cannot overtake a job of the mesh
+        for worker in self._mesh_workers.pop(mesh_key):
+            self._workers[worker].submit(_detach_shared_mesh, mesh_key)
+        for operator_key in self._mesh_operators.pop(mesh_key):
+            self._operator_workers.pop(operator_key, None)
+        for spec, future in list(self._mesh_keys.items()):
+            if future.done() and not future.exception() and future.result() == mesh_key:
+                del self._mesh_keys[spec]
+
+    async def _resolve_mesh(self, mesh):
+        """
+        Returns the shared mesh key of a job mesh and counts the job as one of its pending jobs. A spec mesh is
+        only generated once however many jobs use it.
+        """
+        if not isinstance(mesh[0], str):
+            mesh_key = self._share_mesh(*mesh)
+            self._acquire_mesh(mesh_key)
+            return mesh_key
+
+        generator, args = mesh
+        spec = (generator, tuple(args))
+        if spec not in self._mesh_keys:
+            async def generate():
+                loop = asyncio.get_running_loop()
+                try:
+                    node_coords, elements = await loop.run_in_executor(None, MESH_GENERATORS[generator], *args)
+                except Exception:
+                    self._spec_waiters.pop(spec)
+                    raise
+                mesh_key = self._share_mesh(node_coords, elements)
+                # Counted before the waiting jobs resume, so the mesh cannot be freed in between
+                self._acquire_mesh(mesh_key, self._spec_waiters.pop(spec))
+                return mesh_key
+
+            self._spec_waiters[spec] = 0
+            self._mesh_keys[spec] = asyncio.ensure_future(generate())
+
+        future = self._mesh_keys[spec]
+        if future.done():
+            mesh_key = future.result()
+            self._acquire_mesh(mesh_key)
+            return mesh_key
+        self._spec_waiters[spec] += 1
+        return await future
+
+    def _choose_worker(self, operator_key):
+        """
+        Returns the least loaded worker holding an operator. A new operator goes to the least loaded worker, and
+        a busy one is replicated to an idle worker.
+        """
+        workers = self._operator_workers.setdefault(operator_key, [])
+        least_loaded = int(np.argmin(self._load))
+        if workers:
+            worker = min(workers, key=self._load.__getitem__)
+            if self.replicate_after is None or self._load[worker] < self.replicate_after \
+                    or self._load[least_loaded] > 0:
+                return worker
+        workers.append(least_loaded)
+        return least_loaded
+
+    async def _acquire_slot(self):
+        """
+        Waits until fewer than max_pending jobs are in flight.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        await self._slots.acquire()
+
+    async def _run_job(self, job, submit_time):
+        """
+        Runs a job that holds a slot and releases the slot when it is done.
+        """
+        try:
+            timing = {'queued': time.perf_counter() - submit_time}
+
+            t = time.perf_counter()
+            mesh_key = await self._resolve_mesh(job['mesh'])
+            timing['mesh'] = time.perf_counter() - t
+
+            try:
+                blocks, num_nodes = self._meshes[mesh_key]
+                k = job.get('k', 1.0)
+                k_key = hash_arrays(np.asarray(k, dtype=float)) if not callable(k) else hash_arrays(k)
+                fixed_nodes = np.asarray(job['fixed_nodes'], dtype=int)
+                operator_key = hash_arrays(mesh_key, k_key, fixed_nodes)
+
+                worker = self._choose_worker(operator_key)
+                self._mesh_workers[mesh_key].add(worker)
+                self._mesh_operators[mesh_key].add(operator_key)
+                self._load[worker] += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    temperatures, worker_timing, reused, pid = await loop.run_in_executor(
+                        self._workers[worker], _solve_heat_transfer_job, mesh_key, blocks, operator_key, k,
+                        fixed_nodes, job['fixed_temperatures'], job.get('heat_sources', np.zeros(num_nodes)),
+                        self.cache_size)
+                finally:
+                    self._load[worker] -= 1
+            finally:
+                self._release_mesh(mesh_key)
+
+            timing.update(worker_timing)
+            timing['total'] = time.perf_counter() - submit_time
+            return {'id': job.get('id'), 'temperatures': temperatures, 'timing': timing, 'mesh_key': mesh_key,
+                    'operator_key': operator_key, 'factorization_reused': reused, 'worker': pid}
+        finally:
+            self._slots.release()
+
+    async def submit(self, job):
+        """
+        Runs one job, waiting first if max_pending jobs are already in flight.
+
+        Parameters:
+        job (dict): Heat transfer job, see the class description.
+
+        Returns:
+        dict: The job 'id', the 'temperatures' (N), 'timing' in seconds ('queued', 'mesh', 'assembly' and
+            'factorization' when not reused, 'solve', 'worker_total', 'total'), the 'mesh_key' and 'operator_key',
+            whether the factorization was reused and the 'worker' process id.
+        """
+        submit_time = time.perf_counter()
+        await self._acquire_slot()
+        return await self._run_job(job, submit_time)
+
+    async def run(self, jobs):
+        """
+        Runs jobs from an iterable, taking the next one only when a slot is free, so the iterable can be
+        a lazy stream.
+
+        Parameters:
+        jobs (iterable of dict): Heat transfer jobs.
+
+        Returns:
+        list of dict: Results in the order of the jobs, see submit.
+        """
+        tasks = []
+        for job in jobs:
+            submit_time = time.perf_counter()
+            await self._acquire_slot()
+            tasks.append(asyncio.create_task(self._run_job(job, submit_time)))
+        return await asyncio.gather(*tasks)
+
+    def close(self):
+        """
+        Shuts the workers down and frees the shared meshes.
+        """
+        for worker in self._workers:
+            worker.shutdown()
+        for handles in self._mesh_handles.values():
+            for handle in handles:
+                handle.close()
+                handle.unlink()
+        self._meshes = {}
+        self._mesh_handles = {}
+        self._mesh_refs = {}
+        self._mesh_workers = {}
+        self._mesh_operators = {}
+        self._idle_meshes = OrderedDict()
+        self._mesh_keys = {}
+        self._operator_workers = {}
+
+
+if __name__ == '__main__':
+    from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+
+    rng = np.random.default_rng(0)
+    specs = [('regular', (0, 1, 0, 1, 60, 60)), ('regular', (0, 2, 0, 1, 80, 40)), ('random', (0, 1, 0, 1, 2000, 0))]
+
+    def make_job(i):
+        spec = specs[i % len(specs)]
+        node_coords, elements = MESH_GENERATORS[spec[0]](*spec[1])
+        fixed_nodes = np.flatnonzero(node_coords[:, 0] <= node_coords[:, 0].min() + 0.05)
+        return {'id': i, 'mesh': spec, 'k': 1.0, 'fixed_nodes': fixed_nodes,
+                'fixed_temperatures': rng.uniform(0, 100, len(fixed_nodes)),
+                'heat_sources': rng.uniform(0, 1, len(node_coords))}
+
+    jobs = [make_job(i) for i in range(60)]
+
+    async def main():
+        async with HeatTransferJobRunner(max_workers=2, mesh_cache_size=1) as runner:
+            results = await runner.run(jobs)
+            # Only the most recently used idle mesh is still shared
+            print(f"Shared meshes after the stream: {len(runner._meshes)}")
+            return results
+
+    start_time = time.perf_counter()
+    results = asyncio.run(main())
+    print(f"{len(jobs)} jobs in {time.perf_counter() - start_time:.2f} s, "
+          f"{sum(result['factorization_reused'] for result in results)} reused factorizations")
+
+    # Check a job against the serial solver
+    job, result = jobs[-1], results[-1]
+    node_coords, elements = MESH_GENERATORS[job['mesh'][0]](*job['mesh'][1])
+    expected = solve_fem_heat_transfer(node_coords, elements, job['k'], job['fixed_nodes'], job['fixed_temperatures'],
+                                       job['heat_sources'], 'spsolve')
+    print("Maximum difference to solve_fem_heat_transfer:", np.abs(result['temperatures'] - expected).max())
+    print("Timing of the last job:", {name: round(value, 4) for name, value in result['timing'].items()})
@@ -1,29 +1,39 @@
+import logging
+
 import numpy as np
+import scipy as sp
+
+logger = logging.getLogger(__name__)
+
 
 def apply_boundary_conditions_mass(M, F, fixed_nodes):
     """
     Применяет граничные условия к системе уравнений для задачи с матрицей массы.
 
     Parameters:
-    M (np.ndarray): Глобальная матрица массы.
+    M (np.ndarray or sp.sparse.spmatrix): Глобальная матрица массы.
     F (np.ndarray): Вектор внешних сил.
     fixed_nodes (list of int): Список индексов фиксированных узлов.
 
     Returns:
-    np.ndarray, np.ndarray: Измененные матрица массы и вектор внешних сил.
+    np.ndarray or sp.sparse.csr_matrix, np.ndarray: Измененные матрица массы и вектор внешних сил.
     """
-    for node in fixed_nodes:
-        for i in range(2):
-            row = 2 * node + i
-            M[row, :] = 0
-            M[:, row] = 0
-            M[row, row] = 1
-            F[row] = 0
-
-    print("Глобальная матрица массы после применения граничных условий:")
-    print(M)
-    print("Вектор внешних сил после применения граничных условий:")
-    print(F)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    dof = np.concatenate([2 * fixed_nodes, 2 * fixed_nodes + 1])
+
+    F[dof] = 0
+
+    if sp.sparse.issparse(M):
+        free = np.ones(M.shape[0], dtype=M.dtype)
+        free[dof] = 0
+        M = (sp.sparse.diags(free) @ M @ sp.sparse.diags(free) + sp.sparse.diags(1 - free)).tocsr()
+    else:
+        M[dof, :] = 0
+        M[:, dof] = 0
+        M[dof, dof] = 1
+
+    logger.debug("Глобальная матрица массы после применения граничных условий:\n%s", M)
+    logger.debug("Вектор внешних сил после применения граничных условий:\n%s", F)
 
     return M, F
 
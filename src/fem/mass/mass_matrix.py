@@ -1,5 +1,13 @@
+import logging
+
 import numpy as np
 
+from src.fem.assembly import deduplicated_element_matrices, element_dofs, scatter_element_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.memory import choose_assembly_format
+
+logger = logging.getLogger(__name__)
+
 
 def element_mass_matrix(rho, coords):
     """
@@ -36,31 +44,69 @@ def element_mass_matrix(rho, coords):
     return me
 
 
-def assemble_global_mass_matrix(elements, node_coords, rho):
+def element_mass_matrices(rho, coords):
+    """
+    Вычисляет элементные матрицы массы для набора треугольных элементов.
+
+    Parameters:
+    rho (float or np.ndarray): Плотность материала, скаляр или значение для каждого элемента (E).
+    coords (np.ndarray): Координаты узлов элементов (Ex3x2).
+
+    Returns:
+    np.ndarray: Элементные матрицы массы (Ex3x3).
+    """
+    coords = np.asarray(coords, dtype=float)
+    d1 = coords[:, 1] - coords[:, 0]
+    d2 = coords[:, 2] - coords[:, 0]
+
+    # Вычисление площадей элементов
+    A = 0.5 * np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])
+
+    reference = np.array([
+        [2, 1, 1],
+        [1, 2, 1],
+        [1, 1, 2]
+    ]) / 12
+
+    return (np.asarray(rho, dtype=float) * A)[..., np.newaxis, np.newaxis] * reference
+
+
+def assemble_global_mass_matrix(elements, node_coords, rho, sparse=False, memory_budget=None, deduplicate=None):
     """
     Составляет глобальную матрицу массы из элементных матриц.
 
     Parameters:
     elements (list of list of int): Список элементов, каждый из которых задан как список индексов узлов.
     node_coords (np.ndarray): Координаты узлов (Nx2).
-    rho (float): Плотность материала.
+    rho (float, np.ndarray or callable): Плотность материала. Скаляр, значение для каждого элемента (E)
+        или функция центров элементов (Ex2).
+    sparse (bool): Вернуть разреженную матрицу CSR вместо плотного массива.
+    memory_budget (float, optional): Допустимый объем памяти в байтах, см. get_memory_budget. Плотная матрица,
+        которая в него не помещается, собирается как разреженная.
+    deduplicate (str, optional): 'translation' или 'rotation', чтобы вычислять элементную матрицу один раз для
+        каждой группы сдвинутых или повернутых копий элемента, см. unique_element_geometries.
 
     Returns:
-    np.ndarray: Глобальная матрица массы (2N x 2N).
+    np.ndarray or sp.sparse.csr_matrix: Глобальная матрица массы (2N x 2N).
     """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
     N = len(node_coords)
-    M_global = np.zeros((2 * N, 2 * N))
+    sparse = choose_assembly_format(N, len(elements), 2, sparse, memory_budget=memory_budget)
 
-    for element in elements:
-        coords = node_coords[element]
-        me = element_mass_matrix(rho, coords)
+    rho = evaluate_element_field(rho, node_coords, elements)
+    if deduplicate:
+        me = deduplicated_element_matrices(lambda coords: element_mass_matrices(1.0, coords), node_coords[elements],
+                                           deduplicate, factor=rho)
+    else:
+        me = element_mass_matrices(rho, node_coords[elements])
 
-        for i in range(3):
-            for j in range(3):
-                M_global[2 * element[i]:2 * element[i] + 2, 2 * element[j]:2 * element[j] + 2] += me[i, j]
+    # Каждая компонента перемещения получает свою копию скалярной матрицы массы
+    me = np.kron(me, np.eye(2))
+    M_global = scatter_element_matrices(me, element_dofs(elements, dofs_per_node=2), 2 * N, sparse)
 
-    print("Глобальная матрица массы до применения граничных условий:")
-    print(M_global)
+    # Форматирование больших матриц дорого, поэтому оно выполняется только при уровне DEBUG
+    logger.debug("Глобальная матрица массы до применения граничных условий:\n%s", M_global)
 
     return M_global
 
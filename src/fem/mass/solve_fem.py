@@ -1,32 +1,40 @@
+import logging
+
 import numpy as np
 from src.fem.mass.mass_matrix import assemble_global_mass_matrix
 from src.fem.mass.boundary_conditions import apply_boundary_conditions_mass
+from src.fem.solvers import solve_linear_system
+
+logger = logging.getLogger(__name__)
 
-def solve_fem_mass(node_coords, elements, rho, fixed_nodes, external_forces):
+def solve_fem_mass(node_coords, elements, rho, fixed_nodes, external_forces, solver_method='auto',
+                   memory_budget=None):
     """
     Решает задачу конечных элементов для динамики с матрицей массы.
 
     Parameters:
     node_coords (np.ndarray): Координаты узлов.
     elements (list of list of int): Список элементов.
-    rho (float): Плотность материала.
+    rho (float, np.ndarray or callable): Плотность материала, скаляр, значение для каждого элемента
+        или функция центров элементов.
     fixed_nodes (list of int): Список индексов фиксированных узлов.
     external_forces (np.ndarray): Вектор внешних сил.
+    solver_method (str): Метод решения системы уравнений, 'auto' для автоматического выбора.
+    memory_budget (float, optional): Допустимый объем памяти в байтах, см. get_memory_budget. Если плотная
+        матрица в него не помещается, используется разреженная, а если не помещается и она, возникает MemoryError.
 
     Returns:
     np.ndarray: Вектор перемещений узлов.
     """
-    M_global = assemble_global_mass_matrix(elements, node_coords, rho)
+    M_global = assemble_global_mass_matrix(elements, node_coords, rho, sparse=solver_method != 'solve',
+                                           memory_budget=memory_budget)
     M_global, external_forces = apply_boundary_conditions_mass(M_global, external_forces, fixed_nodes)
 
     try:
-        print("Глобальная матрица массы перед решением системы уравнений:")
-        print(M_global)
-        print("Вектор внешних сил перед решением системы уравнений:")
-        print(external_forces)
-        displacements = np.linalg.solve(M_global, external_forces)
-        print("Перемещения узлов:")
-        print(displacements)
+        logger.debug("Глобальная матрица массы перед решением системы уравнений:\n%s", M_global)
+        logger.debug("Вектор внешних сил перед решением системы уравнений:\n%s", external_forces)
+        displacements = solve_linear_system(M_global, external_forces, solver_method, memory_budget=memory_budget)
+        logger.debug("Перемещения узлов:\n%s", displacements)
         return displacements
     except np.linalg.LinAlgError:
         print("Ошибка: Сингулярная матрица")
@@ -1,8 +1,4 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from src.fem.mesh import create_regular_triangular_mesh_in_rectangle, create_triangular_mesh, create_adaptive_mesh
-from src.fem.mass.mass_matrix import assemble_global_mass_matrix
-from src.fem.mass.boundary_conditions import apply_boundary_conditions_mass
 from src.fem.mass.solve_fem import solve_fem_mass
 
 def visualize_mass(node_coords, elements, displacements):
@@ -14,6 +10,8 @@ def visualize_mass(node_coords, elements, displacements):
     elements (list of list of int): Список элементов, каждый из которых задан как список индексов узлов.
     displacements (np.ndarray): Вектор перемещений (2N).
     """
+    import matplotlib.pyplot as plt  # Загружается только при построении графика
+
     x = node_coords[:, 0] + displacements[::2]
     y = node_coords[:, 1] + displacements[1::2]
 
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def element_centroids(node_coords, elements):
+    """
+    Calculates the centroids of all elements at once.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+
+    Returns:
+    np.ndarray: Element centroids (Ex2).
+    """
+    return np.asarray(node_coords, dtype=float)[np.asarray(elements)].mean(axis=1)
+
+
+def evaluate_element_field(field, node_coords, elements):
+    """
+    Evaluates a material property for every element.
+
+    A scalar is returned unchanged so that homogeneous materials keep broadcasting as a single number.
+    An array is treated as one value per element. A callable is evaluated once, vectorized, at the element centroids.
+
+    Parameters:
+    field (float, np.ndarray or callable): Material property. A callable receives the centroids (Ex2) and returns
+        the values (E).
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+
+    Returns:
+    float or np.ndarray: The scalar value or per-element values (E).
+    """
+    num_elements = len(elements)
+
+    if callable(field):
+        values = np.asarray(field(element_centroids(node_coords, elements)), dtype=float)
+        return np.broadcast_to(values, (num_elements,))
+
+    values = np.asarray(field, dtype=float)
+    if values.ndim == 0:
+        return float(values)
+    if values.shape != (num_elements,):
+        raise ValueError(f"Material field must have one value per element: expected {num_elements}, "
+                         f"got shape {values.shape}")
+    return values
+
+
+if __name__ == '__main__':
+    node_coords = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+    elements = [[0, 1, 2], [0, 2, 3]]
+
+    # Two materials split along the diagonal x = y
+    k = evaluate_element_field(lambda c: np.where(c[:, 0] > c[:, 1], 1.0, 10.0), node_coords, elements)
+    print(k)
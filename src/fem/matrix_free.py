@@ -0,0 +1,136 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.assembly import element_dofs
+from src.fem.conductivity.conductivity_matrix import element_gradient_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.stifness.stiffness_matrix import constitutive_matrices, element_strain_matrices
+
+
+def element_operator(B, weights, dofs, n_dofs):
+    """
+    Creates a linear operator that applies the global matrix sum_e P_e^T B_e^T W_e B_e P_e without assembling it.
+
+    The product gathers the element values, applies the cached B matrices and weights in batched einsum
+    calls and scatter-adds the element results, so only O(E) geometry data is kept in memory.
+
+    Parameters:
+    B (np.ndarray): Element gradient or strain-displacement matrices (E x r x n).
+    weights (np.ndarray): Element weights, either scalars (E) or matrices (E x r x r or r x r).
+    dofs (np.ndarray): Global degrees of freedom of every element (E x n).
+    n_dofs (int): Total number of degrees of freedom.
+
+    Returns:
+    sp.sparse.linalg.LinearOperator: Symmetric global operator (n_dofs x n_dofs).
+    """
+    weights = np.asarray(weights)
+    flat_dofs = dofs.ravel()
+
+    def matvec(x):
+        x_e = np.asarray(x).reshape(-1)[dofs]
+        g = np.einsum('ein,en->ei', B, x_e)
+        if weights.ndim == 1:
+            g *= weights[:, np.newaxis]
+        elif weights.ndim == 2:
+            g = g @ weights.T
+        else:
+            g = np.einsum('eij,ej->ei', weights, g)
+        y_e = np.einsum('ein,ei->en', B, g)
+        return np.bincount(flat_dofs, weights=y_e.ravel(), minlength=n_dofs)
+
+    return sp.sparse.linalg.LinearOperator((n_dofs, n_dofs), matvec=matvec, rmatvec=matvec, dtype=float)
+
+
+def conductivity_operator(elements, node_coords, k):
+    """
+    Creates a matrix-free global conductivity operator.
+
+    Parameters:
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    k (float, np.ndarray or callable): Thermal conductivity of the material. Either a scalar, one value per
+        element (E) or a function of the element centroids (Ex2).
+
+    Returns:
+    sp.sparse.linalg.LinearOperator: Global conductivity operator (N x N).
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
+
+    k = evaluate_element_field(k, node_coords, elements)
+    A, B = element_gradient_matrices(node_coords[elements])
+
+    return element_operator(B, k * A, element_dofs(elements), len(node_coords))
+
+
+def stiffness_operator(elements, node_coords, E, nu, plane='stress'):
+    """
+    Creates a matrix-free global stiffness operator.
+
+    Parameters:
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    E (float, np.ndarray or callable): Young's modulus of the material. Either a scalar, one value per element (E)
+        or a function of the element centroids (Ex2).
+    nu (float, np.ndarray or callable): Poisson's ratio of the material, given the same way as E.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    sp.sparse.linalg.LinearOperator: Global stiffness operator (2N x 2N).
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
+
+    E = evaluate_element_field(E, node_coords, elements)
+    nu = evaluate_element_field(nu, node_coords, elements)
+    A, B = element_strain_matrices(node_coords[elements])
+    D = constitutive_matrices(E, nu, plane)
+
+    # The element areas are folded into the D matrices
+    weights = A[:, np.newaxis, np.newaxis] * D
+
+    return element_operator(B, weights, element_dofs(elements, dofs_per_node=2), 2 * len(node_coords))
+
+
+def apply_boundary_conditions_matrix_free(K, F, fixed_dofs, fixed_values):
+    """
+    Applies Dirichlet boundary conditions to a matrix-free operator.
+
+    The fixed rows and columns of the operator are replaced by the identity and the known values are moved
+    to the right-hand side, matching the assembled boundary condition functions.
+
+    Parameters:
+    K (sp.sparse.linalg.LinearOperator): Global operator.
+    F (np.ndarray): Right-hand side vector.
+    fixed_dofs (list of int): List of fixed degrees of freedom.
+    fixed_values (list of float): Values of the fixed degrees of freedom.
+
+    Returns:
+    sp.sparse.linalg.LinearOperator, np.ndarray: Constrained operator and right-hand side vector.
+    """
+    fixed_dofs = np.asarray(fixed_dofs, dtype=int)
+    free = np.ones(K.shape[0])
+    free[fixed_dofs] = 0
+
+    values = np.zeros(K.shape[0])
+    values[fixed_dofs] = fixed_values
+    F = np.asarray(F, dtype=float) - K @ values
+    F[fixed_dofs] = values[fixed_dofs]
+
+    def matvec(x):
+        x = np.asarray(x).reshape(-1)
+        return free * (K @ (free * x)) + (1 - free) * x
+
+    return sp.sparse.linalg.LinearOperator(K.shape, matvec=matvec, rmatvec=matvec, dtype=float), F
+
+
+if __name__ == '__main__':
+    from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 20, 20)
+    x = np.random.rand(len(node_coords))
+
+    K_operator = conductivity_operator(elements, node_coords, 1.0)
+    K_global = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    print("Difference from the assembled matrix:", np.abs(K_operator @ x - K_global @ x).max())
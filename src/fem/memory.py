@@ -0,0 +1,282 @@
+import os
+import warnings
+
+import numpy as np
+
+# Memory budget in bytes shared by the assemblers and solvers. None means half of the physical memory.
+MEMORY_BUDGET = None
+
+# Iterative methods whose memory is dominated by a few work vectors
+KRYLOV_METHODS = ('cg', 'bicg', 'bicgstab', 'gmres', 'minres', 'lsqr')
+
+
+def available_memory():
+    """
+    Returns the physical memory of the machine in bytes, or None where it cannot be determined.
+    """
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def format_bytes(size):
+    """
+    Formats a number of bytes for messages, e.g. '1.5 GB'.
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def set_memory_budget(memory_budget):
+    """
+    Sets the memory budget used when a function is not given its own.
+
+    Parameters:
+    memory_budget (float or None): Budget in bytes, or None for half of the physical memory.
+    """
+    global MEMORY_BUDGET
+    MEMORY_BUDGET = memory_budget
+
+
+def get_memory_budget(memory_budget=None):
+    """
+    Resolves the memory budget: the given value, else the configured one, else half of the physical memory.
+
+    Parameters:
+    memory_budget (float, optional): Budget in bytes passed by the caller.
+
+    Returns:
+    float: Budget in bytes, infinite if the physical memory is unknown.
+    """
+    if memory_budget is not None:
+        return memory_budget
+    if MEMORY_BUDGET is not None:
+        return MEMORY_BUDGET
+    memory = available_memory()
+    return np.inf if memory is None else memory / 2
+
+
+def estimate_matrix_nnz(num_nodes, num_elements, dofs_per_node=1):
+    """
+    Estimates the number of nonzeros of a global matrix on a triangular mesh.
+
+    Every node couples to itself and its edge neighbours, and a planar triangulation has about
+    num_nodes + num_elements edges.
+
+    Parameters:
+    num_nodes (int): Number of nodes.
+    num_elements (int): Number of elements.
+    dofs_per_node (int): Number of degrees of freedom per node.
+
+    Returns:
+    int: Estimated number of nonzeros.
+    """
+    return dofs_per_node ** 2 * (3 * num_nodes + 2 * num_elements)
+
+
+def estimate_factor_nnz(n_dofs, nnz):
+    """
+    Estimates the number of nonzeros in the sparse LU factors of a 2D FEM matrix.
+
+    With a fill-reducing ordering the factors of 2D meshes grow like n log n. The constant is an upper bound
+    measured on the Laplacian and elasticity systems of the benchmark matrices.
+
+    Parameters:
+    n_dofs (int): Number of degrees of freedom.
+    nnz (int): Number of nonzeros of the matrix.
+
+    Returns:
+    float: Estimated number of nonzeros of L and U together.
+    """
+    return 1.5 * nnz * max(np.log2(n_dofs), 1.0)
+
+
+def estimate_assembly_memory(num_nodes, num_elements, dofs_per_node=1, strategy='sparse', itemsize=8):
+    """
+    Estimates the peak memory of assembling a global matrix.
+
+    Parameters:
+    num_nodes (int): Number of nodes.
+    num_elements (int): Number of elements.
+    dofs_per_node (int): Number of degrees of freedom per node (1 for heat transfer, 2 for elasticity and mass).
+    strategy (str): 'dense', 'sparse' or 'matrix_free'.
+    itemsize (int): Bytes per matrix entry, 8 for double and 4 for single precision.
+
+    Returns:
+    float: Estimated peak memory in bytes.
+    """
+    n_dofs = dofs_per_node * num_nodes
+    m = 3 * dofs_per_node
+    entries = float(num_elements) * m * m
+
+    if strategy == 'matrix_free':
+        # Cached B matrices, element weights and the element degrees of freedom
+        rows = 3 if dofs_per_node == 2 else 2
+        return 8.0 * num_elements * (rows * m + rows * rows + m)
+
+    # Double precision element matrices with their COO row and column indices
+    element_bytes = entries * (8 + 8 + 8 + itemsize)
+    if strategy == 'dense':
+        return element_bytes + itemsize * float(n_dofs) ** 2
+    if strategy == 'sparse':
+        # Conversion to CSR sorts the duplicate entries before they are summed
+        nnz = estimate_matrix_nnz(num_nodes, num_elements, dofs_per_node)
+        return element_bytes + entries * (itemsize + 8) + nnz * (itemsize + 4)
+    raise ValueError(f"Unknown assembly strategy: {strategy}")
+
+
+def estimate_solve_memory(n_dofs, nnz, solver_method, itemsize=8):
+    """
+    Estimates the memory a solver method allocates on top of the assembled system.
+
+    Parameters:
+    n_dofs (int): Number of degrees of freedom.
+    nnz (int): Number of nonzeros of the matrix.
+    solver_method (str): Solver method, see solve_linear_system.
+    itemsize (int): Bytes per matrix entry.
+
+    Returns:
+    float: Estimated memory in bytes.
+    """
+    vectors = 8.0 * n_dofs
+    if solver_method == 'solve':
+        # The dense matrix and the copy LAPACK factors
+        return 2.0 * itemsize * float(n_dofs) ** 2
+    if solver_method in ('spsolve', 'schur'):
+        return (estimate_factor_nnz(n_dofs, nnz) + nnz) * (itemsize + 4) + 10 * vectors
+    if solver_method in ('pcg', 'pbicgstab'):
+        # Incomplete factors are limited to ten times the nonzeros of the matrix
+        return 10.0 * nnz * (itemsize + 4) + 10 * vectors
+    if solver_method in ('amg', 'multigrid'):
+        return 2.0 * nnz * (itemsize + 4) + 10 * vectors
+    if solver_method in KRYLOV_METHODS:
+        # GMRES keeps its restart basis of 20 vectors
+        return 25 * vectors
+    raise ValueError(f"Unknown solver method: {solver_method}")
+
+
+def estimate_fem_memory(num_nodes, num_elements, dofs_per_node=1, assembly='sparse', solver_method='spsolve'):
+    """
+    Estimates the memory of a whole FEM solve for capacity planning.
+
+    Parameters:
+    num_nodes (int): Number of nodes.
+    num_elements (int): Number of elements.
+    dofs_per_node (int): Number of degrees of freedom per node.
+    assembly (str): 'dense', 'sparse' or 'matrix_free'.
+    solver_method (str): Solver method, see solve_linear_system.
+
+    Returns:
+    dict: Estimated bytes of the 'assembly', the assembled 'matrix', the 'solve' and the overall 'peak'.
+    """
+    n_dofs = dofs_per_node * num_nodes
+    nnz = estimate_matrix_nnz(num_nodes, num_elements, dofs_per_node)
+    if assembly == 'dense':
+        matrix = 8.0 * n_dofs ** 2
+    elif assembly == 'sparse':
+        matrix = 12.0 * nnz
+    else:
+        matrix = estimate_assembly_memory(num_nodes, num_elements, dofs_per_node, 'matrix_free')
+
+    assembly_bytes = estimate_assembly_memory(num_nodes, num_elements, dofs_per_node, assembly)
+    solve_bytes = estimate_solve_memory(n_dofs, nnz, solver_method)
+    return {
+        'assembly': assembly_bytes,
+        'matrix': matrix,
+        'solve': solve_bytes,
+        'peak': max(assembly_bytes, matrix + solve_bytes),
+    }
+
+
+def check_memory(required, memory_budget, description):
+    """
+    Raises a MemoryError if an operation is estimated to exceed the memory budget.
+
+    Parameters:
+    required (float): Estimated bytes.
+    memory_budget (float, optional): Budget in bytes, see get_memory_budget.
+    description (str): What needs the memory, for the error message.
+    """
+    memory_budget = get_memory_budget(memory_budget)
+    if required > memory_budget:
+        raise MemoryError(f"{description} needs an estimated {format_bytes(required)}, more than the memory "
+                          f"budget of {format_bytes(memory_budget)}. Use a smaller mesh, a sparse or matrix-free "
+                          f"formulation, or raise the budget with set_memory_budget.")
+
+
+def choose_assembly_format(num_nodes, num_elements, dofs_per_node, sparse, itemsize=8, memory_budget=None):
+    """
+    Checks an assembly against the memory budget before anything is allocated.
+
+    A dense assembly that does not fit is switched to sparse with a warning. A sparse assembly that does not fit
+    raises a MemoryError.
+
+    Parameters:
+    num_nodes (int): Number of nodes.
+    num_elements (int): Number of elements.
+    dofs_per_node (int): Number of degrees of freedom per node.
+    sparse (bool): Whether a sparse matrix was requested.
+    itemsize (int): Bytes per matrix entry.
+    memory_budget (float, optional): Budget in bytes, see get_memory_budget.
+
+    Returns:
+    bool: Whether to assemble a sparse matrix.
+    """
+    memory_budget = get_memory_budget(memory_budget)
+    if not sparse:
+        dense = estimate_assembly_memory(num_nodes, num_elements, dofs_per_node, 'dense', itemsize)
+        if dense <= memory_budget:
+            return False
+        n_dofs = dofs_per_node * num_nodes
+        warnings.warn(f"A dense {n_dofs} x {n_dofs} matrix needs an estimated {format_bytes(dense)}, more than the "
+                      f"memory budget of {format_bytes(memory_budget)}. Assembling a sparse matrix instead.")
+
+    check_memory(estimate_assembly_memory(num_nodes, num_elements, dofs_per_node, 'sparse', itemsize),
+                 memory_budget, "Sparse assembly")
+    return True
+
+
+def choose_matrix_free(num_nodes, num_elements, dofs_per_node, solver_method, memory_budget=None):
+    """
+    Decides whether an assembled solve fits the memory budget or has to run matrix-free.
+
+    Parameters:
+    num_nodes (int): Number of nodes.
+    num_elements (int): Number of elements.
+    dofs_per_node (int): Number of degrees of freedom per node.
+    solver_method (str): Requested solver method. Only 'auto' and the Krylov methods can run matrix-free.
+    memory_budget (float, optional): Budget in bytes, see get_memory_budget.
+
+    Returns:
+    bool: Whether to solve matrix-free.
+    """
+    memory_budget = get_memory_budget(memory_budget)
+    # 'auto' falls back to iterative methods, so its cheapest assembled option is a Krylov solve
+    assembled_method = 'cg' if solver_method == 'auto' else solver_method
+    if assembled_method not in KRYLOV_METHODS + ('spsolve', 'pcg', 'pbicgstab', 'amg', 'multigrid', 'schur'):
+        return False
+
+    assembled = estimate_fem_memory(num_nodes, num_elements, dofs_per_node, 'sparse', assembled_method)['peak']
+    if assembled <= memory_budget:
+        return False
+
+    if assembled_method not in KRYLOV_METHODS:
+        check_memory(assembled, memory_budget, f"Sparse assembly and the '{solver_method}' solve")
+    check_memory(estimate_fem_memory(num_nodes, num_elements, dofs_per_node, 'matrix_free', 'cg')['peak'],
+                 memory_budget, "Matrix-free solve")
+    warnings.warn(f"The assembled system needs an estimated {format_bytes(assembled)}, more than the memory budget "
+                  f"of {format_bytes(memory_budget)}. Solving matrix-free instead.")
+    return True
+
+
+if __name__ == '__main__':
+    # Capacity planning for a 50k node elasticity mesh
+    num_nodes, num_elements = 50000, 100000
+    for assembly, solver_method in [('dense', 'solve'), ('sparse', 'spsolve'), ('sparse', 'pcg'),
+                                    ('matrix_free', 'cg')]:
+        estimate = estimate_fem_memory(num_nodes, num_elements, 2, assembly, solver_method)
+        print(f"{assembly}, {solver_method}: peak {format_bytes(estimate['peak'])}")
@@ -1,7 +1,28 @@
 import numpy as np
-import scipy.spatial
-from matplotlib import pyplot as plt
-from matplotlib.path import Path
+
+# Plotting helpers that used to live here. They are loaded from src.fem.plotting on first access, so generating
+# a mesh does not import matplotlib.
+_PLOTTING_NAMES = {'LABEL_LIMIT', 'MAX_PLOT_EDGES', 'create_figure', 'show_or_save_figure', 'plot_mesh_edges',
+                   'plot_mesh', 'plot_elements'}
+
+# Edges are keyed by smaller_node * EDGE_KEY_BASE + larger_node
+EDGE_KEY_BASE = 2 ** 32
+
+
+def __getattr__(name):
+    if name in _PLOTTING_NAMES:
+        from src.fem import plotting
+        return getattr(plotting, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _delaunay(points):
+    """
+    Triangulates points. scipy.spatial is imported here because only the random meshers need it and it adds
+    a fifth of a second to the import of this module.
+    """
+    from scipy.spatial import Delaunay
+    return Delaunay(points)
 
 
 def create_regular_triangular_mesh_in_rectangle(x_min, x_max, y_min, y_max, nx, ny):
@@ -60,7 +81,7 @@ def create_random_triangular_mesh_in_rectangle(x_min, x_max, y_min, y_max, num_p
     points[:, 1] = points[:, 1] * (y_max - y_min) + y_min
 
     # Creating Delaunay triangulation
-    tri = scipy.spatial.Delaunay(points)
+    tri = _delaunay(points)
 
     # Mesh nodes are the coordinates of the points
     nodes = points
@@ -71,20 +92,24 @@ def create_random_triangular_mesh_in_rectangle(x_min, x_max, y_min, y_max, num_p
     return nodes, elements
 
 
-def create_random_triangular_mesh_in_polygon(vertices, num_points):
+def create_random_triangular_mesh_in_polygon(vertices, num_points, seed=None):
     """
     Creates a triangular mesh using Delaunay triangulation in the area bounded by a given polygon
 
     Parameters:
     vertices (list of tuple of float): The coordinates of the polygon's vertices.
     num_points (int): The number of random points inside the polygon.
+    seed (int, optional): Seed for the random number generator. Defaults to None.
 
     Returns:
     tuple: The mesh nodes and elements.
     """
+    if seed is not None:
+        np.random.seed(seed)
+
     # Create a polygon based on vertices
     poly = np.array(vertices)
-    poly_path = scipy.spatial.Delaunay(poly)
+    poly_path = _delaunay(poly)
 
     # Generate random points inside a given polygon
     points = []
@@ -101,14 +126,41 @@ def create_random_triangular_mesh_in_polygon(vertices, num_points):
     points = np.vstack([points, poly])
 
     # Perform triangulation
-    tri = scipy.spatial.Delaunay(points)
+    tri = _delaunay(points)
     nodes = points
     elements = tri.simplices
 
     return nodes, elements
 
 
-def create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_points, refinement_criteria):
+def points_in_polygon(points, vertices):
+    """
+    Tests which points lie inside a polygon with the even-odd rule.
+
+    A horizontal ray from every point crosses the polygon boundary an odd number of times if the point is
+    inside. The loop runs over the polygon edges and is vectorized over the points.
+
+    Parameters:
+    points (np.ndarray): Point coordinates (Px2).
+    vertices (np.ndarray): Polygon vertex coordinates (Mx2), in order around the polygon.
+
+    Returns:
+    np.ndarray: Boolean mask of the points inside the polygon (P).
+    """
+    points = np.asarray(points, dtype=float)
+    vertices = np.asarray(vertices, dtype=float)
+    x, y = points[:, 0], points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        # Edges that straddle the ray height, counting each end point on one side only
+        crosses = (y1 > y) != (y2 > y)
+        if y1 != y2:
+            crosses &= x < x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses
+    return inside
+
+
+def create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_points, refinement_criteria, seed=None):
     """
     Creates an adaptive triangular mesh from a given polygon using Delaunay triangulation and a refinement criterion.
 
@@ -116,10 +168,14 @@ def create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_poi
     polygon_vertices (np.ndarray): Polygon vertex coordinates (Mx2).
     initial_num_points (int): Initial number of random points in the region.
     refinement_criteria (callable): Function to determine whether an element needs to be refined.
+    seed (int, optional): Seed for the random number generator. Defaults to None.
 
     Returns:
     tuple: Grid nodes and elements.
     """
+    if seed is not None:
+        np.random.seed(seed)
+
     # Generate initial random points inside the polygon
     points = np.random.rand(initial_num_points, 2)
     min_x, min_y = polygon_vertices.min(axis=0)
@@ -128,14 +184,13 @@ def create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_poi
     points[:, 1] = points[:, 1] * (max_y - min_y) + min_y
 
     # We leave only those points that are inside the polygon
-    path = Path(polygon_vertices)
-    points = points[path.contains_points(points)]
+    points = points[points_in_polygon(points, polygon_vertices)]
 
     # Adding polygon vertices to points
     points = np.vstack((points, polygon_vertices))
 
     # Performing Delaunay triangulation
-    tri = scipy.spatial.Delaunay(points)
+    tri = _delaunay(points)
 
     def refine(points, simplices):
         new_points = []
@@ -146,7 +201,7 @@ def create_adaptive_triangular_mesh_in_polygon(polygon_vertices, initial_num_poi
                 new_points.append(centroid)
         if new_points:
             points = np.vstack([points, new_points])
-            tri = scipy.spatial.Delaunay(points)
+            tri = _delaunay(points)
             return points, tri.simplices
         else:
             return points, simplices
@@ -201,66 +256,77 @@ def calculate_element_areas(nodes, elements):
     return np.array(areas)
 
 
-def plot_mesh(nodes, elements, title="Mesh Visualization"):
+def mesh_edges(elements):
     """
-    Visualizes a mesh and numbers the nodes.
+    Finds the unique edges of a triangular mesh.
 
     Parameters:
-    nodes (np.ndarray): Node coordinates.
     elements (np.ndarray): Grid elements.
-    title (str): Plot title.
+
+    Returns:
+    np.ndarray: Node indices of every edge (M x 2), smaller index first.
     """
-    plt.figure(figsize=(10, 10))
-    for element in elements:
-        polygon = plt.Polygon(nodes[element], edgecolor='k', facecolor='none')
-        plt.gca().add_patch(polygon)
+    return edge_table(elements)[0]
 
-        # Adding element node numbers
-        for node_index in element:
-            node = nodes[node_index]
-            plt.text(node[0] + 0.01, node[1] + 0.01, str(node_index), fontsize=12,
-                     ha='center', va='center', color='blue',
-                     bbox=dict(facecolor='white', edgecolor='none', pad=1))
 
-    plt.plot(nodes[:, 0], nodes[:, 1], 'ro')  # Узлы
-    plt.title(title)
-    plt.gca().set_aspect('equal', adjustable='box')
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.show()
+def edge_keys(first_nodes, second_nodes):
+    """
+    Returns the integer key of every edge between two arrays of nodes, the same in both directions.
+    """
+    return np.minimum(first_nodes, second_nodes) * EDGE_KEY_BASE + np.maximum(first_nodes, second_nodes)
+
+
+def element_edge_keys(elements):
+    """
+    Returns the key of every local element edge (E x 3), where edge j joins local nodes j and (j + 1) % 3.
+    """
+    elements = np.asarray(elements, dtype=np.int64)
+    return edge_keys(elements, np.roll(elements, -1, axis=1))
 
 
-def plot_elements(nodes, elements, title="Element Visualization"):
+def edge_table(elements):
     """
-    Visualizes mesh elements by connecting points into elements.
+    Numbers the unique edges of a triangular mesh and finds the edges of every element.
+
+    Local edge j of an element joins its local nodes j and (j + 1) % 3. Edges are identified by a single integer
+    key per node pair (see edge_keys), so the table is built with one sort instead of a Python dictionary.
 
     Parameters:
-    nodes (np.ndarray): Node coordinates.
-    elements (np.ndarray): Grid elements.
-    title (str): Plot title.
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    np.ndarray, np.ndarray, np.ndarray: Node indices of every unique edge (M x 2, smaller index first), the edge
+        index of every local element edge (E x 3) and the number of elements sharing every edge (M), 1 on the
+        boundary.
     """
-    plt.figure(figsize=(10, 10))
+    keys = element_edge_keys(elements).ravel()
+    order = np.argsort(keys, kind='stable')
+    first = np.concatenate([[True], keys[order][1:] != keys[order][:-1]])
+    edge_ids = np.empty(len(keys), dtype=np.int64)
+    edge_ids[order] = np.cumsum(first) - 1
 
-    for i, element in enumerate(elements):
-        # Uniting points into elements
-        for j in range(len(element)):
-            start_node = nodes[element[j]]
-            end_node = nodes[element[(j + 1) % len(element)]]
-            plt.plot([start_node[0], end_node[0]], [start_node[1], end_node[1]], 'k-')
+    unique_keys = keys[order[first]]
+    unique_edges = np.stack([unique_keys // EDGE_KEY_BASE, unique_keys % EDGE_KEY_BASE], axis=1)
+    counts = np.bincount(edge_ids, minlength=len(unique_edges))
+    return unique_edges, edge_ids.reshape(-1, 3), counts
 
-        # Find the center of the element and add the ordinal number
-        element_center = np.mean(nodes[element], axis=0)
-        plt.text(element_center[0], element_center[1], str(i), color='blue', fontsize=12, ha='center', va='center')
 
-    plt.plot(nodes[:, 0], nodes[:, 1], 'ro')  # Nodes
-    plt.title(title)
-    plt.gca().set_aspect('equal', adjustable='box')
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.show()
+def boundary_nodes(elements):
+    """
+    Finds the nodes on the boundary of a triangular mesh, i.e. on edges that belong to a single element.
+
+    Parameters:
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    np.ndarray: Sorted indices of the boundary nodes.
+    """
+    edges, _, counts = edge_table(elements)
+    return np.unique(edges[counts == 1])
 
 
 if __name__ == '__main__':
+    from src.fem.plotting import plot_mesh
 
     np.random.seed(4)
 
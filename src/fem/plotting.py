@@ -0,0 +1,150 @@
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from src.fem.mesh import mesh_edges
+
+# Plots number their nodes or elements only up to this count, beyond it the labels cover the mesh
+LABEL_LIMIT = 200
+
+# Edge count above which mesh plots reduce their level of detail
+MAX_PLOT_EDGES = 200000
+
+
+def create_figure(filename, figsize=(10, 10)):
+    """
+    Creates a figure with one axes. Figures rendered to a file use the Agg canvas directly, so they work
+    without a display.
+
+    Parameters:
+    filename (str, optional): Image file the figure will be saved to, or None to show it.
+    figsize (tuple): Figure size in inches.
+
+    Returns:
+    Figure, Axes: The figure and its axes.
+    """
+    if filename is None:
+        # pyplot selects a GUI backend on import, which is only needed to show the figure
+        from matplotlib import pyplot as plt
+        fig = plt.figure(figsize=figsize)
+    else:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def show_or_save_figure(fig, filename):
+    """
+    Saves the figure to a file, or shows it if no file is given.
+
+    Parameters:
+    fig (Figure): Figure from create_figure.
+    filename (str, optional): Image file to save to.
+    """
+    if filename is None:
+        from matplotlib import pyplot as plt
+        plt.show()
+    else:
+        fig.savefig(filename)
+
+
+def plot_mesh_edges(nodes, elements, ax, max_edges=MAX_PLOT_EDGES, **kwargs):
+    """
+    Draws the edges of a mesh in one call, each shared edge once.
+
+    Like triplot, the edges form a single line broken by NaN separators, so matplotlib builds and renders
+    one path instead of an artist per element. Above max_edges the level of detail is reduced: edges shorter
+    than a pixel are dropped first, and a regular subsample of the rest is drawn if that is not enough.
+
+    Parameters:
+    nodes (np.ndarray): Node coordinates.
+    elements (np.ndarray): Grid elements.
+    ax (matplotlib.axes.Axes): Axes to draw on.
+    max_edges (int): Number of edges above which the level of detail is reduced.
+    **kwargs: Line style, e.g. color and linewidth.
+
+    Returns:
+    matplotlib.lines.Line2D: The drawn edges.
+    """
+    edges = mesh_edges(elements)
+    if len(edges) > max_edges:
+        extent = np.ptp(nodes, axis=0).max()
+        pixel = extent / (max(ax.figure.get_size_inches()) * ax.figure.dpi)
+        lengths = np.linalg.norm(nodes[edges[:, 0]] - nodes[edges[:, 1]], axis=1)
+        edges = edges[lengths >= pixel]
+        if len(edges) > max_edges:
+            edges = edges[::int(np.ceil(len(edges) / max_edges))]
+
+    # Every edge contributes its two end points and a NaN break
+    segments = np.full((len(edges), 3, 2), np.nan)
+    segments[:, :2] = nodes[edges]
+    segments = segments.reshape(-1, 2)
+    return ax.plot(segments[:, 0], segments[:, 1], **kwargs)[0]
+
+
+def plot_mesh(nodes, elements, title="Mesh Visualization", filename=None, label_limit=LABEL_LIMIT,
+              max_edges=MAX_PLOT_EDGES):
+    """
+    Visualizes a mesh and numbers the nodes.
+
+    Parameters:
+    nodes (np.ndarray): Node coordinates.
+    elements (np.ndarray): Grid elements.
+    title (str): Plot title.
+    filename (str, optional): Image file to render to without a display. The plot is shown if None.
+    label_limit (int): Node numbers are only drawn for meshes with at most this many nodes.
+    max_edges (int): Number of edges above which the level of detail is reduced.
+    """
+    nodes = np.asarray(nodes)
+    fig, ax = create_figure(filename)
+    plot_mesh_edges(nodes, elements, ax, max_edges, color='k', linewidth=0.5)
+
+    # Adding node numbers
+    if len(nodes) <= label_limit:
+        for node_index, node in enumerate(nodes):
+            ax.text(node[0] + 0.01, node[1] + 0.01, str(node_index), fontsize=12,
+                    ha='center', va='center', color='blue',
+                    bbox=dict(facecolor='white', edgecolor='none', pad=1))
+
+    if len(nodes) <= max_edges:
+        ax.plot(nodes[:, 0], nodes[:, 1], 'ro', markersize=6 if len(nodes) <= label_limit else 1)  # Узлы
+    ax.set_title(title)
+    ax.set_aspect('equal', adjustable='box')
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    show_or_save_figure(fig, filename)
+
+
+def plot_elements(nodes, elements, title="Element Visualization", filename=None, label_limit=LABEL_LIMIT,
+                  max_edges=MAX_PLOT_EDGES):
+    """
+    Visualizes mesh elements by connecting points into elements.
+
+    Parameters:
+    nodes (np.ndarray): Node coordinates.
+    elements (np.ndarray): Grid elements.
+    title (str): Plot title.
+    filename (str, optional): Image file to render to without a display. The plot is shown if None.
+    label_limit (int): Element numbers are only drawn for meshes with at most this many elements.
+    max_edges (int): Number of edges above which the level of detail is reduced.
+    """
+    nodes = np.asarray(nodes)
+    elements = np.asarray(elements)
+    fig, ax = create_figure(filename)
+
+    # Uniting points into elements
+    plot_mesh_edges(nodes, elements, ax, max_edges, color='k', linewidth=1)
+
+    # Find the centers of the elements and add the ordinal numbers
+    if len(elements) <= label_limit:
+        for i, element_center in enumerate(nodes[elements].mean(axis=1)):
+            ax.text(element_center[0], element_center[1], str(i), color='blue', fontsize=12, ha='center',
+                    va='center')
+
+    if len(nodes) <= max_edges:
+        ax.plot(nodes[:, 0], nodes[:, 1], 'ro', markersize=6 if len(elements) <= label_limit else 1)  # Nodes
+    ax.set_title(title)
+    ax.set_aspect('equal', adjustable='box')
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    show_or_save_figure(fig, filename)
@@ -0,0 +1,260 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.conductivity_matrix import element_gradient_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.stifness.stiffness_matrix import constitutive_matrices
+
+
+def nodal_averaging_matrix(num_nodes, elements, areas):
+    """
+    Builds the sparse matrix that averages element values onto the nodes, weighting every element by its area.
+
+    Parameters:
+    num_nodes (int): Number of nodes.
+    elements (np.ndarray): Grid elements (Ex3).
+    areas (np.ndarray): Element areas (E).
+
+    Returns:
+    sp.sparse.csc_matrix: Averaging matrix (N x E) whose rows sum to 1 for every node of the mesh.
+    """
+    nodes = np.asarray(elements).ravel()
+    weights = np.repeat(np.asarray(areas, dtype=float), 3)
+    total = np.bincount(nodes, weights, minlength=num_nodes)
+    total[total == 0] = 1
+
+    # Every column holds the three nodes of one element, so the compressed columns are built without sorting.
+    # Indices of the dtype scipy would pick anyway save it a checked conversion of the whole array.
+    index_dtype = np.int32 if max(num_nodes, len(nodes) + 1) < 2 ** 31 else np.int64
+    return sp.sparse.csc_matrix((weights / total[nodes], nodes.astype(index_dtype),
+                                 np.arange(0, len(nodes) + 1, 3, dtype=index_dtype)),
+                                shape=(num_nodes, len(nodes) // 3))
+
+
+def element_gradients(node_coords, elements, values, B=None):
+    """
+    Calculates the constant gradient of a linear field on every element.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+    values (np.ndarray): Nodal values of the field (N).
+    B (np.ndarray, optional): Gradient matrices of the elements (Ex2x3), see element_gradient_matrices.
+        Calculated if None.
+
+    Returns:
+    np.ndarray: Element gradients (Ex2).
+    """
+    elements = np.asarray(elements)
+    if B is None:
+        _, B = element_gradient_matrices(np.asarray(node_coords)[elements])
+    return (B @ np.asarray(values)[elements][:, :, np.newaxis])[:, :, 0]
+
+
+def nodal_average(node_coords, elements, element_values, areas=None):
+    """
+    Averages element values onto the nodes, weighting every element by its area.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+    element_values (np.ndarray): One value or vector per element (E or ExD).
+    areas (np.ndarray, optional): Element areas (E), calculated if None.
+
+    Returns:
+    np.ndarray: Averaged nodal values (N or NxD).
+    """
+    elements = np.asarray(elements)
+    if areas is None:
+        areas, _ = element_gradient_matrices(np.asarray(node_coords)[elements])
+    return nodal_averaging_matrix(len(node_coords), elements, areas) @ element_values
+
+
+def von_mises_stress(stresses, nu=None, plane='stress'):
+    """
+    Calculates the von Mises equivalent stress from in-plane stresses.
+
+    Parameters:
+    stresses (np.ndarray): Stresses [sigma_xx, sigma_yy, tau_xy] (...x3).
+    nu (float or np.ndarray, optional): Poisson's ratio, needed for the out-of-plane stress of plane strain.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    np.ndarray: Von Mises stress (...).
+    """
+    sxx, syy, txy = np.moveaxis(np.asarray(stresses), -1, 0)
+    if plane == 'stress':
+        szz = 0.0
+    elif plane == 'strain':
+        if nu is None:
+            raise ValueError("Plane strain von Mises stress requires Poisson's ratio")
+        szz = np.asarray(nu) * (sxx + syy)
+    else:
+        raise ValueError(f"Unknown plane state: {plane}")
+    return np.sqrt(0.5 * ((sxx - syy) ** 2 + (syy - szz) ** 2 + (szz - sxx) ** 2) + 3 * txy ** 2)
+
+
+class PostProcessor:
+    """
+    Derives element and nodal fields from the solutions on one mesh.
+
+    The element areas, gradient matrices and the nodal averaging matrix are computed once and reused for every
+    field and every solution, so each field is a single batched product over all elements and each nodal average
+    a single sparse product.
+
+    Example:
+        post = PostProcessor(node_coords, elements)
+        flux = post.heat_flux(temperatures, k)
+        nodal_von_mises = post.nodal_average(post.von_mises(displacements, E, nu))
+    """
+
+    def __init__(self, node_coords, elements):
+        """
+        Parameters:
+        node_coords (np.ndarray): Node coordinates (Nx2).
+        elements (list of list of int): List of elements, each specified as a list of node indices.
+        """
+        self.node_coords = np.asarray(node_coords, dtype=float)
+        self.elements = np.asarray(elements)
+        self.areas, self.B = element_gradient_matrices(self.node_coords[self.elements])
+        # Contiguous copies of the element node columns and of the shape function derivatives (2x3xE), so every
+        # field is a few passes over contiguous arrays instead of a batch of tiny matrix products
+        self._nodes = np.ascontiguousarray(self.elements.T)
+        self._derivatives = np.ascontiguousarray(self.B.transpose(1, 2, 0))
+        self.averaging_matrix = nodal_averaging_matrix(len(self.node_coords), self.elements, self.areas)
+
+    def gradients(self, values):
+        """
+        Calculates the gradients of a nodal field on every element.
+
+        Parameters:
+        values (np.ndarray): Nodal values (N).
+
+        Returns:
+        np.ndarray: Element gradients (Ex2).
+        """
+        return np.stack(self._gradient_components(values), axis=1)
+
+    def _gradient_components(self, values):
+        """
+        Returns the x and y derivatives of a nodal field on every element (E each).
+        """
+        values = np.asarray(values)
+        dx = dy = 0.0
+        for i in range(3):
+            local_values = values[self._nodes[i]]
+            dx = dx + self._derivatives[0, i] * local_values
+            dy = dy + self._derivatives[1, i] * local_values
+        return dx, dy
+
+    def heat_flux(self, temperatures, k=1.0):
+        """
+        Calculates the heat flux q = -k grad T on every element.
+
+        Parameters:
+        temperatures (np.ndarray): Vector of temperatures (N).
+        k (float, np.ndarray or callable): Thermal conductivity, a scalar, one value per element or a function of
+            the element centroids.
+
+        Returns:
+        np.ndarray: Element heat fluxes (Ex2).
+        """
+        k = np.asarray(evaluate_element_field(k, self.node_coords, self.elements))
+        dx, dy = self._gradient_components(temperatures)
+        return np.stack([-k * dx, -k * dy], axis=1)
+
+    def strains(self, displacements):
+        """
+        Calculates the strains on every element.
+
+        Parameters:
+        displacements (np.ndarray): Displacement vector (2N), x and y interleaved per node.
+
+        Returns:
+        np.ndarray: Element strains [epsilon_xx, epsilon_yy, gamma_xy] (Ex3).
+        """
+        displacements = np.asarray(displacements)
+        dux_dx, dux_dy = self._gradient_components(np.ascontiguousarray(displacements[0::2]))
+        duy_dx, duy_dy = self._gradient_components(np.ascontiguousarray(displacements[1::2]))
+        return np.stack([dux_dx, duy_dy, dux_dy + duy_dx], axis=1)
+
+    def stresses(self, displacements, E, nu, plane='stress'):
+        """
+        Calculates the stresses on every element.
+
+        Parameters:
+        displacements (np.ndarray): Displacement vector (2N).
+        E (float, np.ndarray or callable): Young's modulus, a scalar, one value per element or a function of the
+            element centroids.
+        nu (float, np.ndarray or callable): Poisson's ratio, given the same way as E.
+        plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+        Returns:
+        np.ndarray: Element stresses [sigma_xx, sigma_yy, tau_xy] (Ex3).
+        """
+        D = constitutive_matrices(evaluate_element_field(E, self.node_coords, self.elements),
+                                  evaluate_element_field(nu, self.node_coords, self.elements), plane)
+        strains = self.strains(displacements)
+        if D.ndim == 2:
+            return strains @ D.T
+        return np.einsum('eij,ej->ei', D, strains)
+
+    def von_mises(self, displacements, E, nu, plane='stress'):
+        """
+        Calculates the von Mises stress on every element.
+
+        Parameters:
+        displacements (np.ndarray): Displacement vector (2N).
+        E (float, np.ndarray or callable): Young's modulus, see stresses.
+        nu (float, np.ndarray or callable): Poisson's ratio, see stresses.
+        plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+        Returns:
+        np.ndarray: Element von Mises stresses (E).
+        """
+        stresses = self.stresses(displacements, E, nu, plane)
+        return von_mises_stress(stresses, evaluate_element_field(nu, self.node_coords, self.elements), plane)
+
+    def nodal_average(self, element_values):
+        """
+        Averages element values onto the nodes, weighting every element by its area.
+
+        Parameters:
+        element_values (np.ndarray): One value or vector per element (E or ExD).
+
+        Returns:
+        np.ndarray: Averaged nodal values (N or NxD).
+        """
+        return self.averaging_matrix @ element_values
+
+
+if __name__ == '__main__':
+    import time
+
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 708, 708)
+    x, y = node_coords.T
+
+    # Linear fields have exact element gradients and strains
+    temperatures = 3 * x - 2 * y
+    displacements = np.column_stack([1e-3 * x, -3e-4 * y]).ravel()
+
+    start_time = time.perf_counter()
+    post = PostProcessor(node_coords, elements)
+    setup_time = time.perf_counter() - start_time
+
+    def timed(name, compute, *args):
+        start_time = time.perf_counter()
+        result = compute(*args)
+        print(f"{name}: {time.perf_counter() - start_time:.3f} s")
+        return result
+
+    print(f"{len(elements)} elements, setup {setup_time:.3f} s")
+    flux = timed("Heat flux", post.heat_flux, temperatures, 2.0)
+    stresses = timed("Stresses", post.stresses, displacements, 210e9, 0.3)
+    von_mises = timed("Von Mises stress", post.von_mises, displacements, 210e9, 0.3)
+    nodal_flux = timed("Nodal heat flux", post.nodal_average, flux)
+    nodal_von_mises = timed("Nodal von Mises stress", post.nodal_average, von_mises)
+    print("Heat flux:", flux[0], "nodal:", nodal_flux[len(node_coords) // 2])
+    print("Stresses:", stresses[0], "von Mises:", von_mises[0], "nodal:", nodal_von_mises[0])
@@ -0,0 +1,156 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def _peak_rss():
+    """
+    Returns the peak resident set size over the lifetime of the process in bytes, or None where it is not
+    available.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux and the BSDs
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+
+class Profiler:
+    """
+    Collects named spans of a FEM pipeline with their wall time, CPU time, peak RSS and traced allocations,
+    together with solver metrics such as nnz, iteration counts and residuals.
+
+    The peak RSS is a high-water mark of the whole process: 'process_peak_rss' is its value at the end of a span,
+    and 'peak_rss_growth' how far the span raised it, which is zero for spans that stay below an earlier peak.
+    The traced 'peak_allocated_bytes' are the per-span peak of the Python and NumPy allocations.
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory=True):
+        """
+        Parameters:
+        trace_memory (bool): Whether to measure allocations with tracemalloc. Tracing slows allocations down,
+            so it can be switched off when only timings are needed.
+        """
+        self.trace_memory = trace_memory
+        self.spans = []
+        self.metrics = {}
+        self._stack = []
+
+    @contextmanager
+    def span(self, name):
+        """
+        Measures the enclosed block as a named span. Spans can be nested.
+
+        Parameters:
+        name (str): Span name, e.g. 'mesh', 'assembly', 'boundary_conditions', 'solve' or 'post_processing'.
+        """
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+
+        record = {'name': name, 'depth': len(self._stack)}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_start'] = current
+            record['_peak'] = current
+
+        rss_start = _peak_rss()
+        self._stack.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = time.perf_counter() - wall_start
+            record['cpu_time'] = time.process_time() - cpu_start
+            record['process_peak_rss'] = _peak_rss()
+            record['peak_rss_growth'] = None if rss_start is None else record['process_peak_rss'] - rss_start
+            self._stack.pop()
+
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(record.pop('_peak'), peak)
+                start = record.pop('_start')
+                record['allocated_bytes'] = current - start
+                record['peak_allocated_bytes'] = peak - start
+                if self._stack:
+                    self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+            if started_tracing:
+                tracemalloc.stop()
+
+            self.spans.append(record)
+
+    def record(self, **metrics):
+        """
+        Attaches metrics to the innermost open span, or to the whole run outside of any span.
+        """
+        target = self._stack[-1] if self._stack else self.metrics
+        target.update(metrics)
+
+    def to_dict(self):
+        """
+        Returns the collected spans and metrics as a structured record.
+        """
+        return {'spans': list(self.spans), 'metrics': dict(self.metrics)}
+
+    def to_json(self, path=None):
+        """
+        Exports the collected spans and metrics as JSON.
+
+        Parameters:
+        path (str, optional): File to write the JSON to.
+
+        Returns:
+        str: JSON document.
+        """
+        document = json.dumps(self.to_dict(), indent=2, default=float)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(document)
+        return document
+
+
+class NullProfiler:
+    """
+    Profiler stand-in that records nothing, so instrumented code costs almost nothing when profiling is off.
+    """
+
+    enabled = False
+
+    def span(self, name):
+        return nullcontext()
+
+    def record(self, **metrics):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def get_profiler(profiler):
+    """
+    Returns the given profiler, or the shared no-op profiler if it is None.
+    """
+    return NULL_PROFILER if profiler is None else profiler
+
+
+if __name__ == '__main__':
+    import numpy as np
+
+    profiler = Profiler()
+    with profiler.span('allocation'):
+        data = np.ones(10 ** 6)
+        profiler.record(size=data.size)
+    print(profiler.to_json())
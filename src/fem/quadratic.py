@@ -0,0 +1,527 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.assembly import element_dofs, scatter_element_matrices
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import element_gradient_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.memory import choose_assembly_format
+from src.fem.mesh import boundary_nodes, edge_table
+from src.fem.solvers import solve_linear_system
+from src.fem.stifness.stiffness_matrix import constitutive_matrices
+
+# Degree 4 quadrature rule on the triangle (Dunavant): barycentric coordinates of the points and weights summing
+# to 1, exact for the products of quadratic shape functions in the mass matrix
+QUADRATURE_POINTS = np.array([
+    [0.108103018168070, 0.445948490915965, 0.445948490915965],
+    [0.445948490915965, 0.108103018168070, 0.445948490915965],
+    [0.445948490915965, 0.445948490915965, 0.108103018168070],
+    [0.816847572980459, 0.091576213509771, 0.091576213509771],
+    [0.091576213509771, 0.816847572980459, 0.091576213509771],
+    [0.091576213509771, 0.091576213509771, 0.816847572980459],
+])
+QUADRATURE_WEIGHTS = np.array([0.223381589678011] * 3 + [0.109951743655322] * 3)
+
+# Local nodes of the quadratic triangle: the vertices, then the midpoints of the edges 0-1, 1-2 and 2-0
+MIDPOINT_VERTICES = np.array([[0, 1], [1, 2], [2, 0]])
+# Linear triangles of the local nodes that split a quadratic triangle into four
+LINEAR_SUBTRIANGLES = np.array([[0, 3, 5], [3, 1, 4], [5, 4, 2], [3, 4, 5]])
+
+
+def quadratic_shape_functions(barycentric):
+    """
+    Evaluates the shape functions of the 6-node triangle.
+
+    Parameters:
+    barycentric (np.ndarray): Barycentric coordinates of the points (P x 3).
+
+    Returns:
+    np.ndarray: Shape function values (P x 6), vertices first, then the edge midpoints.
+    """
+    L = np.asarray(barycentric, dtype=float)
+    return np.hstack([L * (2 * L - 1), 4 * L[:, MIDPOINT_VERTICES[:, 0]] * L[:, MIDPOINT_VERTICES[:, 1]]])
+
+
+def quadratic_shape_derivatives(barycentric):
+    """
+    Evaluates the derivatives of the shape functions of the 6-node triangle with respect to the barycentric
+    coordinates.
+
+    Parameters:
+    barycentric (np.ndarray): Barycentric coordinates of the points (P x 3).
+
+    Returns:
+    np.ndarray: Derivatives dN_i/dL_a (P x 3 x 6).
+    """
+    L = np.asarray(barycentric, dtype=float)
+    derivatives = np.zeros((len(L), 3, 6))
+    vertices = np.arange(3)
+    derivatives[:, vertices, vertices] = 4 * L - 1
+    midpoints = 3 + vertices
+    derivatives[:, MIDPOINT_VERTICES[:, 0], midpoints] = 4 * L[:, MIDPOINT_VERTICES[:, 1]]
+    derivatives[:, MIDPOINT_VERTICES[:, 1], midpoints] = 4 * L[:, MIDPOINT_VERTICES[:, 0]]
+    return derivatives
+
+
+def _reference_tensors():
+    """
+    Integrates the shape function products over the reference triangle of unit area.
+
+    Both element matrices are constant tensors of the reference element contracted with element geometry: the
+    gradient products dN_i/dL_a dN_j/dL_b for the conductivity and stiffness (3 x 3 x 6 x 6), and N_i N_j for the
+    mass (6 x 6).
+    """
+    N = quadratic_shape_functions(QUADRATURE_POINTS)
+    dN = quadratic_shape_derivatives(QUADRATURE_POINTS)
+    gradient_products = np.einsum('q,qai,qbj->abij', QUADRATURE_WEIGHTS, dN, dN)
+    mass = np.einsum('q,qi,qj->ij', QUADRATURE_WEIGHTS, N, N)
+    return gradient_products, mass
+
+
+GRADIENT_PRODUCTS, REFERENCE_MASS = _reference_tensors()
+
+
+def quadratic_mesh(node_coords, elements):
+    """
+    Converts a linear triangular mesh into a mesh of 6-node quadratic triangles.
+
+    Every unique edge of the mesh gets one midpoint node, numbered after the vertices in the order of the edge
+    table, so neighbouring elements share their midpoints.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    np.ndarray, np.ndarray, np.ndarray: Node coordinates of the vertices and midpoints (N + M x 2), quadratic
+        elements (E x 6) and the two vertices of every midpoint (M x 2).
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+    edges, element_edges, _ = edge_table(elements)
+    midpoints = node_coords[edges].mean(axis=1)
+    return (np.vstack([node_coords, midpoints]), np.hstack([elements, len(node_coords) + element_edges]),
+            edges)
+
+
+def quadratic_boundary_nodes(elements):
+    """
+    Finds the vertices and midpoints on the boundary of a quadratic mesh.
+
+    Parameters:
+    elements (np.ndarray): Quadratic elements (E x 6).
+
+    Returns:
+    np.ndarray: Sorted indices of the boundary nodes.
+    """
+    return boundary_nodes(np.asarray(elements)[:, LINEAR_SUBTRIANGLES].reshape(-1, 3))
+
+
+def quadratic_conductivity_matrices(k, coords):
+    """
+    Calculates the conductivity matrices of a batch of straight-sided quadratic triangles.
+
+    With the constant gradients of the barycentric coordinates B, the matrix is k A sum_ab (B^T B)_ab T_ab with
+    the integrated gradient products T of the reference element, so every element costs one small product.
+
+    Parameters:
+    k (float or np.ndarray): Thermal conductivity, a scalar or one value per element (E).
+    coords (np.ndarray): Element node coordinates (E x 6 x 2), only the vertices are used.
+
+    Returns:
+    np.ndarray: Elemental conductivity matrices (E x 6 x 6).
+    """
+    A, B = element_gradient_matrices(np.asarray(coords)[:, :3])
+    metric = np.einsum('eda,edb->eab', B, B).reshape(len(A), 9)
+    kA = np.asarray(k, dtype=float) * A
+    return kA[..., np.newaxis, np.newaxis] * (metric @ GRADIENT_PRODUCTS.reshape(9, 36)).reshape(-1, 6, 6)
+
+
+def quadratic_stiffness_matrices(E, nu, coords, plane='stress'):
+    """
+    Calculates the stiffness matrices of a batch of straight-sided quadratic triangles.
+
+    The elasticity matrix is expanded into the tensor C_cdfg that couples the derivative d of the displacement
+    component c with the derivative g of the component f, contracted with the barycentric gradients of the
+    element and the integrated gradient products of the reference element.
+
+    Parameters:
+    E (float or np.ndarray): Young's modulus, a scalar or one value per element (E).
+    nu (float or np.ndarray): Poisson's ratio, a scalar or one value per element (E).
+    coords (np.ndarray): Element node coordinates (E x 6 x 2), only the vertices are used.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    np.ndarray: Elemental stiffness matrices (E x 12 x 12), with the x and y degrees of freedom of each node
+        interleaved.
+    """
+    A, B = element_gradient_matrices(np.asarray(coords)[:, :3])
+    num_elements = len(A)
+
+    # Strain components [xx, yy, xy] from the displacement derivatives du_c/dx_d
+    strain_map = np.zeros((3, 2, 2))
+    strain_map[0, 0, 0] = strain_map[1, 1, 1] = strain_map[2, 0, 1] = strain_map[2, 1, 0] = 1
+    D = constitutive_matrices(E, nu, plane)
+    C = np.broadcast_to(np.einsum('kcd,...kl,lfg->...cdfg', strain_map, D, strain_map),
+                        (num_elements, 2, 2, 2, 2))
+
+    # Element coupling of the barycentric gradients a and b for the components c and f, ordered (c, f, a, b)
+    coupling = np.einsum('eda,ecdfg,egb->ecfab', B, C, B, optimize=True).reshape(num_elements * 4, 9)
+    K = (coupling @ GRADIENT_PRODUCTS.reshape(9, 36)).reshape(num_elements, 2, 2, 6, 6)
+    K = K.transpose(0, 3, 1, 4, 2).reshape(num_elements, 12, 12)
+    return A[:, np.newaxis, np.newaxis] * K
+
+
+def quadratic_mass_matrices(rho, coords):
+    """
+    Calculates the consistent mass matrices of a batch of straight-sided quadratic triangles.
+
+    Parameters:
+    rho (float or np.ndarray): Material density, a scalar or one value per element (E).
+    coords (np.ndarray): Element node coordinates (E x 6 x 2), only the vertices are used.
+
+    Returns:
+    np.ndarray: Elemental mass matrices (E x 6 x 6) of one displacement component.
+    """
+    A, _ = element_gradient_matrices(np.asarray(coords)[:, :3])
+    return (np.asarray(rho, dtype=float) * A)[..., np.newaxis, np.newaxis] * REFERENCE_MASS
+
+
+def assemble_quadratic_conductivity_matrix(elements, node_coords, k, sparse=False, memory_budget=None):
+    """
+    Builds the global conductivity matrix of a quadratic mesh.
+
+    Parameters:
+    elements (np.ndarray): Quadratic elements (E x 6), see quadratic_mesh.
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    k (float, np.ndarray or callable): Thermal conductivity, a scalar, one value per element or a function of the
+        element centroids.
+    sparse (bool): Whether to return a sparse CSR matrix instead of a dense array.
+    memory_budget (float, optional): Bytes the assembly may allocate, see get_memory_budget.
+
+    Returns:
+    np.ndarray or sp.sparse.csr_matrix: Global conductivity matrix (N x N).
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
+    N = len(node_coords)
+    sparse = choose_assembly_format(N, len(elements), 1, sparse, memory_budget=memory_budget)
+
+    k = evaluate_element_field(k, node_coords, elements)
+    ke = quadratic_conductivity_matrices(k, node_coords[elements])
+    return scatter_element_matrices(ke, element_dofs(elements), N, sparse)
+
+
+def assemble_quadratic_stiffness_matrix(elements, node_coords, E, nu, plane='stress', sparse=False,
+                                        memory_budget=None):
+    """
+    Builds the global stiffness matrix of a quadratic mesh.
+
+    Parameters:
+    elements (np.ndarray): Quadratic elements (E x 6), see quadratic_mesh.
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    E (float, np.ndarray or callable): Young's modulus, a scalar, one value per element or a function of the
+        element centroids.
+    nu (float, np.ndarray or callable): Poisson's ratio, given the same way as E.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+    sparse (bool): Whether to return a sparse CSR matrix instead of a dense array.
+    memory_budget (float, optional): Bytes the assembly may allocate, see get_memory_budget.
+
+    Returns:
+    np.ndarray or sp.sparse.csr_matrix: Global stiffness matrix (2N x 2N).
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
+    N = len(node_coords)
+    sparse = choose_assembly_format(N, len(elements), 2, sparse, memory_budget=memory_budget)
+
+    E = evaluate_element_field(E, node_coords, elements)
+    nu = evaluate_element_field(nu, node_coords, elements)
+    ke = quadratic_stiffness_matrices(E, nu, node_coords[elements], plane)
+    return scatter_element_matrices(ke, element_dofs(elements, dofs_per_node=2), 2 * N, sparse)
+
+
+def assemble_quadratic_mass_matrix(elements, node_coords, rho, sparse=False, memory_budget=None):
+    """
+    Builds the global mass matrix of a quadratic mesh.
+
+    Parameters:
+    elements (np.ndarray): Quadratic elements (E x 6), see quadratic_mesh.
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    rho (float, np.ndarray or callable): Material density, a scalar, one value per element or a function of the
+        element centroids.
+    sparse (bool): Whether to return a sparse CSR matrix instead of a dense array.
+    memory_budget (float, optional): Bytes the assembly may allocate, see get_memory_budget.
+
+    Returns:
+    np.ndarray or sp.sparse.csr_matrix: Global mass matrix (2N x 2N).
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
+    N = len(node_coords)
+    sparse = choose_assembly_format(N, len(elements), 2, sparse, memory_budget=memory_budget)
+
+    rho = evaluate_element_field(rho, node_coords, elements)
+    # Each displacement component gets its own copy of the scalar mass matrix
+    me = np.kron(quadratic_mass_matrices(rho, node_coords[elements]), np.eye(2))
+    return scatter_element_matrices(me, element_dofs(elements, dofs_per_node=2), 2 * N, sparse)
+
+
+def source_load_vector(node_coords, elements, source):
+    """
+    Integrates a distributed source against the shape functions of a linear or quadratic mesh.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Linear (E x 3) or quadratic (E x 6) elements.
+    source (float, np.ndarray or callable): Source per unit area, a scalar, one value per element or a function
+        of points (Px2) evaluated at the quadrature points.
+
+    Returns:
+    np.ndarray: Nodal load vector (N).
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements)
+    vertices = node_coords[elements[:, :3]]
+    A, _ = element_gradient_matrices(vertices)
+
+    if callable(source):
+        points = np.einsum('qa,ead->eqd', QUADRATURE_POINTS, vertices)
+        values = np.asarray(source(points.reshape(-1, 2)), dtype=float).reshape(len(elements), -1)
+    else:
+        values = np.broadcast_to(np.asarray(source, dtype=float)[..., np.newaxis],
+                                 (len(elements), len(QUADRATURE_WEIGHTS)))
+    shape_functions = QUADRATURE_POINTS if elements.shape[1] == 3 else quadratic_shape_functions(QUADRATURE_POINTS)
+    element_loads = A[:, np.newaxis] * ((values * QUADRATURE_WEIGHTS) @ shape_functions)
+    return np.bincount(elements.ravel(), element_loads.ravel(), minlength=len(node_coords))
+
+
+def field_l2_error(node_coords, elements, values, exact):
+    """
+    Integrates the L2 norm of the difference between a linear or quadratic field and an exact solution.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Linear (E x 3) or quadratic (E x 6) elements.
+    values (np.ndarray): Nodal values of the field (N).
+    exact (callable): Exact solution as a function of points (Px2).
+
+    Returns:
+    float: L2 norm of the error.
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements)
+    vertices = node_coords[elements[:, :3]]
+    A, _ = element_gradient_matrices(vertices)
+
+    points = np.einsum('qa,ead->eqd', QUADRATURE_POINTS, vertices).reshape(-1, 2)
+    shape_functions = QUADRATURE_POINTS if elements.shape[1] == 3 else quadratic_shape_functions(QUADRATURE_POINTS)
+    approximate = np.asarray(values)[elements] @ shape_functions.T
+    squared = (approximate - np.asarray(exact(points)).reshape(approximate.shape)) ** 2
+    return float(np.sqrt(A @ (squared @ QUADRATURE_WEIGHTS)))
+
+
+def solve_quadratic_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                  solver_method='spsolve', solver_options=None, profiler=None):
+    """
+    Solves a finite element heat transfer problem on a quadratic mesh.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    elements (np.ndarray): Quadratic elements (E x 6), see quadratic_mesh.
+    k (float, np.ndarray or callable): Thermal conductivity, a scalar, one value per element or a function of the
+        element centroids.
+    fixed_nodes (list of int): List of indices of fixed nodes, midpoints included.
+    fixed_temperatures (list of float): List of temperatures for fixed nodes.
+    heat_sources (np.ndarray): Vector of heat flows (N), see source_load_vector.
+    solver_method (str): Method to solve the system of equations, see solve_linear_system.
+    solver_options (dict, optional): Additional keyword arguments of the solver method.
+    profiler (Profiler, optional): Receives the iteration counts and residuals of the solve.
+
+    Returns:
+    np.ndarray: Vector of temperatures (N).
+    """
+    K_global = assemble_quadratic_conductivity_matrix(elements, node_coords, k, sparse=solver_method != 'solve')
+    K_global, F = apply_boundary_conditions(K_global, np.array(heat_sources, dtype=float).flatten(), fixed_nodes,
+                                            fixed_temperatures)
+    return solve_linear_system(K_global, F, solver_method, solver_options=solver_options, profiler=profiler)
+
+
+def evaluate_quadratic_field(elements, values, element_indices, barycentric):
+    """
+    Evaluates a quadratic field at points given by their element and barycentric coordinates.
+
+    Parameters:
+    elements (np.ndarray): Quadratic elements (E x 6).
+    values (np.ndarray): Nodal values of the field (N).
+    element_indices (np.ndarray): Element of every point (P).
+    barycentric (np.ndarray): Barycentric coordinates of the points in their elements (P x 3).
+
+    Returns:
+    np.ndarray: Field values at the points (P).
+    """
+    element_values = np.asarray(values)[np.asarray(elements)[element_indices]]
+    return (quadratic_shape_functions(barycentric) * element_values).sum(axis=1)
+
+
+def locate_points(node_coords, elements, points, candidates=8):
+    """
+    Finds the element containing every point among the elements with the nearest centroids.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Linear or quadratic elements, only the vertices are used.
+    points (np.ndarray): Points to locate (Px2).
+    candidates (int): Number of elements with the nearest centroids tested for every point.
+
+    Returns:
+    np.ndarray, np.ndarray: Element of every point, -1 if none was found (P), and the barycentric coordinates
+        in it (P x 3).
+    """
+    vertices = np.asarray(node_coords, dtype=float)[np.asarray(elements)[:, :3]]
+    points = np.asarray(points, dtype=float)
+    candidates = min(candidates, len(vertices))
+    _, nearest = sp.spatial.cKDTree(vertices.mean(axis=1)).query(points, candidates)
+    nearest = nearest.reshape(len(points), candidates)
+
+    # Barycentric coordinates of every point in every candidate element
+    origin = vertices[nearest, 2]
+    T = np.stack([vertices[nearest, 0] - origin, vertices[nearest, 1] - origin], axis=-1)
+    L01 = np.linalg.solve(T, (points[:, np.newaxis] - origin)[..., np.newaxis])[..., 0]
+    barycentric = np.concatenate([L01, 1 - L01.sum(axis=-1, keepdims=True)], axis=-1)
+
+    inside = barycentric.min(axis=-1) >= -1e-12
+    found = inside.any(axis=1)
+    first = inside.argmax(axis=1)
+    rows = np.arange(len(points))
+    return np.where(found, nearest[rows, first], -1), barycentric[rows, first]
+
+
+def interpolate_quadratic_field(node_coords, elements, values, points):
+    """
+    Interpolates a quadratic field at arbitrary points.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    elements (np.ndarray): Quadratic elements (E x 6).
+    values (np.ndarray): Nodal values of the field (N).
+    points (np.ndarray): Points to interpolate at (Px2).
+
+    Returns:
+    np.ndarray: Field values at the points (P), NaN outside the mesh.
+    """
+    element_indices, barycentric = locate_points(node_coords, elements, points)
+    found = element_indices >= 0
+    result = np.full(len(element_indices), np.nan)
+    result[found] = evaluate_quadratic_field(elements, values, element_indices[found], barycentric[found])
+    return result
+
+
+def quadratic_to_linear(node_coords, elements, values, subdivisions=2):
+    """
+    Samples a quadratic field on a linear mesh that splits every element into subdivisions^2 triangles, for
+    plotting and rasterizing with the linear mesh tools.
+
+    With 2 subdivisions the linear mesh reuses the quadratic nodes, finer subdivisions sample each element on its
+    own points, so the nodes along shared edges are repeated.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    elements (np.ndarray): Quadratic elements (E x 6).
+    values (np.ndarray): Nodal values of the field (N).
+    subdivisions (int): Number of segments every edge is split into.
+
+    Returns:
+    np.ndarray, np.ndarray, np.ndarray: Node coordinates, linear elements and field values of the linear mesh.
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements)
+    values = np.asarray(values)
+    if subdivisions == 2:
+        return node_coords, elements[:, LINEAR_SUBTRIANGLES].reshape(-1, 3), values
+
+    # Barycentric lattice of one element and its triangles
+    n = subdivisions
+    i, j = np.array([(i, j) for i in range(n + 1) for j in range(n + 1 - i)]).T
+    lattice = np.column_stack([i, j, n - i - j]) / n
+    index = {(a, b): position for position, (a, b) in enumerate(zip(i, j))}
+    triangles = [[index[a, b], index[a + 1, b], index[a, b + 1]] for a in range(n) for b in range(n - a)]
+    triangles += [[index[a + 1, b], index[a + 1, b + 1], index[a, b + 1]] for a in range(n) for b in range(n - a - 1)]
+    triangles = np.array(triangles)
+
+    points = np.einsum('pa,ead->epd', lattice, node_coords[elements[:, :3]]).reshape(-1, 2)
+    sampled = values[elements] @ quadratic_shape_functions(lattice).T
+    offsets = len(lattice) * np.arange(len(elements))
+    linear_elements = (offsets[:, np.newaxis, np.newaxis] + triangles).reshape(-1, 3)
+    return points, linear_elements, sampled.ravel()
+
+
+def plot_quadratic_field(node_coords, elements, values, title="Quadratic Field", filename=None, subdivisions=4):
+    """
+    Plots a quadratic field as filled contours of its samples on a subdivided linear mesh.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates of the quadratic mesh (Nx2).
+    elements (np.ndarray): Quadratic elements (E x 6).
+    values (np.ndarray): Nodal values of the field (N).
+    title (str): Title for the graph.
+    filename (str, optional): Image file to save the plot to instead of showing it.
+    subdivisions (int): Number of segments every element edge is split into, see quadratic_to_linear.
+    """
+    # matplotlib is only loaded once something is plotted
+    from src.fem.conductivity.visualize import visualize_heat_transfer
+
+    visualize_heat_transfer(*quadratic_to_linear(node_coords, elements, values, subdivisions), title=title,
+                            filename=filename)
+
+
+if __name__ == '__main__':
+    import time
+
+    from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    # Poisson problem -div grad T = f on the unit square with T = sin(pi x) sin(pi y)
+    def exact_solution(points):
+        return np.sin(np.pi * points[:, 0]) * np.sin(np.pi * points[:, 1])
+
+    def source(points):
+        return 2 * np.pi ** 2 * exact_solution(points)
+
+    for n in (9, 17, 33, 65):
+        node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, n, n)
+
+        start_time = time.perf_counter()
+        fixed_nodes = boundary_nodes(elements)
+        K_global = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+        K_global, F = apply_boundary_conditions(K_global, source_load_vector(node_coords, elements, source),
+                                                fixed_nodes, np.zeros(len(fixed_nodes)))
+        linear_temperatures = solve_linear_system(K_global, F, 'spsolve')
+        linear_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        quadratic_coords, quadratic_elements, _ = quadratic_mesh(node_coords, elements)
+        fixed_nodes = quadratic_boundary_nodes(quadratic_elements)
+        temperatures = solve_quadratic_heat_transfer(
+            quadratic_coords, quadratic_elements, 1.0, fixed_nodes, np.zeros(len(fixed_nodes)),
+            source_load_vector(quadratic_coords, quadratic_elements, source))
+        quadratic_time = time.perf_counter() - start_time
+
+        print(f"P1: {len(node_coords):5d} dofs, L2 error "
+              f"{field_l2_error(node_coords, elements, linear_temperatures, exact_solution):.2e}, {linear_time:.3f} s"
+              f" | P2: {len(quadratic_coords):5d} dofs, L2 error "
+              f"{field_l2_error(quadratic_coords, quadratic_elements, temperatures, exact_solution):.2e}, "
+              f"{quadratic_time:.3f} s")
+
+    sample_points = np.random.default_rng(0).uniform(0, 1, (2000, 2))
+    interpolated = interpolate_quadratic_field(quadratic_coords, quadratic_elements, temperatures, sample_points)
+    print("Max error at random points:", np.abs(interpolated - exact_solution(sample_points)).max())
+
+    # Rigid body motions cause no forces and the mass matrix integrates the area twice, once per component
+    K = assemble_quadratic_stiffness_matrix(quadratic_elements, quadratic_coords, 210e9, 0.3, sparse=True)
+    x, y = quadratic_coords.T
+    rigid_modes = [np.column_stack([np.ones_like(x), np.zeros_like(x)]), np.column_stack([-y, x])]
+    print("Relative forces of rigid body motions:",
+          [float(np.abs(K @ mode.ravel()).max() / np.abs(K).max()) for mode in rigid_modes])
+    M = assemble_quadratic_mass_matrix(quadratic_elements, quadratic_coords, 1.0, sparse=True)
+    print("Mass matrix total:", M.sum())
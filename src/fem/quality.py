@@ -0,0 +1,289 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.mesh import boundary_nodes, edge_table, mesh_edges
+
+# Metrics reported by element_quality, with the value of an equilateral triangle
+QUALITY_METRICS = {'min_angle': 60.0, 'max_angle': 60.0, 'aspect_ratio': 1.0, 'radius_ratio': 1.0}
+
+
+def signed_element_areas(node_coords, elements):
+    """
+    Calculates the signed areas of all elements at once, positive for counterclockwise elements.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    np.ndarray: Signed element areas (E).
+    """
+    p = np.asarray(node_coords, dtype=float)[np.asarray(elements)]
+    u = p[:, 1] - p[:, 0]
+    v = p[:, 2] - p[:, 0]
+    return 0.5 * (u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0])
+
+
+def element_quality(node_coords, elements):
+    """
+    Calculates shape quality metrics of all elements at once.
+
+    The aspect ratio is the longest edge over the shortest altitude and the radius ratio twice the inscribed over
+    the circumscribed radius, both scaled to 1 for an equilateral triangle. Slivers have small minimum angles,
+    large aspect ratios and radius ratios close to 0.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    dict: Per-element 'min_angle' and 'max_angle' in degrees, 'aspect_ratio' and 'radius_ratio' (E each).
+    """
+    p = np.asarray(node_coords, dtype=float)[np.asarray(elements)]
+    # Edge i is opposite to node i
+    lengths = np.linalg.norm(p[:, [2, 0, 1]] - p[:, [1, 2, 0]], axis=2)
+    area = np.abs(signed_element_areas(node_coords, elements))
+
+    # Law of cosines for the angle at every node
+    a2 = lengths ** 2
+    cosines = (a2[:, [1, 2, 0]] + a2[:, [2, 0, 1]] - a2) / (2 * lengths[:, [1, 2, 0]] * lengths[:, [2, 0, 1]])
+    angles = np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+
+    longest = lengths.max(axis=1)
+    perimeter = lengths.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect_ratio = np.sqrt(3) / 4 * longest ** 2 / area
+        inradius = 2 * area / perimeter
+        circumradius = lengths.prod(axis=1) / (4 * area)
+        radius_ratio = np.nan_to_num(2 * inradius / circumradius)
+
+    return {'min_angle': angles.min(axis=1), 'max_angle': angles.max(axis=1), 'aspect_ratio': aspect_ratio,
+            'radius_ratio': radius_ratio}
+
+
+def quality_summary(quality):
+    """
+    Summarizes element quality metrics.
+
+    Parameters:
+    quality (dict): Metrics from element_quality.
+
+    Returns:
+    dict: Minimum, mean and maximum of every metric.
+    """
+    return {name: {'min': float(values.min()), 'mean': float(values.mean()), 'max': float(values.max())}
+            for name, values in quality.items()}
+
+
+def quality_histogram(values, bins=10, value_range=None):
+    """
+    Counts the elements in bins of a quality metric.
+
+    Parameters:
+    values (np.ndarray): Per-element metric (E), e.g. element_quality(...)['radius_ratio'].
+    bins (int): Number of bins.
+    value_range (tuple of float, optional): Lower and upper bin edge. Defaults to the range of the values.
+
+    Returns:
+    np.ndarray, np.ndarray: Element counts (bins) and bin edges (bins + 1).
+    """
+    return np.histogram(values, bins=bins, range=value_range)
+
+
+def plot_quality_histograms(qualities, labels, bins=30, filename=None):
+    """
+    Plots the histograms of the minimum angle and the radius ratio of one or more meshes.
+
+    Parameters:
+    qualities (list of dict): Metrics from element_quality, one per mesh.
+    labels (list of str): Mesh names for the legend.
+    bins (int): Number of bins.
+    filename (str, optional): File to save the figure to instead of showing it.
+    """
+    from src.fem.plotting import create_figure, show_or_save_figure
+
+    fig, ax = create_figure(filename, figsize=(12, 5))
+    ax.remove()
+    for ax, (metric, value_range) in zip(fig.subplots(1, 2), [('min_angle', (0, 60)), ('radius_ratio', (0, 1))]):
+        for quality, label in zip(qualities, labels):
+            ax.hist(quality[metric], bins=bins, range=value_range, histtype='step', label=label)
+        ax.set_xlabel(metric.replace('_', ' ').capitalize())
+        ax.set_ylabel('Elements')
+        ax.legend()
+    show_or_save_figure(fig, filename)
+
+
+def _free_nodes(node_coords, elements, fixed_nodes):
+    """
+    Returns the mask of the nodes smoothing may move: the nodes of the mesh apart from its boundary nodes and the
+    given fixed nodes.
+    """
+    free = np.zeros(len(node_coords), dtype=bool)
+    free[np.unique(elements)] = True
+    free[boundary_nodes(elements)] = False
+    if fixed_nodes is not None:
+        free[np.asarray(fixed_nodes, dtype=int)] = False
+    return free
+
+
+def _untangle(node_coords, previous_coords, elements, orientation):
+    """
+    Moves the nodes of elements a smoothing step turned inside out back to their previous positions.
+    """
+    for _ in range(10):
+        inverted = np.sign(signed_element_areas(node_coords, elements)) != orientation
+        if not inverted.any():
+            break
+        nodes = np.unique(elements[inverted])
+        node_coords[nodes] = previous_coords[nodes]
+    return node_coords
+
+
+def smooth_laplacian(node_coords, elements, iterations=10, fixed_nodes=None, relaxation=1.0):
+    """
+    Moves every free node towards the mean of its neighbours (Laplacian smoothing).
+
+    All nodes move at once with one sparse product per iteration. Boundary nodes and the given fixed nodes stay in
+    place, and moves that would turn an element inside out are undone, so the connectivity stays valid.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+    iterations (int): Number of smoothing sweeps.
+    fixed_nodes (list of int, optional): Interior nodes to keep in place as well, e.g. nodes with loads.
+    relaxation (float): Fraction of the way towards the neighbour mean every sweep moves, between 0 and 1.
+
+    Returns:
+    np.ndarray: Smoothed node coordinates (Nx2).
+    """
+    node_coords = np.array(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+    free = _free_nodes(node_coords, elements, fixed_nodes)
+    orientation = np.sign(signed_element_areas(node_coords, elements))
+
+    edges = mesh_edges(elements)
+    adjacency = sp.sparse.csr_matrix((np.ones(2 * len(edges)), (edges.ravel(), edges[:, ::-1].ravel())),
+                                     shape=(len(node_coords), len(node_coords)))
+    degree = np.maximum(np.asarray(adjacency.sum(axis=1)).ravel(), 1)
+
+    for _ in range(iterations):
+        previous = node_coords.copy()
+        neighbour_mean = (adjacency @ node_coords) / degree[:, np.newaxis]
+        node_coords[free] += relaxation * (neighbour_mean[free] - node_coords[free])
+        node_coords = _untangle(node_coords, previous, elements, orientation)
+    return node_coords
+
+
+def voronoi_centroids(node_coords, elements):
+    """
+    Calculates the centroids of the Voronoi cells of the nodes of a Delaunay mesh.
+
+    Inside every triangle the cell of a node is the quadrilateral between the node, the midpoints of its two edges
+    and the circumcenter. Its signed area also covers obtuse triangles, whose circumcenter lies outside, so the
+    pieces add up to the cell of every interior node. Cells are clipped at the mesh boundary: a boundary triangle
+    whose circumcenter lies beyond its boundary edge uses the midpoint of that edge instead.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    np.ndarray, np.ndarray: Cell centroids (Nx2) and cell areas (N).
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+    # Counterclockwise elements make every piece positive for acute triangles
+    elements = np.where((signed_element_areas(node_coords, elements) < 0)[:, np.newaxis], elements[:, [0, 2, 1]],
+                        elements)
+    p = node_coords[elements]
+
+    # Circumcenters relative to the first node
+    u = p[:, 1] - p[:, 0]
+    v = p[:, 2] - p[:, 0]
+    d = 2 * (u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0])
+    u2 = (u ** 2).sum(axis=1)
+    v2 = (v ** 2).sum(axis=1)
+    circumcenters = p[:, 0] + np.stack([v[:, 1] * u2 - u[:, 1] * v2, u[:, 0] * v2 - v[:, 0] * u2], axis=1) \
+        / d[:, np.newaxis]
+
+    # Local edge j joins local nodes j and j + 1 and is opposite to node j + 2
+    edges, element_edges, counts = edge_table(elements)
+    following = p[:, [1, 2, 0]]
+    opposite = p[:, [2, 0, 1]]
+    beyond = (counts[element_edges] == 1) & (((p - opposite) * (following - opposite)).sum(axis=2) < 0)
+    clipped, local_edge = np.flatnonzero(beyond.any(axis=1)), np.argmax(beyond, axis=1)[beyond.any(axis=1)]
+    circumcenters[clipped] = 0.5 * (p[clipped, local_edge] + following[clipped, local_edge])
+
+    def triangle_moments(a, b, c):
+        area = 0.5 * ((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1])
+                      - (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0]))
+        return area, area[..., np.newaxis] * (a + b + c) / 3
+
+    center = np.broadcast_to(circumcenters[:, np.newaxis], p.shape)
+    area_1, moment_1 = triangle_moments(p, 0.5 * (p + following), center)
+    area_2, moment_2 = triangle_moments(p, center, 0.5 * (p + opposite))
+
+    cell_areas = np.bincount(elements.ravel(), (area_1 + area_2).ravel(), minlength=len(node_coords))
+    moments = np.stack([np.bincount(elements.ravel(), (moment_1 + moment_2)[..., axis].ravel(),
+                                    minlength=len(node_coords)) for axis in range(2)], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centroids = moments / cell_areas[:, np.newaxis]
+    return np.where((cell_areas > 0)[:, np.newaxis], centroids, node_coords), cell_areas
+
+
+def smooth_lloyd(node_coords, elements, iterations=10, fixed_nodes=None, retriangulate=False):
+    """
+    Moves every free node to the centroid of its Voronoi cell (Lloyd iterations towards a centroidal Voronoi
+    tessellation).
+
+    Boundary nodes and the given fixed nodes stay in place. With retriangulate the mesh is triangulated again after
+    every iteration, which is what lets Lloyd iterations remove slivers from random Delaunay meshes; it is only
+    valid for convex domains, whose boundary is the convex hull of the nodes. Without it the connectivity is kept
+    and moves that would turn an element inside out are undone.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+    iterations (int): Number of Lloyd iterations.
+    fixed_nodes (list of int, optional): Interior nodes to keep in place as well.
+    retriangulate (bool): Whether to rebuild the Delaunay triangulation after every iteration.
+
+    Returns:
+    np.ndarray, np.ndarray: Smoothed node coordinates (Nx2) and elements (Ex3).
+    """
+    # scipy.spatial is only imported by the meshers that need it, see src.fem.mesh
+    from scipy.spatial import Delaunay
+
+    node_coords = np.array(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+    free = _free_nodes(node_coords, elements, fixed_nodes)
+
+    for _ in range(iterations):
+        previous = node_coords.copy()
+        centroids, _ = voronoi_centroids(node_coords, elements)
+        node_coords[free] = centroids[free]
+        if retriangulate:
+            elements = Delaunay(node_coords).simplices.astype(np.int64)
+        else:
+            node_coords = _untangle(node_coords, previous, elements,
+                                    np.sign(signed_element_areas(previous, elements)))
+    return node_coords, elements
+
+
+if __name__ == '__main__':
+    from src.fem.mesh import create_random_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_random_triangular_mesh_in_rectangle(0, 1, 0, 1, 2000, seed=0)
+    meshes = {
+        'Delaunay': (node_coords, elements),
+        'Laplacian': (smooth_laplacian(node_coords, elements, iterations=20), elements),
+        'Lloyd': smooth_lloyd(node_coords, elements, iterations=20, retriangulate=True),
+    }
+    qualities = []
+    for name, (coords, mesh_elements) in meshes.items():
+        quality = element_quality(coords, mesh_elements)
+        qualities.append(quality)
+        summary = quality_summary(quality)
+        print(f"{name:<10} min angle {summary['min_angle']['min']:6.2f}, mean radius ratio "
+              f"{summary['radius_ratio']['mean']:.3f}, max aspect ratio {summary['aspect_ratio']['max']:.1f}")
+    plot_quality_histograms(qualities, list(meshes))
@@ -0,0 +1,265 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.mesh import EDGE_KEY_BASE, edge_keys, edge_table, element_edge_keys
+
+
+def _red_children(elements, element_midpoints):
+    """
+    Splits triangles into four by connecting their edge midpoints. The children keep the orientation of the parent.
+    """
+    a, b, c = elements.T
+    m01, m12, m20 = element_midpoints.T
+    children = np.stack([
+        np.stack([a, m01, m20], axis=1),
+        np.stack([m01, b, m12], axis=1),
+        np.stack([m20, m12, c], axis=1),
+        np.stack([m01, m12, m20], axis=1),
+    ], axis=1)
+    return children.reshape(-1, 3)
+
+
+def _find_midpoints(midpoint_keys, midpoint_nodes, keys):
+    """
+    Looks edge keys up in a table of edge midpoints sorted by key.
+
+    Returns:
+    np.ndarray, np.ndarray: Whether every edge has a midpoint, and the midpoint node where it has one.
+    """
+    if len(midpoint_keys) == 0:
+        return np.zeros(keys.shape, dtype=bool), np.full(keys.shape, -1, dtype=np.int64)
+    position = np.minimum(np.searchsorted(midpoint_keys, keys), len(midpoint_keys) - 1)
+    found = midpoint_keys[position] == keys
+    return found, np.where(found, midpoint_nodes[position], -1)
+
+
+def interpolate_to_refined(values, midpoint_parents):
+    """
+    Interpolates nodal values linearly onto the nodes added by a refinement.
+
+    A midpoint can lie on an edge between two new nodes, so the midpoints are filled in as soon as both end nodes
+    are known.
+
+    Parameters:
+    values (np.ndarray): Values at the nodes of the coarse mesh (N or NxD).
+    midpoint_parents (np.ndarray): End nodes of the edge of every new node (Mx2), see refine_red_green.
+
+    Returns:
+    np.ndarray: Values at the nodes of the refined mesh (N+M or (N+M)xD).
+    """
+    values = np.asarray(values)
+    num_nodes = len(values)
+    refined = np.concatenate([values, np.zeros((len(midpoint_parents),) + values.shape[1:], dtype=values.dtype)])
+    known = np.arange(len(refined)) < num_nodes
+    pending = np.arange(len(midpoint_parents))
+    while len(pending):
+        ready = known[midpoint_parents[pending]].all(axis=1)
+        nodes = pending[ready]
+        refined[num_nodes + nodes] = refined[midpoint_parents[nodes]].mean(axis=1)
+        known[num_nodes + nodes] = True
+        pending = pending[~ready]
+    return refined
+
+
+def prolongation_matrix(num_coarse_nodes, midpoint_parents, dofs_per_node=1):
+    """
+    Builds the sparse linear interpolation from a coarse mesh onto its refinement.
+
+    The coarse nodes keep their values and every new node takes the mean of the end nodes of its edge. Rows of
+    midpoints between new nodes are combined from the rows of their end nodes, batch by batch.
+
+    Parameters:
+    num_coarse_nodes (int): Number of nodes of the coarse mesh.
+    midpoint_parents (np.ndarray): End nodes of the edge of every new node (Mx2), new nodes numbered after the
+        coarse ones and after their end nodes.
+    dofs_per_node (int): Number of degrees of freedom per node, interleaved per node (1 for heat transfer, 2 for
+        elasticity).
+
+    Returns:
+    sp.sparse.csr_matrix: Prolongation matrix ((N+M)*dofs_per_node x N*dofs_per_node).
+    """
+    midpoint_parents = np.asarray(midpoint_parents, dtype=np.int64).reshape(-1, 2)
+    prolongation = sp.sparse.identity(num_coarse_nodes, format='csr')
+    done = 0
+    while done < len(midpoint_parents):
+        # Every new node only depends on earlier nodes, so the batch runs up to the first unknown end node
+        unknown = np.flatnonzero(midpoint_parents[done:].max(axis=1) >= num_coarse_nodes + done)
+        stop = len(midpoint_parents) if len(unknown) == 0 else done + unknown[0]
+        batch = midpoint_parents[done:stop]
+        prolongation = sp.sparse.vstack([prolongation, 0.5 * (prolongation[batch[:, 0]] + prolongation[batch[:, 1]])],
+                                        format='csr')
+        done = stop
+
+    if dofs_per_node > 1:
+        prolongation = sp.sparse.kron(prolongation, sp.sparse.identity(dofs_per_node), format='csr')
+    return prolongation
+
+
+def refine_uniform(node_coords, elements):
+    """
+    Splits every triangle into four by connecting its edge midpoints.
+
+    Every edge gets one midpoint, shared by the elements on both sides through the edge table of the mesh.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+
+    Returns:
+    np.ndarray, np.ndarray, sp.sparse.csr_matrix: Refined node coordinates (the coarse nodes first) and elements
+        (4E x 3, the children of element e at rows 4e to 4e+3), and the prolongation matrix from the coarse mesh.
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+
+    midpoint_parents, element_edges, _ = edge_table(elements)
+    element_midpoints = len(node_coords) + element_edges
+
+    node_coords = np.vstack([node_coords, node_coords[midpoint_parents].mean(axis=1)])
+    prolongation = prolongation_matrix(len(node_coords) - len(midpoint_parents), midpoint_parents)
+    return node_coords, _red_children(elements, element_midpoints), prolongation
+
+
+def uniform_refinement_hierarchy(node_coords, elements, levels):
+    """
+    Builds nested meshes by repeated uniform refinement.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates of the coarsest mesh (Nx2).
+    elements (np.ndarray): Elements of the coarsest mesh (Ex3).
+    levels (int): Number of refinements.
+
+    Returns:
+    list of tuple, list of sp.sparse.csr_matrix: The meshes (node_coords, elements) from the coarsest to the
+        finest, and the prolongation matrices between consecutive meshes.
+    """
+    meshes = [(np.asarray(node_coords, dtype=float), np.asarray(elements, dtype=np.int64))]
+    prolongations = []
+    for _ in range(levels):
+        node_coords, elements, prolongation = refine_uniform(*meshes[-1])
+        meshes.append((node_coords, elements))
+        prolongations.append(prolongation)
+    return meshes, prolongations
+
+
+def refine_red_green(node_coords, elements, marked, green_parents=None):
+    """
+    Refines the marked elements of a triangular mesh with red-green refinement.
+
+    Marked elements are split red into four similar triangles. The closure keeps the mesh conforming: elements with
+    two or three split edges are refined red as well, and elements with one split edge are bisected green.
+    Following Bank, Sherman and Weiser, the green pairs of the previous refinement are first merged back into
+    their parents, so green elements are never bisected again and the element angles stay bounded over many
+    refinement steps.
+
+    Split edges are kept in a table of edge midpoints hashed by a single integer key per edge, so every midpoint
+    is created once and shared by the elements on both sides of the edge.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (np.ndarray): Grid elements (Ex3).
+    marked (np.ndarray): Boolean mask of the elements to refine (E).
+    green_parents (np.ndarray, optional): Parent triangle and midpoint (a, b, c, m) of every green element and -1
+        for the other elements (Ex4), as returned by the previous refinement. None if the mesh has no green
+        elements.
+
+    Returns:
+    np.ndarray, np.ndarray, dict: Refined node coordinates and elements, and the refinement with the keys
+        'midpoint_parents' (end nodes of the edge of every new node, appended after the existing nodes),
+        'element_parents' (element of the input mesh every new element was cut from), 'unchanged' (mask of the
+        elements copied from the input mesh) and 'green_parents' (for the next refinement).
+    """
+    node_coords = np.asarray(node_coords, dtype=float)
+    elements = np.asarray(elements, dtype=np.int64)
+    marked = np.asarray(marked, dtype=bool)
+    element_parents = np.arange(len(elements))
+    original = np.ones(len(elements), dtype=bool)
+    midpoint_keys = np.empty(0, dtype=np.int64)
+    midpoint_nodes = np.empty(0, dtype=np.int64)
+
+    # Green pairs are merged into their parents, which are marked if either child is
+    green = np.zeros(len(elements), dtype=bool) if green_parents is None else green_parents[:, 0] >= 0
+    if green.any():
+        midpoints, first = np.unique(green_parents[green, 3], return_index=True)
+        parents = green_parents[green][first]
+        parent_marked = np.zeros(len(parents), dtype=bool)
+        parent_marked[np.searchsorted(midpoints, green_parents[green & marked, 3])] = True
+
+        elements = np.concatenate([elements[~green], parents[:, :3]])
+        marked = np.concatenate([marked[~green], parent_marked])
+        element_parents = np.concatenate([element_parents[~green], np.flatnonzero(green)[first]])
+        original = np.concatenate([original[~green], np.zeros(len(parents), dtype=bool)])
+
+        midpoint_keys = edge_keys(parents[:, 0], parents[:, 1])
+        order = np.argsort(midpoint_keys)
+        midpoint_keys, midpoint_nodes = midpoint_keys[order], parents[order, 3]
+
+    # Red refinement until every element has at most one split edge
+    new_nodes = [np.empty((0, 2), dtype=np.int64)]
+    num_nodes = len(node_coords)
+    while True:
+        element_keys = element_edge_keys(elements)
+        split, element_midpoints = _find_midpoints(midpoint_keys, midpoint_nodes, element_keys)
+        # A split edge with a split half is only conforming after the element is refined red
+        following = np.roll(elements, -1, axis=1)
+        half_split = np.zeros_like(split)
+        for half_end in (elements, following):
+            half_keys = edge_keys(half_end, element_midpoints)
+            half_split |= split & _find_midpoints(midpoint_keys, midpoint_nodes, half_keys)[0]
+        red = marked | (split.sum(axis=1) >= 2) | half_split.any(axis=1)
+        if not red.any():
+            break
+
+        # New midpoints of the edges of the red elements
+        keys = np.sort(element_keys[red][~split[red]])
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+        nodes = num_nodes + np.arange(len(keys))
+        num_nodes += len(keys)
+        new_nodes.append(np.stack([keys // EDGE_KEY_BASE, keys % EDGE_KEY_BASE], axis=1))
+        midpoint_keys = np.concatenate([midpoint_keys, keys])
+        midpoint_nodes = np.concatenate([midpoint_nodes, nodes])
+        order = np.argsort(midpoint_keys, kind='stable')
+        midpoint_keys, midpoint_nodes = midpoint_keys[order], midpoint_nodes[order]
+
+        _, element_midpoints = _find_midpoints(midpoint_keys, midpoint_nodes, element_keys[red])
+        elements = np.concatenate([elements[~red], _red_children(elements[red], element_midpoints)])
+        marked = np.zeros(len(elements), dtype=bool)
+        element_parents = np.concatenate([element_parents[~red], np.repeat(element_parents[red], 4)])
+        original = np.concatenate([original[~red], np.zeros(4 * red.sum(), dtype=bool)])
+
+    midpoint_parents = np.concatenate(new_nodes)
+    node_coords = interpolate_to_refined(node_coords, midpoint_parents)
+
+    # Green bisection: rotate every element so that its split edge joins local nodes 0 and 1
+    split, element_midpoints = _find_midpoints(midpoint_keys, midpoint_nodes, element_edge_keys(elements))
+    bisected = split.any(axis=1)
+    local_edge = np.argmax(split[bisected], axis=1)
+    rotated = np.take_along_axis(elements[bisected], (np.arange(3) + local_edge[:, np.newaxis]) % 3, axis=1)
+    m = element_midpoints[bisected, local_edge]
+    a, b, c = rotated.T
+    green_children = np.stack([np.stack([a, m, c], axis=1), np.stack([m, b, c], axis=1)], axis=1).reshape(-1, 3)
+
+    refinement = {
+        'midpoint_parents': midpoint_parents,
+        'element_parents': np.concatenate([element_parents[~bisected], np.repeat(element_parents[bisected], 2)]),
+        'unchanged': np.concatenate([original[~bisected], np.zeros(len(green_children), dtype=bool)]),
+        'green_parents': np.concatenate([np.full(((~bisected).sum(), 4), -1),
+                                         np.repeat(np.column_stack([rotated, m]), 2, axis=0)]),
+    }
+    return node_coords, np.concatenate([elements[~bisected], green_children]), refinement
+
+
+if __name__ == '__main__':
+    from src.fem.mesh import calculate_element_areas, create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 5, 5)
+    green_parents = None
+
+    # Refine towards the corner (0, 0) a few times
+    for step in range(4):
+        centroids = node_coords[elements].mean(axis=1)
+        marked = np.linalg.norm(centroids, axis=1) < 0.3
+        node_coords, elements, refinement = refine_red_green(node_coords, elements, marked, green_parents)
+        green_parents = refinement['green_parents']
+        print(f"Step {step}: {len(node_coords)} nodes, {len(elements)} elements, "
+              f"total area {calculate_element_areas(node_coords, elements).sum():.6f}")
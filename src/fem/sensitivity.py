@@ -0,0 +1,247 @@
+import numpy as np
+import scipy as sp
+
+from src.fem.assembly import element_dofs, scatter_element_matrices
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions as apply_heat_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import element_conductivity_matrices, element_gradient_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.stifness.boundary_conditions import apply_boundary_conditions as apply_elastic_boundary_conditions
+from src.fem.stifness.stiffness_matrix import element_stiffness_matrices
+
+
+def _factorized_forward(node_coords, elements, parameters, unit_matrices, dofs_per_node, fixed_dofs, F, K_bc):
+    """
+    Factorizes a constrained system and keeps everything the adjoint solves need.
+    """
+    factorization = sp.sparse.linalg.splu(K_bc.tocsc())
+    free = np.ones(len(F), dtype=bool)
+    free[fixed_dofs] = False
+    return {
+        'node_coords': np.asarray(node_coords, dtype=float),
+        'elements': np.asarray(elements),
+        'parameters': parameters,
+        'unit_element_matrices': unit_matrices,
+        'dofs': element_dofs(elements, dofs_per_node),
+        'free': free,
+        'factorization': factorization,
+    }
+
+
+def solve_heat_transfer_forward(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources):
+    """
+    Solves a heat transfer problem and keeps its factorization for adjoint sensitivities.
+
+    The global matrix is linear in the element conductivities, K = sum_e k_e K_e, so the unit element matrices K_e
+    are kept as well.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    k (float, np.ndarray or callable): Thermal conductivity, a scalar, one value per element or a function of the
+        element centroids. Sensitivities are always per element.
+    fixed_nodes (list of int): List of indices of fixed nodes.
+    fixed_temperatures (list of float): List of temperatures for fixed nodes.
+    heat_sources (np.ndarray): Vector of heat flows (N).
+
+    Returns:
+    dict: The 'solution' (N), the 'load' vector, the element conductivities as 'parameters' (E), the
+        'unit_element_matrices' (Ex3x3), the element 'dofs', the 'free' mask and the 'factorization' of the
+        constrained matrix.
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords, dtype=float)
+    k = np.broadcast_to(evaluate_element_field(k, node_coords, elements), (len(elements),))
+    unit_matrices = element_conductivity_matrices(1.0, node_coords[elements])
+
+    K_global = scatter_element_matrices(k[:, np.newaxis, np.newaxis] * unit_matrices, element_dofs(elements),
+                                        len(node_coords), sparse=True)
+    F = np.array(heat_sources, dtype=float).flatten()
+    K_bc, F_bc = apply_heat_boundary_conditions(K_global, F, fixed_nodes, fixed_temperatures)
+
+    forward = _factorized_forward(node_coords, elements, np.array(k), unit_matrices, 1,
+                                  np.asarray(fixed_nodes, dtype=int), F, K_bc)
+    forward['solution'] = forward['factorization'].solve(F_bc)
+    forward['load'] = np.where(forward['free'], F, 0.0)
+    return forward
+
+
+def solve_elasticity_forward(node_coords, elements, E, nu, fixed_nodes, forces, plane='stress'):
+    """
+    Solves a linear elasticity problem and keeps its factorization for adjoint sensitivities.
+
+    The global matrix is linear in the element Young's moduli, K = sum_e E_e K_e, so the stiffness matrices K_e
+    of a unit modulus are kept as well.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    E (float, np.ndarray or callable): Young's modulus, a scalar, one value per element or a function of the
+        element centroids. Sensitivities are always per element.
+    nu (float, np.ndarray or callable): Poisson's ratio, given the same way as E.
+    fixed_nodes (list of int): List of fixed node indices.
+    forces (np.ndarray): External force vector (2N).
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    dict: The 'solution' (2N) and the rest as in solve_heat_transfer_forward, with the element Young's moduli as
+        'parameters' and unit element matrices of size 6x6.
+    """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords, dtype=float)
+    E = np.broadcast_to(evaluate_element_field(E, node_coords, elements), (len(elements),))
+    nu = evaluate_element_field(nu, node_coords, elements)
+    unit_matrices = element_stiffness_matrices(1.0, nu, node_coords[elements], plane)
+
+    K_global = scatter_element_matrices(E[:, np.newaxis, np.newaxis] * unit_matrices,
+                                        element_dofs(elements, dofs_per_node=2), 2 * len(node_coords), sparse=True)
+    F = np.array(forces, dtype=float).flatten()
+    K_bc, F_bc = apply_elastic_boundary_conditions(K_global, F.copy(), fixed_nodes)
+
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    fixed_dofs = np.concatenate([2 * fixed_nodes, 2 * fixed_nodes + 1])
+    forward = _factorized_forward(node_coords, elements, np.array(E), unit_matrices, 2, fixed_dofs, F, K_bc)
+    forward['solution'] = forward['factorization'].solve(F_bc)
+    forward['load'] = np.where(forward['free'], F, 0.0)
+    return forward
+
+
+def mean_temperature(forward):
+    """
+    Area-weighted mean temperature of a heat transfer solution.
+
+    Returns:
+    float, np.ndarray: Objective value and its derivative with respect to the solution (N).
+    """
+    node_coords, elements = forward['node_coords'], forward['elements']
+    areas, _ = element_gradient_matrices(node_coords[elements])
+    weights = np.bincount(elements.ravel(), np.repeat(areas / 3, 3), minlength=len(node_coords)) / areas.sum()
+    return float(weights @ forward['solution']), weights
+
+
+def peak_temperature(forward, p=16):
+    """
+    Smooth approximation of the peak temperature: the area-weighted p-norm of the temperatures, which approaches
+    the maximum absolute temperature as p grows.
+
+    Parameters:
+    forward (dict): Forward solution, see solve_heat_transfer_forward.
+    p (float): Exponent of the norm.
+
+    Returns:
+    float, np.ndarray: Objective value and its derivative with respect to the solution (N).
+    """
+    _, weights = mean_temperature(forward)
+    temperatures = forward['solution']
+    scale = np.abs(temperatures).max() or 1.0
+    # The temperatures are scaled to at most 1 in magnitude so that |T|^p does not overflow
+    scaled = np.abs(temperatures) / scale
+    total = weights @ scaled ** p
+    value = scale * total ** (1 / p)
+    gradient = total ** (1 / p - 1) * weights * scaled ** (p - 1) * np.sign(temperatures)
+    return float(value), gradient
+
+
+def compliance(forward):
+    """
+    Compliance F^T u of a solution: the work of the loads for elasticity, the heat source weighted temperature
+    for heat transfer.
+
+    Returns:
+    float, np.ndarray: Objective value and its derivative with respect to the solution.
+    """
+    return float(forward['load'] @ forward['solution']), forward['load']
+
+
+# Objectives by name, each returning its value and its derivative with respect to the solution
+OBJECTIVES = {
+    'mean_temperature': mean_temperature,
+    'peak_temperature': peak_temperature,
+    'compliance': compliance,
+}
+
+
+def adjoint_sensitivities(forward, objective_gradient):
+    """
+    Calculates the derivatives of an objective with respect to every element parameter with one adjoint solve.
+
+    The adjoint system K^T lambda = dJ/du is solved with the forward factorization, and with K = sum_e p_e K_e
+    the derivatives dJ/dp_e = -lambda_e^T K_e u_e of all elements follow from one batched contraction over the
+    unit element matrices. The loads must not depend on the parameters.
+
+    Parameters:
+    forward (dict): Forward solution, see solve_heat_transfer_forward and solve_elasticity_forward.
+    objective_gradient (np.ndarray): Derivative of the objective with respect to the solution.
+
+    Returns:
+    np.ndarray: Derivatives with respect to the element parameters (E).
+    """
+    # Fixed values do not depend on the parameters, so the adjoint vanishes there
+    rhs = np.where(forward['free'], objective_gradient, 0.0)
+    adjoint = forward['factorization'].solve(rhs, trans='T')
+
+    dofs = forward['dofs']
+    return -np.einsum('ei,eij,ej->e', adjoint[dofs], forward['unit_element_matrices'], forward['solution'][dofs],
+                      optimize=True)
+
+
+def objective_sensitivities(forward, objective='compliance', **options):
+    """
+    Evaluates a named objective and its derivatives with respect to every element parameter.
+
+    Parameters:
+    forward (dict): Forward solution, see solve_heat_transfer_forward and solve_elasticity_forward.
+    objective (str): One of OBJECTIVES: 'mean_temperature', 'peak_temperature' or 'compliance'.
+    options: Keyword arguments of the objective, e.g. p for 'peak_temperature'.
+
+    Returns:
+    float, np.ndarray: Objective value and its derivatives with respect to the element parameters (E).
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    value, objective_gradient = OBJECTIVES[objective](forward, **options)
+    return value, adjoint_sensitivities(forward, objective_gradient)
+
+
+if __name__ == '__main__':
+    import time
+
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 60, 60)
+    rng = np.random.default_rng(0)
+    k = rng.uniform(0.5, 2.0, len(elements))
+    fixed_nodes = np.flatnonzero(node_coords[:, 0] == 0)
+    heat_sources = np.full(len(node_coords), 1.0 / len(node_coords))
+
+    def heat_objective(k, objective):
+        forward = solve_heat_transfer_forward(node_coords, elements, k, fixed_nodes, np.zeros(len(fixed_nodes)),
+                                              heat_sources)
+        return objective_sensitivities(forward, objective)
+
+    for objective in OBJECTIVES:
+        start_time = time.perf_counter()
+        value, gradient = heat_objective(k, objective)
+        elapsed = time.perf_counter() - start_time
+
+        # Central differences for a few elements
+        step = 1e-4
+        checked = rng.choice(len(elements), 3, replace=False)
+        differences = []
+        for e in checked:
+            k_plus, k_minus = k.copy(), k.copy()
+            k_plus[e] += step
+            k_minus[e] -= step
+            differences.append((heat_objective(k_plus, objective)[0] - heat_objective(k_minus, objective)[0])
+                               / (2 * step))
+        error = np.max(np.abs(gradient[checked] - differences) / np.abs(differences))
+        print(f"{objective}: {value:.6e}, {len(elements)} sensitivities in {elapsed:.3f} s, "
+              f"relative difference to finite differences {error:.1e}")
+
+    # Compliance of a cantilever with respect to the Young's moduli
+    E = np.full(len(elements), 210e9)
+    forces = np.zeros(2 * len(node_coords))
+    forces[2 * np.flatnonzero(node_coords[:, 0] == 1) + 1] = -1000.0
+    forward = solve_elasticity_forward(node_coords, elements, E, 0.3, fixed_nodes, forces)
+    value, gradient = objective_sensitivities(forward, 'compliance')
+    # Compliance is homogeneous of degree -1 in the moduli, so E . dC/dE = -C
+    print(f"Compliance {value:.6e}, E . dC/dE = {E @ gradient:.6e}")
@@ -0,0 +1,395 @@
+import functools
+import importlib
+import json
+import logging
+import os
+import warnings
+
+import numpy as np
+import scipy as sp
+
+from src.fem.domain_decomposition import solve_schur_complement
+from src.fem.memory import check_memory, estimate_solve_memory, get_memory_budget
+from src.fem.multigrid import GeometricMultigrid
+from src.fem.profiling import get_profiler
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def optional_import(name):
+    """
+    Imports an optional backend such as pyamg or cupy on first use.
+
+    Some backends take seconds to import, or initialize a GPU, so modules do not import them at load time.
+    The result, including a failed import, is cached.
+
+    Parameters:
+    name (str): Module name.
+
+    Returns:
+    module: The module, or None if it is not installed.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+# Iterative methods with the names used in their residual reports
+ITERATIVE_METHODS = {
+    'cg': ('CG', sp.sparse.linalg.cg),
+    'bicg': ('BiCG', sp.sparse.linalg.bicg),
+    'bicgstab': ('BiCGStab', sp.sparse.linalg.bicgstab),
+    'gmres': ('GMRES', sp.sparse.linalg.gmres),
+    'minres': ('MINRES', sp.sparse.linalg.minres),
+}
+
+# Benchmark suite results the automatic solver selection is calibrated from
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'benchmarking', 'results',
+                                'fem_benchmark_results.json')
+
+# Size limits used when no benchmark results are available, which is the case until
+# benchmarking/fem_benchmark_suite.py has been run on the machine: the results are machine-specific and not part
+# of the repository. No limit on sparse direct solves means only the memory budget sends a system to the
+# iterative methods.
+DEFAULT_SOLVER_CALIBRATION = {'dense_max_dofs': 200, 'direct_max_dofs': None}
+
+# ILU-preconditioned CG that needs more iterations than this is considered failed
+PCG_MAX_ITERATIONS = 200
+
+
+def _low_precision_solver(K, solver_method, overwrite=False):
+    """
+    Factors or preconditions the system in single precision.
+
+    Returns a function that applies the approximate inverse to a double precision vector. With overwrite set,
+    a dense single precision K is factored in place.
+    """
+    if sp.sparse.issparse(K):
+        K_low = K.astype(np.float32).tocsc()
+    else:
+        K_low = np.asarray(K, dtype=np.float32)
+
+    if solver_method == 'solve':
+        # LAPACK works in Fortran order, so the transpose is factored to allow the in-place factorization
+        K_low = K_low.toarray() if sp.sparse.issparse(K_low) else K_low
+        factorization = sp.linalg.lu_factor(K_low.T, overwrite_a=overwrite or K_low is not K)
+        return lambda r: sp.linalg.lu_solve(factorization, r.astype(np.float32), trans=1).astype(np.float64)
+    if solver_method in ('cg', 'minres'):
+        # CG and MINRES need a symmetric preconditioner, which the incomplete LU factors are not
+        inverse_diagonal = 1 / K_low.diagonal()
+        return lambda r: (inverse_diagonal * r.astype(np.float32)).astype(np.float64)
+    if solver_method == 'spsolve':
+        factorization = sp.sparse.linalg.splu(sp.sparse.csc_matrix(K_low))
+    else:
+        factorization = sp.sparse.linalg.spilu(sp.sparse.csc_matrix(K_low))
+    return lambda r: factorization.solve(r.astype(np.float32)).astype(np.float64)
+
+
+def solve_mixed_precision(K, F, solver_method='spsolve', K_full=None, x0=None, tolerance=1e-10,
+                          max_refinements=20, stall_ratio=0.5, iterative_tolerance=1e-5):
+    """
+    Solves a system of equations with a single precision factorization or preconditioner and double precision
+    residuals.
+
+    The direct methods factor the single precision matrix and recover double precision accuracy through
+    iterative refinement. The iterative methods run in double precision with a single precision incomplete LU
+    preconditioner, or a diagonal one for the symmetric methods CG and MINRES.
+
+    Parameters:
+    K (np.ndarray or sp.sparse.spmatrix): System matrix, typically assembled in single precision.
+    F (np.ndarray): Right-hand side vector.
+    solver_method (str): 'solve' or 'spsolve' for refinement of an LU factorization, or one of the preconditioned
+        iterative methods 'cg', 'bicg', 'bicgstab', 'gmres' and 'minres'.
+    K_full (np.ndarray, sp.sparse.spmatrix or sp.sparse.linalg.LinearOperator, optional): Double precision system
+        used for the residuals. Defaults to K. When given, a dense single precision K is overwritten by its factors.
+    x0 (np.ndarray, optional): Initial guess.
+    tolerance (float): Relative residual at which the refinement stops.
+    max_refinements (int): Maximum number of refinement steps.
+    stall_ratio (float): Refinement is considered stalled when a step reduces the residual by less than this factor.
+    iterative_tolerance (float): Relative residual required from the iterative methods, the SciPy default.
+
+    Returns:
+    np.ndarray, float, bool: Solution vector, achieved relative residual and whether the solve converged.
+    """
+    if isinstance(K, sp.sparse.linalg.LinearOperator):
+        raise ValueError("Mixed precision requires an assembled matrix, not a linear operator")
+    if solver_method not in ('solve', 'spsolve') and solver_method not in ITERATIVE_METHODS:
+        raise ValueError(f"Solver method '{solver_method}' does not support mixed precision")
+
+    K_full = K if K_full is None else K_full
+    F = np.asarray(F, dtype=np.float64)
+    F_norm = np.linalg.norm(F) or 1.0
+    # K is only needed for the factorization when a separate double precision system is given
+    apply_inverse = _low_precision_solver(K, solver_method, overwrite=K_full is not K)
+
+    if solver_method in ITERATIVE_METHODS:
+        preconditioner = sp.sparse.linalg.LinearOperator(K.shape, matvec=apply_inverse, dtype=np.float64)
+        solution, info = ITERATIVE_METHODS[solver_method][1](K_full, F, x0=x0, M=preconditioner,
+                                                            rtol=iterative_tolerance)
+        residual = np.linalg.norm(F - K_full @ solution) / F_norm
+        return solution, residual, info == 0 and residual <= iterative_tolerance
+
+    solution = apply_inverse(F) if x0 is None else np.asarray(x0, dtype=np.float64)
+    residual_vector = F - K_full @ solution
+    residual = np.linalg.norm(residual_vector) / F_norm
+
+    for _ in range(max_refinements):
+        if residual <= tolerance:
+            return solution, residual, True
+        solution = solution + apply_inverse(residual_vector)
+        residual_vector = F - K_full @ solution
+        previous_residual, residual = residual, np.linalg.norm(residual_vector) / F_norm
+        if residual > stall_ratio * previous_residual:
+            return solution, residual, residual <= tolerance
+
+    return solution, residual, residual <= tolerance
+
+
+@functools.lru_cache(maxsize=None)
+def load_solver_calibration(path=CALIBRATION_PATH):
+    """
+    Derives the size limits of the automatic solver selection from stored benchmark suite results, or returns
+    DEFAULT_SOLVER_CALIBRATION if the suite has not been run.
+
+    The dense limit is the largest benchmarked size at which the dense solve still beats the sparse direct one,
+    the direct limit the largest size at which the sparse direct solve beats the fastest iterative method.
+    A limit stays at its default when the results do not contain the solvers it compares.
+
+    Parameters:
+    path (str): Results file written by benchmarking/fem_benchmark_suite.py.
+
+    Returns:
+    dict: Limits 'dense_max_dofs' and 'direct_max_dofs' (None for no limit).
+    """
+    calibration = dict(DEFAULT_SOLVER_CALIBRATION)
+    if not os.path.exists(path):
+        logger.info("No benchmark results at %s, using the default solver calibration", path)
+        return calibration
+    with open(path) as file:
+        results = json.load(file)['results']
+
+    medians = {}
+    for record in results:
+        if record['stage'] == 'solve':
+            medians.setdefault(record['n_dofs'], {})[record['case'].removeprefix('heat_transfer_')] = record['median']
+
+    dense_sizes = [n for n, times in medians.items()
+                   if 'solve' in times and 'spsolve' in times and times['solve'] <= times['spsolve']]
+    if any('solve' in times and 'spsolve' in times for times in medians.values()):
+        calibration['dense_max_dofs'] = max(dense_sizes, default=0)
+
+    iterative = ('cg', 'pcg', 'amg')
+    direct_wins = {n: times['spsolve'] <= min(times[method] for method in iterative if method in times)
+                   for n, times in medians.items() if 'spsolve' in times and any(m in times for m in iterative)}
+    if direct_wins and not all(direct_wins.values()):
+        calibration['direct_max_dofs'] = max((n for n, wins in direct_wins.items() if wins), default=0)
+
+    return calibration
+
+
+def select_solver_method(K, memory_budget=None, calibration=None, precision='double'):
+    """
+    Chooses a solver method from the size and structure of the system.
+
+    Small systems are solved with dense LAPACK, larger ones with the sparse direct solver while its estimated
+    factors fit into the memory budget. Beyond that, symmetric systems with a positive diagonal use AMG when
+    PyAMG is installed and ILU-preconditioned CG otherwise, other systems ILU-preconditioned BiCGStab. The decision
+    is logged with its reasons.
+
+    Parameters:
+    K (np.ndarray, sp.sparse.spmatrix or sp.sparse.linalg.LinearOperator): System matrix.
+    memory_budget (float, optional): Bytes the solver may allocate, see get_memory_budget.
+    calibration (dict, optional): Size limits as returned by load_solver_calibration. By default they are read
+        from the stored benchmark results, or DEFAULT_SOLVER_CALIBRATION without them.
+    precision (str): Precision mode of the solve. The 'mixed' mode brings its own single precision
+        preconditioners, so it is given plain CG or BiCGStab instead of 'pcg', 'amg' or 'pbicgstab'.
+
+    Returns:
+    str, str: Solver method and the reasoning behind it.
+    """
+    if isinstance(K, sp.sparse.linalg.LinearOperator):
+        method, reason = 'cg', "matrix-free operator, only Krylov methods apply and the FEM operators are symmetric"
+        logger.info("Selected solver '%s': %s", method, reason)
+        return method, reason
+
+    memory_budget = get_memory_budget(memory_budget)
+    if calibration is None:
+        calibration = load_solver_calibration()
+
+    n = K.shape[0]
+    if sp.sparse.issparse(K):
+        K = sp.sparse.csr_matrix(K)
+        nnz = K.nnz
+        asymmetry = abs(K - K.T).max() if nnz else 0.0
+        scale = abs(K).max() if nnz else 1.0
+    else:
+        nnz = np.count_nonzero(K)
+        asymmetry = np.abs(K - K.T).max()
+        scale = np.abs(K).max()
+    symmetric = asymmetry <= 1e-12 * scale
+    # A symmetric matrix with a positive diagonal is taken as positive definite, as all FEM systems here are
+    positive_diagonal = n == 0 or K.diagonal().min() > 0
+
+    dense_bytes = estimate_solve_memory(n, nnz, 'solve')
+    factor_bytes = estimate_solve_memory(n, nnz, 'spsolve')
+    facts = (f"{n} dofs, {nnz} nonzeros, {'symmetric' if symmetric else 'nonsymmetric'}, "
+             f"{'positive' if positive_diagonal else 'non-positive'} diagonal, "
+             f"dense LU {dense_bytes / 2 ** 20:.0f} MB, sparse LU ~{factor_bytes / 2 ** 20:.0f} MB, "
+             f"budget {memory_budget / 2 ** 20:.0f} MB")
+
+    direct_max_dofs = calibration['direct_max_dofs']
+    if n <= calibration['dense_max_dofs'] and dense_bytes <= memory_budget:
+        method, reason = 'solve', f"small system, dense LAPACK is fastest up to {calibration['dense_max_dofs']} dofs"
+    elif (direct_max_dofs is None or n <= direct_max_dofs) and factor_bytes <= memory_budget:
+        method, reason = 'spsolve', "estimated sparse LU fill-in fits the memory budget"
+    elif symmetric and positive_diagonal and precision == 'mixed':
+        method, reason = 'cg', "large symmetric positive definite system, single precision preconditioner"
+    elif symmetric and positive_diagonal and optional_import('pyamg') is not None:
+        method, reason = 'amg', "large symmetric positive definite system"
+    elif symmetric and positive_diagonal:
+        method, reason = 'pcg', "large symmetric positive definite system, PyAMG is not installed"
+    elif precision == 'mixed':
+        method, reason = 'bicgstab', "large indefinite or nonsymmetric system, single precision preconditioner"
+    else:
+        method, reason = 'pbicgstab', "large indefinite or nonsymmetric system"
+
+    reason = f"{reason} ({facts})"
+    logger.info("Selected solver '%s': %s", method, reason)
+    return method, reason
+
+
+def _solve_krylov(name, method, K, F, x0, profiler, **options):
+    """
+    Runs a Krylov method, counting iterations when profiling.
+
+    Returns:
+    np.ndarray, int: Solution vector and the convergence flag of the method.
+    """
+    iterations = 0
+    if profiler.enabled:
+        def count_iteration(*_):
+            nonlocal iterations
+            iterations += 1
+
+        options['callback'] = count_iteration
+        if method is sp.sparse.linalg.gmres:
+            options['callback_type'] = 'pr_norm'
+
+    solution, info = method(K, F, x0=x0, **options)
+    if info != 0 or profiler.enabled:
+        residual = float(np.linalg.norm(K @ solution - F))
+        profiler.record(iterations=iterations, residual=residual)
+        if info != 0:
+            warnings.warn(f"{name} did not converge, residual norm {residual}")
+    return solution, info
+
+
+def solve_linear_system(K, F, solver_method='solve', x0=None, precision='double', K_full=None,
+                        solver_options=None, profiler=None, memory_budget=None):
+    """
+    Solves a system of equations with the selected method.
+
+    Parameters:
+    K (np.ndarray, sp.sparse.spmatrix or sp.sparse.linalg.LinearOperator): System matrix. A linear operator
+        is only accepted by the iterative methods.
+    F (np.ndarray): Right-hand side vector.
+    solver_method (str): Method to solve the system of equations: 'solve', 'spsolve', 'lsqr', 'cg', 'bicg',
+        'bicgstab', 'gmres', 'minres', 'pcg' for ILU-preconditioned CG, 'pbicgstab' for ILU-preconditioned BiCGStab
+        of nonsymmetric systems, 'amg' for AMG-preconditioned CG (requires PyAMG), 'multigrid' for geometric multigrid preconditioned CG on nested meshes, 'schur' for the domain
+        decomposition solver, or 'auto' to choose with select_solver_method.
+    x0 (np.ndarray, optional): Initial guess for the iterative methods.
+    precision (str): 'double' to solve in double precision, or 'mixed' to factor or precondition in single
+        precision and refine with double precision residuals (see solve_mixed_precision).
+    K_full (np.ndarray, sp.sparse.spmatrix or sp.sparse.linalg.LinearOperator, optional): Double precision system
+        for the residuals and the fallback of the mixed precision mode. Defaults to K.
+    solver_options (dict, optional): Additional keyword arguments of the selected method, e.g. n_subdomains,
+        partition, dof_coords, rtol and maxiter for 'schur', or prolongations and dofs_per_node for 'multigrid' (see
+        GeometricMultigrid).
+    profiler (Profiler, optional): Receives the iteration counts and residuals of the solve.
+    memory_budget (float, optional): Bytes the solve may allocate, see get_memory_budget. The 'auto' selection
+        plans for it and a dense 'solve' that exceeds it raises a MemoryError.
+
+    Returns:
+    np.ndarray: Solution vector.
+    """
+    profiler = get_profiler(profiler)
+
+    if solver_method == 'auto':
+        solver_method, _ = select_solver_method(K if K_full is None else K_full, memory_budget, precision=precision)
+        profiler.record(solver_method=solver_method)
+
+    if precision == 'mixed':
+        solution, residual, converged = solve_mixed_precision(K, F, solver_method, K_full, x0)
+        profiler.record(mixed_precision_residual=float(residual), mixed_precision_converged=bool(converged))
+        if converged:
+            return solution
+        warnings.warn(f"Mixed precision {solver_method} stopped at relative residual {residual}, "
+                      f"solving again in double precision")
+        K = K if K_full is None else K_full
+    elif precision != 'double':
+        raise ValueError(f"Unknown precision: {precision}")
+
+    is_operator = isinstance(K, sp.sparse.linalg.LinearOperator)
+
+    if solver_method in ('solve', 'spsolve', 'schur', 'pcg', 'pbicgstab', 'amg', 'multigrid') and is_operator:
+        raise ValueError(f"Solver method '{solver_method}' requires an assembled matrix, not a linear operator")
+
+    if solver_method == 'solve':
+        check_memory(estimate_solve_memory(K.shape[0], 0, 'solve'), memory_budget,
+                     f"Dense solve of {K.shape[0]} equations")
+        return np.linalg.solve(K.toarray() if sp.sparse.issparse(K) else K, F)
+    if solver_method == 'spsolve':
+        return sp.sparse.linalg.spsolve(sp.sparse.csr_matrix(K), F)
+    if solver_method == 'schur':
+        solution, info = solve_schur_complement(K, F, x0=x0, **(solver_options or {}))
+        profiler.record(**info)
+        return solution
+    if solver_method == 'lsqr':
+        solution, istop, itn, r1norm = sp.sparse.linalg.lsqr(K, F, x0=x0)[:4]
+        profiler.record(iterations=itn, residual=float(r1norm))
+        return solution
+    if solver_method == 'pcg':
+        # A symmetric fill-reducing ordering without pivoting keeps the incomplete factors close to symmetric
+        ilu = sp.sparse.linalg.spilu(sp.sparse.csc_matrix(K), drop_tol=1e-4, fill_factor=10,
+                                     permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0)
+        M = sp.sparse.linalg.LinearOperator(K.shape, matvec=ilu.solve, dtype=float)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            solution, info = _solve_krylov('ILU-preconditioned CG', sp.sparse.linalg.cg, K, F, x0, profiler, M=M,
+                                           maxiter=PCG_MAX_ITERATIONS)
+        if info != 0:
+            # The dropped entries can leave the preconditioner too far from symmetric for CG
+            logger.info("ILU-preconditioned CG did not converge, switching to BiCGStab")
+            solution, _ = _solve_krylov('ILU-preconditioned BiCGStab', sp.sparse.linalg.bicgstab, K, F, x0,
+                                        profiler, M=M)
+        return solution
+    if solver_method == 'pbicgstab':
+        # Partial pivoting keeps the incomplete factors of an indefinite matrix stable
+        ilu = sp.sparse.linalg.spilu(sp.sparse.csc_matrix(K), drop_tol=1e-4, fill_factor=10)
+        M = sp.sparse.linalg.LinearOperator(K.shape, matvec=ilu.solve, dtype=float)
+        return _solve_krylov('ILU-preconditioned BiCGStab', sp.sparse.linalg.bicgstab, K, F, x0, profiler, M=M)[0]
+    if solver_method == 'amg':
+        pyamg = optional_import('pyamg')
+        if pyamg is None:
+            raise ValueError("Solver method 'amg' requires PyAMG")
+        M = pyamg.smoothed_aggregation_solver(sp.sparse.csr_matrix(K)).aspreconditioner(cycle='V')
+        return _solve_krylov('AMG-preconditioned CG', sp.sparse.linalg.cg, K, F, x0, profiler, M=M)[0]
+    if solver_method == 'multigrid':
+        solver_options = dict(solver_options or {})
+        if 'prolongations' not in solver_options:
+            raise ValueError("Solver method 'multigrid' requires the prolongations of a mesh hierarchy")
+        M = GeometricMultigrid(K, **solver_options).aspreconditioner()
+        return _solve_krylov('Multigrid-preconditioned CG', sp.sparse.linalg.cg, K, F, x0, profiler, M=M)[0]
+    if solver_method in ITERATIVE_METHODS:
+        name, method = ITERATIVE_METHODS[solver_method]
+        return _solve_krylov(name, method, K, F, x0, profiler, **(solver_options or {}))[0]
+
+    raise ValueError(f"Unknown solver method: {solver_method}")
+
+
+if __name__ == '__main__':
+    K = sp.sparse.diags([-1, 2, -1], [-1, 0, 1], shape=(5, 5))
+    F = np.ones(5)
+    print(solve_linear_system(K, F, 'cg'))
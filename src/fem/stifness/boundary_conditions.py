@@ -1,20 +1,30 @@
+import numpy as np
+import scipy as sp
+
+
 def apply_boundary_conditions(K, F, fixed_nodes):
     """
     Applies boundary conditions to the system of equations.
 
     Parameters:
-    K (np.ndarray): Global stiffness matrix.
+    K (np.ndarray or sp.sparse.spmatrix): Global stiffness matrix.
     F (np.ndarray): Right-hand side vector.
     fixed_nodes (list of int): List of fixed node indices.
 
     Returns:
     np.ndarray, np.ndarray: Modified stiffness matrix and right-hand side vector.
     """
-    for node in fixed_nodes:
-        dof = [2 * node, 2 * node + 1]
-        for d in dof:
-            K[d, :] = 0
-            K[:, d] = 0
-            K[d, d] = 1
-            F[d] = 0
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    dof = np.concatenate([2 * fixed_nodes, 2 * fixed_nodes + 1])
+
+    F[dof] = 0
+
+    if sp.sparse.issparse(K):
+        free = np.ones(K.shape[0], dtype=K.dtype)
+        free[dof] = 0
+        K = (sp.sparse.diags(free) @ K @ sp.sparse.diags(free) + sp.sparse.diags(1 - free)).tocsr()
+    else:
+        K[dof, :] = 0
+        K[:, dof] = 0
+        K[dof, dof] = 1
     return K, F
@@ -1,30 +1,94 @@
 import numpy as np
+import scipy as sp
+from src.fem.matrix_free import apply_boundary_conditions_matrix_free, stiffness_operator
+from src.fem.memory import choose_matrix_free
+from src.fem.profiling import get_profiler
+from src.fem.solvers import select_solver_method, solve_linear_system
 from src.fem.stifness.stiffness_matrix import assemble_global_stiffness_matrix
-from boundary_conditions import apply_boundary_conditions
+from src.fem.stifness.boundary_conditions import apply_boundary_conditions
 
-def solve_fem(node_coords, elements, E, nu, fixed_nodes, forces):
+def solve_fem(node_coords, elements, E, nu, fixed_nodes, forces, plane='stress', solver_method='auto',
+              matrix_free=False, precision='double', solver_options=None, profiler=None, memory_budget=None):
     """
     Solves the problem using the finite element method.
 
     Parameters:
     node_coords (np.ndarray): Node coordinates (Nx2).
     elements (list of list of int): List of elements, each specified as a list of node indices.
-    E (float): Young's modulus of the material.
-    nu (float): Poisson's ratio of the material.
+    E (float, np.ndarray or callable): Young's modulus of the material, a scalar, one value per element or a
+        function of the element centroids.
+    nu (float, np.ndarray or callable): Poisson's ratio of the material, given the same way as E.
     fixed_nodes (list of int): List of fixed node indices.
     forces (np.ndarray): External force vector (2N).
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+    solver_method (str): Method to solve the system of equations, 'auto' to choose it from the size and structure
+        of the system (see select_solver_method).
+    matrix_free (bool): Whether to apply the stiffness matrix element by element instead of assembling it.
+        Only the iterative solver methods support it.
+    precision (str): 'double', or 'mixed' to assemble and factor or precondition in single precision and refine
+        the solution with double precision residuals.
+    solver_options (dict, optional): Additional keyword arguments of the solver method. The 'schur' method
+        partitions by the node coordinates unless told otherwise.
+    profiler (Profiler, optional): Records the assembly, boundary condition and solve spans with the matrix nnz,
+        iteration counts and residuals. Nothing is measured if None.
+    memory_budget (float, optional): Bytes the solve may allocate, see get_memory_budget. Systems whose assembly
+        does not fit are solved matrix-free when the solver method allows it, otherwise a MemoryError is raised.
 
     Returns:
     np.ndarray: Displacement vector (2N).
     """
-    K_global = assemble_global_stiffness_matrix(elements, node_coords, E, nu)
+    profiler = get_profiler(profiler)
     F = forces.copy()
+    profiler.record(n_dofs=len(F))
 
-    # Применение граничных условий
-    K_global, F = apply_boundary_conditions(K_global, F, fixed_nodes)
+    if not matrix_free and precision == 'double':
+        matrix_free = choose_matrix_free(len(node_coords), len(elements), 2, solver_method, memory_budget)
+
+    if matrix_free:
+        fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+        fixed_dofs = np.concatenate([2 * fixed_nodes, 2 * fixed_nodes + 1])
+        with profiler.span('assembly'):
+            K_global = stiffness_operator(elements, node_coords, E, nu, plane)
+        with profiler.span('boundary_conditions'):
+            K_global, F = apply_boundary_conditions_matrix_free(K_global, F, fixed_dofs, np.zeros(len(fixed_dofs)))
+    else:
+        with profiler.span('assembly'):
+            K_global = assemble_global_stiffness_matrix(elements, node_coords, E, nu, plane,
+                                                        sparse=precision == 'mixed' or solver_method != 'solve',
+                                                        memory_budget=memory_budget)
+
+        # Применение граничных условий
+        with profiler.span('boundary_conditions'):
+            K_global, F = apply_boundary_conditions(K_global, F, fixed_nodes)
+        if sp.sparse.issparse(K_global):
+            profiler.record(nnz=K_global.nnz)
+
+    if solver_method == 'auto':
+        solver_method, _ = select_solver_method(K_global, memory_budget, precision=precision)
+        profiler.record(solver_method=solver_method)
+
+    # Матрица двойной точности нужна для невязок, матрица одинарной точности факторизуется
+    K_full = None
+    if precision == 'mixed':
+        with profiler.span('single_precision_assembly'):
+            K_full = K_global
+            if solver_method == 'solve':
+                # Сборка плотной матрицы сразу в одинарной точности не создаёт плотную копию двойной точности
+                K_global = assemble_global_stiffness_matrix(elements, node_coords, E, nu, plane, sparse=False,
+                                                            dtype=np.float32)
+                K_global, _ = apply_boundary_conditions(K_global, np.zeros(len(F)), fixed_nodes)
+            else:
+                K_global = K_full.astype(np.float32)
+
+    solver_options = dict(solver_options or {})
+    if solver_method == 'schur':
+        solver_options.setdefault('dof_coords', np.repeat(np.asarray(node_coords), 2, axis=0))
 
     # Решение системы уравнений
-    displacements = np.linalg.solve(K_global, F)
+    with profiler.span('solve'):
+        displacements = solve_linear_system(K_global, F, solver_method, precision=precision, K_full=K_full,
+                                            solver_options=solver_options, profiler=profiler,
+                                            memory_budget=memory_budget)
     return displacements
 
 # Пример использования функции
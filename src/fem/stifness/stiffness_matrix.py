@@ -1,7 +1,94 @@
 import numpy as np
 
+from src.fem.assembly import deduplicated_element_matrices, element_dofs, scatter_element_matrices
+from src.fem.conductivity.conductivity_matrix import element_gradient_matrices
+from src.fem.materials import evaluate_element_field
+from src.fem.memory import choose_assembly_format
 
-def element_stiffness_matrix(E, nu, coords):
+
+def element_strain_matrices(coords):
+    """
+    Calculates the areas and strain-displacement matrices of a batch of triangular elements.
+
+    Parameters:
+    coords (np.ndarray): Element node coordinates (Ex3x2).
+
+    Returns:
+    np.ndarray, np.ndarray: Element areas (E) and strain-displacement matrices B (Ex3x6).
+    """
+    A, G = element_gradient_matrices(coords)
+    dNdx = G[:, 0, :]
+    dNdy = G[:, 1, :]
+
+    # Matrices B, with the x and y degrees of freedom of each node interleaved
+    B = np.zeros((len(A), 3, 6))
+    B[:, 0, 0::2] = dNdx
+    B[:, 1, 1::2] = dNdy
+    B[:, 2, 0::2] = dNdy
+    B[:, 2, 1::2] = dNdx
+
+    return A, B
+
+
+def constitutive_matrices(E, nu, plane='stress'):
+    """
+    Calculates the elasticity matrices D for a scalar material or a batch of element materials.
+
+    Parameters:
+    E (float or np.ndarray): Young's modulus, a scalar or one value per element (E).
+    nu (float or np.ndarray): Poisson's ratio, a scalar or one value per element (E).
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    np.ndarray: Elasticity matrices (3x3, or Ex3x3 when any property varies per element).
+    """
+    E, nu = np.broadcast_arrays(np.asarray(E, dtype=float), np.asarray(nu, dtype=float))
+
+    if plane == 'stress':
+        factor = E / (1 - nu ** 2)
+        d11 = factor
+        d12 = factor * nu
+        d33 = factor * (1 - nu) / 2
+    elif plane == 'strain':
+        factor = E / ((1 + nu) * (1 - 2 * nu))
+        d11 = factor * (1 - nu)
+        d12 = factor * nu
+        d33 = factor * (1 - 2 * nu) / 2
+    else:
+        raise ValueError(f"Unknown plane state: {plane}")
+
+    D = np.zeros(E.shape + (3, 3))
+    D[..., 0, 0] = d11
+    D[..., 1, 1] = d11
+    D[..., 0, 1] = d12
+    D[..., 1, 0] = d12
+    D[..., 2, 2] = d33
+
+    return D
+
+
+def element_stiffness_matrices(E, nu, coords, plane='stress'):
+    """
+    Calculates the elemental stiffness matrices for a batch of triangular elements.
+
+    Parameters:
+    E (float or np.ndarray): Young's modulus, a scalar or one value per element (E).
+    nu (float or np.ndarray): Poisson's ratio, a scalar or one value per element (E).
+    coords (np.ndarray): Element node coordinates (Ex3x2).
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    np.ndarray: Elemental stiffness matrices (Ex6x6).
+    """
+    A, B = element_strain_matrices(coords)
+    D = constitutive_matrices(E, nu, plane)
+
+    if D.ndim == 2:
+        return A[:, np.newaxis, np.newaxis] * np.einsum('eki,kl,elj->eij', B, D, B, optimize=True)
+    return A[:, np.newaxis, np.newaxis] * np.einsum('eki,ekl,elj->eij', B, D, B, optimize=True)
+
+
+def element_stiffness_matrix(E, nu, coords, plane='stress'):
     """
     Calculates the elemental stiffness matrix for a triangular element.
 
@@ -9,66 +96,54 @@ def element_stiffness_matrix(E, nu, coords):
     E (float): Young's modulus of the material.
     nu (float): Poisson's ratio of the material.
     coords (np.ndarray): Element node coordinates (3x2).
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
 
     Returns:
     np.ndarray: Elemental stiffness matrix (6x6).
     """
-    x1, y1 = coords[0]
-    x2, y2 = coords[1]
-    x3, y3 = coords[2]
-
-    # Calculating the area of ​​an element
-    A = 0.5 * np.linalg.det(np.array([
-        [1, x1, y1],
-        [1, x2, y2],
-        [1, x3, y3]
-    ]))
-
-    # Matrix B
-    B = np.array([
-        [y2 - y3, 0, y3 - y1, 0, y1 - y2, 0],
-        [0, x3 - x2, 0, x1 - x3, 0, x2 - x1],
-        [x3 - x2, y2 - y3, x1 - x3, y3 - y1, x2 - x1, y1 - y2]
-    ]) / (2 * A)
-
-    # Matrix D (plane stress-strain state)
-    D = (E / (1 - nu ** 2)) * np.array([
-        [1, nu, 0],
-        [nu, 1, 0],
-        [0, 0, (1 - nu) / 2]
-    ])
-
-    # Elemental stiffness matrix
-    ke = A * np.dot(np.dot(B.T, D), B)
-
-    return ke
-
-
-def assemble_global_stiffness_matrix(elements, node_coords, E, nu):
+    return element_stiffness_matrices(E, nu, np.asarray(coords)[np.newaxis], plane)[0]
+
+
+def assemble_global_stiffness_matrix(elements, node_coords, E, nu, plane='stress', sparse=False,
+                                     dtype=np.float64, memory_budget=None, deduplicate=None):
     """
     Builds a global stiffness matrix from element matrices.
 
     Parameters:
     elements (list of list of int): List of elements, each specified as a list of node indices.
     node_coords (np.ndarray): Node coordinates (Nx2).
-    E (float): Young's modulus of the material.
-    nu (float): Poisson's ratio of the material.
+    E (float, np.ndarray or callable): Young's modulus of the material. Either a scalar, one value per element (E)
+        or a function of the element centroids (Ex2).
+    nu (float, np.ndarray or callable): Poisson's ratio of the material, given the same way as E.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+    sparse (bool): Whether to return a sparse CSR matrix instead of a dense array.
+    dtype (np.dtype): Floating point type of the global matrix, e.g. np.float32 for mixed precision solves.
+    memory_budget (float, optional): Bytes the assembly may allocate, see get_memory_budget. A dense matrix that
+        does not fit is assembled as sparse instead.
+    deduplicate (str, optional): 'translation' to compute the element matrix once for every group of translated
+        copies of an element with the same Poisson's ratio, see unique_element_geometries. Stiffness matrices
+        change under rotation, so rotated copies are not merged.
 
     Returns:
-    np.ndarray: Global stiffness matrix (2N x 2N).
+    np.ndarray or sp.sparse.csr_matrix: Global stiffness matrix (2N x 2N).
     """
+    elements = np.asarray(elements)
+    node_coords = np.asarray(node_coords)
     N = len(node_coords)
-    K_global = np.zeros((2 * N, 2 * N))
-
-    for element in elements:
-        coords = node_coords[element]
-        ke = element_stiffness_matrix(E, nu, coords)
-
-        for i in range(3):
-            for j in range(3):
-                K_global[2 * element[i]:2 * element[i] + 2, 2 * element[j]:2 * element[j] + 2] += ke[2 * i:2 * i + 2, 2 * j:2 * j + 2]
-
-    return K_global
+    sparse = choose_assembly_format(N, len(elements), 2, sparse, np.dtype(dtype).itemsize, memory_budget)
+
+    E = evaluate_element_field(E, node_coords, elements)
+    nu = evaluate_element_field(nu, node_coords, elements)
+    if deduplicate == 'rotation':
+        raise ValueError("Stiffness matrices can only be deduplicated up to translation")
+    if deduplicate:
+        ke = deduplicated_element_matrices(lambda coords, nu: element_stiffness_matrices(1.0, nu, coords, plane),
+                                           node_coords[elements], deduplicate, factor=E, parameters=(nu,))
+    else:
+        ke = element_stiffness_matrices(E, nu, node_coords[elements], plane)
+
+    return scatter_element_matrices(ke, element_dofs(elements, dofs_per_node=2), 2 * N, sparse,
+                                    dtype)
 
 
 if __name__ == '__main__':
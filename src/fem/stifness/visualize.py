@@ -1,11 +1,10 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
-from solve_fem import solve_fem
-from src.fem.mesh import create_regular_triangular_mesh_in_rectangle, plot_mesh, plot_elements
+from src.fem.stifness.solve_fem import solve_fem
+from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
 
 
-def visualize_results(node_coords, elements, displacements, scale=1.0):
+def visualize_results(node_coords, elements, displacements, scale=1.0, filename=None):
     """
     Visualizes the results of the FEM.
 
@@ -14,24 +13,26 @@ def visualize_results(node_coords, elements, displacements, scale=1.0):
     elements (list of list of int): List of elements, each specified as a list of node indices.
     displacements (np.ndarray): Displacement vector (2N).
     scale (float): Scale for displaying deformations.
+    filename (str, optional): Image file to render to without a display. The plot is shown if None.
     """
-    deformed_coords = node_coords + scale * displacements.reshape(-1, 2)
+    # matplotlib is only loaded once something is plotted
+    from src.fem.plotting import create_figure, plot_mesh_edges, show_or_save_figure
 
-    fig, ax = plt.subplots()
-    for element in elements:
-        x = node_coords[element, 0]
-        y = node_coords[element, 1]
-        ax.fill(x, y, edgecolor='black', fill=False)
+    node_coords = np.asarray(node_coords)
+    deformed_coords = node_coords + scale * displacements.reshape(-1, 2)
 
-        x_def = deformed_coords[element, 0]
-        y_def = deformed_coords[element, 1]
-        ax.fill(x_def, y_def, edgecolor='red', fill=False)
+    # The original and deformed meshes are drawn in one call each
+    fig, ax = create_figure(filename, figsize=None)
+    plot_mesh_edges(node_coords, elements, ax, color='black', linewidth=0.5)
+    plot_mesh_edges(deformed_coords, elements, ax, color='red', linewidth=0.5)
 
     ax.set_aspect('equal')
-    plt.show()
+    show_or_save_figure(fig, filename)
 
 
 def main():
+    from src.fem.plotting import plot_elements, plot_mesh
+
     np.random.seed(0)
 
     # Example for a rectangular grid
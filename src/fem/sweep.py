@@ -0,0 +1,290 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy as sp
+
+from src.fem.conductivity.boundary_conditions import apply_boundary_conditions as apply_heat_boundary_conditions
+from src.fem.conductivity.conductivity_matrix import assemble_global_conductivity_matrix
+from src.fem.conductivity.solve_fem import solve_fem_heat_transfer
+from src.fem.stifness.boundary_conditions import apply_boundary_conditions as apply_elastic_boundary_conditions
+from src.fem.stifness.solve_fem import solve_fem
+from src.fem.stifness.stiffness_matrix import assemble_global_stiffness_matrix
+
+
+def _is_affine_parameter(value):
+    """
+    Checks whether a material parameter is a single scalar, i.e. the global matrix only scales with it.
+    """
+    return not callable(value) and np.ndim(value) == 0
+
+
+def _as_columns(patterns, n_rows):
+    """
+    Converts a pattern vector or matrix to a float matrix with one pattern per column.
+    """
+    return np.asarray(patterns, dtype=float).reshape(n_rows, -1)
+
+
+def _map_cases(function, arguments, max_workers):
+    """
+    Evaluates the function for every argument tuple, serially or in a process pool.
+    """
+    if max_workers is None:
+        return [function(*args) for args in arguments]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(function, *zip(*arguments)))
+
+
+def precompute_heat_transfer_basis(node_coords, elements, fixed_nodes, source_patterns, dirichlet_patterns=None):
+    """
+    Precomputes the basis solutions of a heat transfer problem for a unit conductivity.
+
+    With a scalar conductivity k the global matrix is k * K1, and the solution is linear in the heat sources
+    and the fixed temperatures: T = X_sources @ s / k + X_dirichlet @ g. One factorization of K1 and one
+    back-substitution per pattern are enough for every later combination of k, s and g.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    fixed_nodes (list of int): List of indices of fixed nodes.
+    source_patterns (np.ndarray): Heat source patterns (N x m), one per column.
+    dirichlet_patterns (np.ndarray, optional): Fixed temperature patterns (len(fixed_nodes) x q), one per column.
+        Defaults to one pattern per fixed node.
+
+    Returns:
+    dict: Basis solutions 'sources' (N x m) and 'dirichlet' (N x q), together with the factorization.
+    """
+    N = len(node_coords)
+    fixed_nodes = np.asarray(fixed_nodes, dtype=int)
+    if dirichlet_patterns is None:
+        dirichlet_patterns = np.eye(len(fixed_nodes))
+    dirichlet_patterns = _as_columns(dirichlet_patterns, len(fixed_nodes))
+
+    K_unit = assemble_global_conductivity_matrix(elements, node_coords, 1.0, sparse=True)
+    A, _ = apply_heat_boundary_conditions(K_unit, np.zeros(N), fixed_nodes, np.zeros(len(fixed_nodes)))
+    factorization = sp.sparse.linalg.splu(A.tocsc())
+
+    # Heat sources only act on the free nodes
+    sources = _as_columns(source_patterns, N).copy()
+    sources[fixed_nodes] = 0
+
+    # Each fixed temperature pattern is lifted to the right-hand side of the free nodes
+    fixed_values = np.zeros((N, dirichlet_patterns.shape[1]))
+    fixed_values[fixed_nodes] = dirichlet_patterns
+    lifted = -(K_unit @ fixed_values)
+    lifted[fixed_nodes] = dirichlet_patterns
+
+    return {
+        'sources': factorization.solve(sources),
+        'dirichlet': factorization.solve(lifted),
+        'fixed_nodes': fixed_nodes,
+        'source_patterns': _as_columns(source_patterns, N),
+        'dirichlet_patterns': dirichlet_patterns,
+        'factorization': factorization,
+    }
+
+
+def evaluate_heat_transfer_basis(basis, k, source_strengths, dirichlet_values):
+    """
+    Evaluates many heat transfer cases at once as linear combinations of the basis solutions.
+
+    Parameters:
+    basis (dict): Basis solutions from precompute_heat_transfer_basis.
+    k (np.ndarray): Scalar thermal conductivity of every case (C).
+    source_strengths (np.ndarray): Coefficients of the source patterns for every case (C x m).
+    dirichlet_values (np.ndarray): Coefficients of the fixed temperature patterns for every case (C x q).
+
+    Returns:
+    np.ndarray: Temperatures of every case (C x N).
+    """
+    k = np.asarray(k, dtype=float).reshape(-1, 1)
+    source_strengths = np.asarray(source_strengths, dtype=float).reshape(len(k), -1)
+    dirichlet_values = np.asarray(dirichlet_values, dtype=float).reshape(len(k), -1)
+    return (source_strengths / k) @ basis['sources'].T + dirichlet_values @ basis['dirichlet'].T
+
+
+def _solve_heat_transfer_case(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                              solver_method):
+    return solve_fem_heat_transfer(node_coords, elements, k, fixed_nodes, fixed_temperatures, heat_sources,
+                                   solver_method)
+
+
+def sweep_heat_transfer(node_coords, elements, fixed_nodes, cases, source_patterns, dirichlet_patterns=None,
+                        solver_method='auto', max_workers=None):
+    """
+    Solves a heat transfer problem for many parameter cases on one mesh.
+
+    Cases with a scalar conductivity are affine and are evaluated from precomputed basis solutions.
+    Cases with a per-element or callable conductivity are solved in full, optionally in a process pool.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    fixed_nodes (list of int): List of indices of fixed nodes.
+    cases (list of dict): Sweep points with the keys 'k' (conductivity, defaults to 1.0), 'source_strengths'
+        (m coefficients of the source patterns) and 'fixed_temperatures' (q coefficients of the Dirichlet patterns).
+    source_patterns (np.ndarray): Heat source patterns (N x m), one per column.
+    dirichlet_patterns (np.ndarray, optional): Fixed temperature patterns (len(fixed_nodes) x q), one per column.
+        Defaults to one pattern per fixed node.
+    solver_method (str): Method to solve the system of equations for the non-affine cases, 'auto' to choose it
+        from the size and structure of the system (see select_solver_method).
+    max_workers (int, optional): Number of worker processes for the non-affine cases. Solved serially if None.
+        Callable conductivities must be picklable to be sent to the workers.
+
+    Returns:
+    np.ndarray: Temperatures of every case (C x N).
+    """
+    N = len(node_coords)
+    if dirichlet_patterns is None:
+        dirichlet_patterns = np.eye(len(fixed_nodes))
+    source_patterns = _as_columns(source_patterns, N)
+    dirichlet_patterns = _as_columns(dirichlet_patterns, len(fixed_nodes))
+
+    conductivities = [case.get('k', 1.0) for case in cases]
+    strengths = np.array([np.ravel(case['source_strengths']) for case in cases], dtype=float)
+    strengths = strengths.reshape(len(cases), source_patterns.shape[1])
+    dirichlet_values = np.array([np.ravel(case['fixed_temperatures']) for case in cases], dtype=float)
+    dirichlet_values = dirichlet_values.reshape(len(cases), dirichlet_patterns.shape[1])
+
+    affine = np.array([_is_affine_parameter(k) for k in conductivities], dtype=bool)
+    temperatures = np.empty((len(cases), N))
+
+    if affine.any():
+        basis = precompute_heat_transfer_basis(node_coords, elements, fixed_nodes, source_patterns,
+                                               dirichlet_patterns)
+        k_affine = np.array([conductivities[i] for i in np.flatnonzero(affine)], dtype=float)
+        temperatures[affine] = evaluate_heat_transfer_basis(basis, k_affine, strengths[affine],
+                                                            dirichlet_values[affine])
+
+    non_affine = np.flatnonzero(~affine)
+    arguments = [(node_coords, elements, conductivities[i], fixed_nodes, dirichlet_patterns @ dirichlet_values[i],
+                  source_patterns @ strengths[i], solver_method) for i in non_affine]
+    for i, solution in zip(non_affine, _map_cases(_solve_heat_transfer_case, arguments, max_workers)):
+        temperatures[i] = solution
+
+    return temperatures
+
+
+def precompute_elasticity_basis(node_coords, elements, nu, fixed_nodes, load_patterns, plane='stress'):
+    """
+    Precomputes the basis displacements of an elasticity problem for a unit Young's modulus.
+
+    For a fixed Poisson's ratio the global matrix is E * K1, so the displacements are U = X_loads @ s / E.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    nu (float): Poisson's ratio of the material.
+    fixed_nodes (list of int): List of fixed node indices.
+    load_patterns (np.ndarray): External force patterns (2N x m), one per column.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+
+    Returns:
+    dict: Basis displacements 'loads' (2N x m), together with the factorization.
+    """
+    N = len(node_coords)
+    K_unit = assemble_global_stiffness_matrix(elements, node_coords, 1.0, nu, plane, sparse=True)
+    loads = _as_columns(load_patterns, 2 * N).copy()
+    A, loads = apply_elastic_boundary_conditions(K_unit, loads, fixed_nodes)
+    factorization = sp.sparse.linalg.splu(A.tocsc())
+
+    return {
+        'loads': factorization.solve(loads),
+        'nu': nu,
+        'factorization': factorization,
+    }
+
+
+def evaluate_elasticity_basis(basis, E, load_strengths):
+    """
+    Evaluates many elasticity cases at once as linear combinations of the basis displacements.
+
+    Parameters:
+    basis (dict): Basis displacements from precompute_elasticity_basis.
+    E (np.ndarray): Scalar Young's modulus of every case (C).
+    load_strengths (np.ndarray): Coefficients of the load patterns for every case (C x m).
+
+    Returns:
+    np.ndarray: Displacements of every case (C x 2N).
+    """
+    E = np.asarray(E, dtype=float).reshape(-1, 1)
+    load_strengths = np.asarray(load_strengths, dtype=float).reshape(len(E), -1)
+    return (load_strengths / E) @ basis['loads'].T
+
+
+def _solve_elasticity_case(node_coords, elements, E, nu, fixed_nodes, forces, plane):
+    return solve_fem(node_coords, elements, E, nu, fixed_nodes, forces, plane)
+
+
+def sweep_elasticity(node_coords, elements, fixed_nodes, cases, load_patterns, plane='stress', max_workers=None):
+    """
+    Solves an elasticity problem for many parameter cases on one mesh.
+
+    Cases with scalar material constants are grouped by Poisson's ratio, and each group is evaluated from one set
+    of basis displacements. Cases with per-element or callable materials are solved in full, optionally in a
+    process pool.
+
+    Parameters:
+    node_coords (np.ndarray): Node coordinates (Nx2).
+    elements (list of list of int): List of elements, each specified as a list of node indices.
+    fixed_nodes (list of int): List of fixed node indices.
+    cases (list of dict): Sweep points with the keys 'E', 'nu' and 'load_strengths' (m coefficients of the load
+        patterns).
+    load_patterns (np.ndarray): External force patterns (2N x m), one per column.
+    plane (str): 'stress' for a plane stress state, 'strain' for a plane strain state.
+    max_workers (int, optional): Number of worker processes for the non-affine cases. Solved serially if None.
+
+    Returns:
+    np.ndarray: Displacements of every case (C x 2N).
+    """
+    N = len(node_coords)
+    load_patterns = _as_columns(load_patterns, 2 * N)
+    strengths = np.array([np.ravel(case['load_strengths']) for case in cases], dtype=float)
+    strengths = strengths.reshape(len(cases), load_patterns.shape[1])
+    displacements = np.empty((len(cases), 2 * N))
+
+    groups = {}
+    non_affine = []
+    for i, case in enumerate(cases):
+        if _is_affine_parameter(case['E']) and _is_affine_parameter(case['nu']):
+            groups.setdefault(float(case['nu']), []).append(i)
+        else:
+            non_affine.append(i)
+
+    for nu, indices in groups.items():
+        basis = precompute_elasticity_basis(node_coords, elements, nu, fixed_nodes, load_patterns, plane)
+        E = np.array([cases[i]['E'] for i in indices], dtype=float)
+        displacements[indices] = evaluate_elasticity_basis(basis, E, strengths[indices])
+
+    arguments = [(node_coords, elements, cases[i]['E'], cases[i]['nu'], fixed_nodes, load_patterns @ strengths[i],
+                  plane) for i in non_affine]
+    for i, solution in zip(non_affine, _map_cases(_solve_elasticity_case, arguments, max_workers)):
+        displacements[i] = solution
+
+    return displacements
+
+
+if __name__ == "__main__":
+    from src.fem.mesh import create_regular_triangular_mesh_in_rectangle
+
+    node_coords, elements = create_regular_triangular_mesh_in_rectangle(0, 1, 0, 1, 30, 30)
+    N = len(node_coords)
+
+    # Left and right edges are held at their own temperatures
+    left = np.flatnonzero(node_coords[:, 0] == 0)
+    right = np.flatnonzero(node_coords[:, 0] == 1)
+    fixed_nodes = np.concatenate([left, right])
+    dirichlet_patterns = np.zeros((len(fixed_nodes), 2))
+    dirichlet_patterns[:len(left), 0] = 1
+    dirichlet_patterns[len(left):, 1] = 1
+
+    # One uniform heat source pattern
+    source_patterns = np.full((N, 1), 1.0 / N)
+
+    rng = np.random.default_rng(0)
+    cases = [{'k': rng.uniform(0.5, 5.0), 'source_strengths': [rng.uniform(0, 100)],
+              'fixed_temperatures': rng.uniform(0, 100, 2)} for _ in range(1000)]
+
+    temperatures = sweep_heat_transfer(node_coords, elements, fixed_nodes, cases, source_patterns,
+                                       dirichlet_patterns)
+    print("Maximum temperature of each of the first cases:", temperatures[:5].max(axis=1))